@@ -0,0 +1,126 @@
+"""HTTP helpers for serving stored audio with Range, ETag and caching support.
+
+Stored audio is content addressed, so the SHA-256 doubles as a strong ETag
+and responses can be cached as immutable. Disk-backed blobs are streamed
+with the ASGI zero-copy send extension when the server offers it, falling
+back to chunked reads off the event loop otherwise.
+"""
+import asyncio
+import base64
+import binascii
+import os
+from typing import Mapping, Optional, Tuple
+
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 64 * 1024
+DEFAULT_AUDIO_CONTENT_TYPE = "audio/webm"
+# Stand-in the frontend sends as audio_data when a timeline is to be mixed server-side
+TIMELINE_PLACEHOLDER = "timeline_placeholder"
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return the inclusive byte range requested by ``header``
+
+    None means the whole body should be served: no header, a unit other than
+    bytes, or a multi-range request (which we answer with a plain 200).
+    """
+    if not header:
+        return None
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start_text, sep, end_text = ranges.strip().partition("-")
+    if not sep:
+        raise RangeNotSatisfiable(header)
+    try:
+        if start_text == "":
+            # Suffix range: the last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise RangeNotSatisfiable(header)
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise RangeNotSatisfiable(header)
+    if start >= size or end < start:
+        raise RangeNotSatisfiable(header)
+    return start, min(end, size - 1)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def decode_inline_audio(audio_data: str) -> bytes:
+    """Bytes of base64 audio stored inline by older releases"""
+    try:
+        return base64.b64decode(audio_data)
+    except (binascii.Error, ValueError):
+        # Some seeded samples are truncated; serve the whole quanta that decode
+        return base64.b64decode(audio_data[:len(audio_data) - len(audio_data) % 4])
+
+
+def audio_headers(etag: str, content_type: str) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+        "Content-Type": content_type,
+    }
+
+
+class FileRangeResponse(Response):
+    """Stream ``count`` bytes of ``path`` starting at ``offset``"""
+
+    def __init__(self, path: str, offset: int, count: int, status_code: int = 200,
+                 headers: Optional[Mapping[str, str]] = None):
+        self.path = path
+        self.offset = offset
+        self.count = count
+        self.status_code = status_code
+        self.background = None
+        self.init_headers(headers)
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if scope.get("method") == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": self.offset,
+                    "count": self.count,
+                    "more_body": False,
+                })
+                return
+
+            remaining = self.count
+            position = self.offset
+            while remaining > 0:
+                chunk = await asyncio.to_thread(os.pread, f.fileno(), min(CHUNK_SIZE, remaining), position)
+                if not chunk:
+                    break
+                position += len(chunk)
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,134 @@
+"""Local verification of Supabase access tokens.
+
+Supabase issues JWTs signed either with the project's shared secret (HS256)
+or with an asymmetric key published in the project's JWKS document. Both are
+verified here without a network hop; only tokens whose key id is not in the
+cached key set are reported back to the caller, which then falls back to the
+remote ``supabase.auth.get_user`` call.
+"""
+import asyncio
+import time
+from typing import Any, Dict, Optional
+
+import jwt
+import requests
+
+SHARED_SECRET_ALGORITHMS = ["HS256"]
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+
+class TokenVerificationError(Exception):
+    """The token is malformed, expired or carries a bad signature"""
+
+
+class UnknownSigningKey(TokenVerificationError):
+    """The token was signed with a key we cannot verify locally"""
+
+
+class JWKSCache:
+    """Key set fetched from the Supabase JWKS endpoint, refreshed in place"""
+
+    def __init__(self, url: str, refresh_interval: float = 600, min_refresh_interval: float = 30,
+                 fetch_timeout: float = 5):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.fetch_timeout = fetch_timeout
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+
+    def _fetch(self) -> Dict[str, jwt.PyJWK]:
+        response = requests.get(self.url, timeout=self.fetch_timeout)
+        response.raise_for_status()
+        keys = {}
+        for jwk in response.json().get("keys", []):
+            kid = jwk.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk)
+            except jwt.PyJWKError:
+                # Skip key types this build of PyJWT cannot load
+                continue
+        return keys
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            if self._fetched_at is not None:
+                age = time.monotonic() - self._fetched_at
+                if age < (self.min_refresh_interval if force else self.refresh_interval):
+                    return
+            try:
+                self._keys = await asyncio.to_thread(self._fetch)
+            except Exception as e:
+                print(f"Error refreshing JWKS from {self.url}: {e}")
+            # Back off even on failure so an outage does not turn into a fetch per request
+            self._fetched_at = time.monotonic()
+
+    async def get_key(self, kid: str) -> Optional[jwt.PyJWK]:
+        await self.refresh()
+        key = self._keys.get(kid)
+        if key is None:
+            # Keys may have been rotated since the last fetch
+            await self.refresh(force=True)
+            key = self._keys.get(kid)
+        return key
+
+
+class TokenVerifier:
+    """Verify signature, expiry, audience and issuer of Supabase access tokens"""
+
+    def __init__(self, supabase_url: Optional[str], jwt_secret: Optional[str] = None,
+                 audience: str = "authenticated", leeway: float = 10,
+                 jwks_refresh_interval: float = 600):
+        self.jwt_secret = jwt_secret or None
+        self.audience = audience
+        self.leeway = leeway
+        self.issuer = f"{supabase_url.rstrip('/')}/auth/v1" if supabase_url else None
+        self.jwks = JWKSCache(
+            f"{self.issuer}/.well-known/jwks.json",
+            refresh_interval=jwks_refresh_interval,
+        ) if self.issuer else None
+
+    def _decode(self, token: str, key: Any, algorithms) -> Dict[str, Any]:
+        try:
+            return jwt.decode(
+                token,
+                key,
+                algorithms=algorithms,
+                audience=self.audience,
+                issuer=self.issuer,
+                leeway=self.leeway,
+                options={"require": ["exp", "sub"]},
+            )
+        except jwt.InvalidTokenError as e:
+            raise TokenVerificationError(str(e))
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Return the verified claims of ``token``
+
+        Raises ``UnknownSigningKey`` when the token cannot be checked locally
+        and ``TokenVerificationError`` when it is definitely invalid.
+        """
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.InvalidTokenError as e:
+            raise TokenVerificationError(str(e))
+
+        algorithm = header.get("alg")
+        if algorithm in SHARED_SECRET_ALGORITHMS:
+            if not self.jwt_secret:
+                raise UnknownSigningKey("No shared JWT secret configured")
+            return self._decode(token, self.jwt_secret, SHARED_SECRET_ALGORITHMS)
+
+        if algorithm not in ASYMMETRIC_ALGORITHMS:
+            raise TokenVerificationError(f"Unsupported signing algorithm: {algorithm}")
+
+        kid = header.get("kid")
+        if not kid or self.jwks is None:
+            raise UnknownSigningKey("Token has no verifiable key id")
+        key = await self.jwks.get_key(kid)
+        if key is None:
+            raise UnknownSigningKey(f"Unknown key id: {kid}")
+        return self._decode(token, key.key, [algorithm])
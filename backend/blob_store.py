@@ -0,0 +1,221 @@
+"""Content-addressed storage for audio payloads.
+
+Blobs are keyed by the SHA-256 of their bytes, so identical uploads are
+stored once and a reference never goes stale. Documents in Mongo only keep
+the digest, size and content type (see ``blob_reference``).
+"""
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from typing import Any, Dict, Optional
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+def blob_reference(digest: str, size: int, content_type: str) -> Dict[str, Any]:
+    """The sub-document stored in place of inline audio data"""
+    return {"sha256": digest, "size": size, "content_type": content_type}
+
+
+def validate_digest(digest: str) -> str:
+    if not DIGEST_PATTERN.match(digest or ""):
+        raise BlobNotFound(digest)
+    return digest
+
+
+class BlobStore:
+    """Interface shared by the storage backends; all methods are coroutines"""
+
+    async def put(self, data: bytes) -> str:
+        raise NotImplementedError
+
+    async def put_file(self, path: str, digest: str):
+        """Take ownership of a file whose SHA-256 the caller already computed"""
+        raise NotImplementedError
+
+    async def get(self, digest: str) -> bytes:
+        raise NotImplementedError
+
+    async def get_range(self, digest: str, start: int, end: int) -> bytes:
+        """Bytes ``start`` to ``end`` inclusive"""
+        data = await self.get(digest)
+        return data[start:end + 1]
+
+    async def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, digest: str):
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Filesystem path of the blob when the backend is disk based"""
+        return None
+
+    @property
+    def spool_dir(self) -> str:
+        """Directory for in-flight uploads before they are handed to put_file"""
+        return tempfile.gettempdir()
+
+
+class LocalBlobStore(BlobStore):
+    """Blobs stored as files under ``root/<aa>/<bb>/<digest>``"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def _path(self, digest: str) -> str:
+        validate_digest(digest)
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _write(self, digest: str, data: bytes):
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.tmp_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _move(self, path: str, digest: str):
+        target = self._path(digest)
+        if os.path.exists(target):
+            os.unlink(path)
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+
+    def _read(self, digest: str) -> bytes:
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    async def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, digest, data)
+        return digest
+
+    async def put_file(self, path: str, digest: str):
+        # Uploads are spooled inside the store, so this is a rename, not a copy
+        await asyncio.to_thread(self._move, path, digest)
+
+    async def get(self, digest: str) -> bytes:
+        return await asyncio.to_thread(self._read, digest)
+
+    async def exists(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    async def delete(self, digest: str):
+        try:
+            os.unlink(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self._path(digest)
+
+    @property
+    def spool_dir(self) -> str:
+        return self.tmp_dir
+
+
+class S3BlobStore(BlobStore):
+    """Blobs stored as objects in an S3-compatible bucket under ``prefix``"""
+
+    def __init__(self, bucket: str, prefix: str = "blobs/", endpoint_url: Optional[str] = None,
+                 region_name: Optional[str] = None):
+        import boto3
+        from botocore.exceptions import ClientError
+
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region_name)
+        self._client_error = ClientError
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{validate_digest(digest)}"
+
+    def _is_missing(self, error) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def _exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except self._client_error as e:
+            if self._is_missing(e):
+                return False
+            raise
+
+    def _write(self, digest: str, data: bytes):
+        if self._exists(digest):
+            return
+        self.client.put_object(Bucket=self.bucket, Key=self._key(digest), Body=data)
+
+    def _upload(self, path: str, digest: str):
+        try:
+            if not self._exists(digest):
+                self.client.upload_file(path, self.bucket, self._key(digest))
+        finally:
+            os.unlink(path)
+
+    def _read(self, digest: str, byte_range: Optional[str] = None) -> bytes:
+        kwargs = {"Range": byte_range} if byte_range else {}
+        try:
+            response = self.client.get_object(Bucket=self.bucket, Key=self._key(digest), **kwargs)
+        except self._client_error as e:
+            if self._is_missing(e):
+                raise BlobNotFound(digest)
+            raise
+        return response["Body"].read()
+
+    async def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        await asyncio.to_thread(self._write, digest, data)
+        return digest
+
+    async def put_file(self, path: str, digest: str):
+        await asyncio.to_thread(self._upload, path, digest)
+
+    async def get(self, digest: str) -> bytes:
+        return await asyncio.to_thread(self._read, digest)
+
+    async def get_range(self, digest: str, start: int, end: int) -> bytes:
+        return await asyncio.to_thread(self._read, digest, f"bytes={start}-{end}")
+
+    async def exists(self, digest: str) -> bool:
+        return await asyncio.to_thread(self._exists, digest)
+
+    async def delete(self, digest: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self._key(digest))
+
+
+def create_blob_store() -> BlobStore:
+    """Build the blob store selected by the BLOB_STORE_* environment variables"""
+    backend = os.environ.get("BLOB_STORE_BACKEND", "local")
+    if backend == "s3":
+        return S3BlobStore(
+            bucket=os.environ["BLOB_STORE_S3_BUCKET"],
+            prefix=os.environ.get("BLOB_STORE_S3_PREFIX", "blobs/"),
+            endpoint_url=os.environ.get("BLOB_STORE_S3_ENDPOINT_URL") or None,
+            region_name=os.environ.get("BLOB_STORE_S3_REGION") or None,
+        )
+    if backend != "local":
+        raise ValueError(f"Unknown BLOB_STORE_BACKEND: {backend}")
+    default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), "blob_data")
+    return LocalBlobStore(os.environ.get("BLOB_STORE_PATH", default_root))
@@ -0,0 +1,68 @@
+"""Change counters behind the version-based ETags of polled endpoints.
+
+Every write that changes what an endpoint returns bumps the counter of a
+key (``rooms``, ``room:<id>``, ``performances:<room id>``, ``users``,
+``effects``). An endpoint's ETag is built from the counters of the keys it
+reads, so a matching ``If-None-Match`` can be answered with a 304 before
+the database is queried.
+
+Counters live in process memory. The ETag carries a per-process epoch, so
+tags from another process (or from before a restart) never match.
+Bumps are also broadcast on the ``versions`` event channel so the other
+processes sharing an event broker bump the same keys; when that stream
+falls behind, the generation number is bumped instead, which changes every
+tag at once. Without a shared broker, a process never learns of writes made
+by sibling workers, so ``conditional`` is switched off and its tags are never
+used to answer a request with a 304, unless the deployment declares itself a
+single worker (``LOCAL_CONDITIONAL_GETS``).
+"""
+import asyncio
+import json
+import uuid
+from typing import Callable, Dict, Optional
+
+VERSIONS_CHANNEL = "versions"
+
+
+class ChangeVersions:
+    def __init__(self):
+        self.epoch = uuid.uuid4().hex[:12]
+        self.generation = 0
+        self._versions: Dict[str, int] = {}
+        # False when bumps from other processes cannot reach this one
+        self.conditional = True
+        # Set to broadcast bumps to other processes (see ``follow``)
+        self.publish: Optional[Callable[[dict], None]] = None
+
+    def bump(self, *keys: str):
+        self._increment(keys)
+        if self.publish is not None:
+            self.publish({"type": "bump", "origin": self.epoch, "keys": list(keys)})
+
+    def _increment(self, keys):
+        for key in keys:
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def version(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    def etag(self, *parts) -> str:
+        """Weak ETag over the counters of ``parts``; non-string parts are used as-is"""
+        values = [str(self.version(part)) if isinstance(part, str) else str(part) for part in parts]
+        return f'W/"{self.epoch}.{self.generation}-{".".join(values)}"'
+
+    def apply(self, event: dict):
+        """Apply an event from the ``versions`` channel"""
+        if event.get("type") == "batch":
+            for inner in event["events"]:
+                self.apply(inner)
+        elif event.get("type") == "resync":
+            # Bumps were lost; invalidate every tag handed out so far
+            self.generation += 1
+        elif event.get("type") == "bump" and event.get("origin") != self.epoch:
+            self._increment(event["keys"])
+
+    async def follow(self, queue: asyncio.Queue):
+        """Apply bumps from other processes as they arrive on ``queue``"""
+        while True:
+            self.apply(json.loads(await queue.get()))
@@ -0,0 +1,272 @@
+"""Transports that carry live event frames between server processes.
+
+``EventHub`` batches events per channel into frames and hands them to a
+broker; the broker delivers every frame, including the publisher's own, to
+each process's hub, which fans it out to the connections it holds. With
+several uvicorn workers or hosts this is how a vote handled in one worker
+reaches sockets attached to another.
+
+- ``InProcessBroker``: single process, frames are delivered directly.
+- ``MongoChangeStreamBroker``: frames are inserted into a collection every
+  process watches with a change stream (needs a replica set).
+- ``RedisBroker``: PUBLISH/PSUBSCRIBE over the Redis protocol, spoken
+  directly on asyncio streams, so any RESP-compatible server works.
+
+``start`` returns once the process is subscribed. When a subscription is
+lost and re-established, the hub's ``resync`` callback tells every local
+subscriber to reload, since frames sent in between may never arrive.
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from typing import Callable, Optional, Tuple
+from urllib.parse import urlparse
+
+Deliver = Callable[[str, str], None]
+# Called when a broker subscribes again after losing its connection; frames
+# published meanwhile may never arrive, so every local subscriber must resync
+Resync = Callable[[], None]
+
+
+class EventBroker:
+    """Interface shared by the broker backends"""
+
+    # True when frames never leave this process, so channels nobody here
+    # watches can be skipped at publish time
+    local_only = False
+
+    async def start(self, deliver: Deliver, resync: Optional[Resync] = None):
+        raise NotImplementedError
+
+    async def publish(self, channel: str, frame: str):
+        raise NotImplementedError
+
+    async def stop(self):
+        pass
+
+
+class InProcessBroker(EventBroker):
+    local_only = True
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver, resync: Optional[Resync] = None):
+        self._deliver = deliver
+
+    async def publish(self, channel: str, frame: str):
+        if self._deliver is not None:
+            self._deliver(channel, frame)
+
+
+class MongoChangeStreamBroker(EventBroker):
+    """Frames are documents in ``collection``; each process tails it with a change stream"""
+
+    def __init__(self, collection, ttl_seconds: int = 60):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self._deliver: Optional[Deliver] = None
+        self._resync: Optional[Resync] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver, resync: Optional[Resync] = None):
+        self._deliver = deliver
+        self._resync = resync
+        # Frames are only needed until every watcher has seen them
+        await self.collection.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+        opened = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._watch(opened))
+        # Frames inserted before the change stream is open would never come back to us
+        await opened
+
+    async def _watch(self, opened: asyncio.Future):
+        resume_token = None
+        while True:
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}],
+                    resume_after=resume_token,
+                ) as stream:
+                    if not opened.done():
+                        opened.set_result(None)
+                    elif self._resync is not None:
+                        # The resume token may have expired with the frames it pointed at
+                        self._resync()
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        document = change["fullDocument"]
+                        self._deliver(document["channel"], document["frame"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not opened.done():
+                    opened.set_exception(e)
+                    return
+                print(f"Event change stream interrupted, resuming: {e}")
+                await asyncio.sleep(1)
+
+    async def publish(self, channel: str, frame: str):
+        await self.collection.insert_one({
+            "channel": channel,
+            "frame": frame,
+            "created_at": datetime.now(timezone.utc),
+        })
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+class RedisProtocolError(Exception):
+    pass
+
+
+def encode_command(*args) -> bytes:
+    """A command as a RESP array of bulk strings"""
+    out = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        data = arg if isinstance(arg, bytes) else str(arg).encode()
+        out.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+    return b"".join(out)
+
+
+async def read_reply(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Redis connection closed")
+    kind, body = line[:1], line[1:-2]
+    if kind == b"+":
+        return body.decode()
+    if kind == b"-":
+        raise RedisProtocolError(body.decode())
+    if kind == b":":
+        return int(body)
+    if kind == b"$":
+        length = int(body)
+        if length < 0:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        length = int(body)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise RedisProtocolError(f"Unexpected reply: {line!r}")
+
+
+class RedisBroker(EventBroker):
+    """Frames travel as PUBLISH ``<prefix><channel>``; every process PSUBSCRIBEs to ``<prefix>*``"""
+
+    def __init__(self, url: str, prefix: str = "revmix:events:"):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.prefix = prefix
+        self._deliver: Optional[Deliver] = None
+        self._resync: Optional[Resync] = None
+        self._publisher: Optional[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = None
+        self._publish_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            writer.write(encode_command("AUTH", self.password))
+            await writer.drain()
+            await read_reply(reader)
+        return reader, writer
+
+    async def start(self, deliver: Deliver, resync: Optional[Resync] = None):
+        self._deliver = deliver
+        self._resync = resync
+        subscribed = asyncio.get_running_loop().create_future()
+        self._task = asyncio.create_task(self._listen(subscribed))
+        # Frames published before the subscription is live would never come back to us
+        await subscribed
+
+    async def _listen(self, subscribed: asyncio.Future):
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._connect()
+                writer.write(encode_command("PSUBSCRIBE", f"{self.prefix}*"))
+                await writer.drain()
+                while True:
+                    reply = await read_reply(reader)
+                    if reply[0] == b"psubscribe":
+                        if not subscribed.done():
+                            subscribed.set_result(None)
+                        elif self._resync is not None:
+                            # Frames published while disconnected are gone
+                            self._resync()
+                    elif reply[0] == b"pmessage":
+                        channel = reply[2].decode()[len(self.prefix):]
+                        self._deliver(channel, reply[3].decode())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not subscribed.done():
+                    subscribed.set_exception(e)
+                    return
+                print(f"Redis event subscription interrupted, reconnecting: {e}")
+                await asyncio.sleep(1)
+            finally:
+                if writer is not None:
+                    writer.close()
+
+    async def publish(self, channel: str, frame: str):
+        async with self._publish_lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None:
+                        self._publisher = await self._connect()
+                    reader, writer = self._publisher
+                    writer.write(encode_command("PUBLISH", f"{self.prefix}{channel}", frame))
+                    await writer.drain()
+                    await read_reply(reader)
+                    return
+                except (ConnectionError, OSError):
+                    # Stale connection: reconnect once, then give up on this frame
+                    self._close_publisher()
+                    if attempt:
+                        raise
+
+    def _close_publisher(self):
+        if self._publisher is not None:
+            self._publisher[1].close()
+            self._publisher = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._close_publisher()
+
+
+def create_event_broker(db=None) -> EventBroker:
+    """Build the broker selected by the EVENT_BROKER_* environment variables"""
+    backend = os.environ.get("EVENT_BROKER_BACKEND", "memory")
+    if backend == "memory":
+        return InProcessBroker()
+    if backend == "mongo":
+        return MongoChangeStreamBroker(
+            db[os.environ.get("EVENT_BROKER_MONGO_COLLECTION", "live_events")],
+            ttl_seconds=int(os.environ.get("EVENT_BROKER_MONGO_TTL_SECONDS", "60")),
+        )
+    if backend == "redis":
+        return RedisBroker(
+            os.environ.get("EVENT_BROKER_REDIS_URL", "redis://localhost:6379"),
+            prefix=os.environ.get("EVENT_BROKER_REDIS_PREFIX", "revmix:events:"),
+        )
+    raise ValueError(f"Unknown EVENT_BROKER_BACKEND: {backend}")
@@ -0,0 +1,103 @@
+"""In-process caches for authenticated principals.
+
+Each worker keeps its own copy; entries expire after a short TTL so changes
+made by other workers become visible without any cross-process signalling.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries also expire after a per-entry TTL"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            self._data.pop(key, None)
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class IdentityCache:
+    """Resolved principals keyed by token and by Supabase id
+
+    ``tokens`` and ``supabase_ids`` only map to internal user ids; the user
+    documents themselves live in ``users`` so that invalidating a user (after
+    an XP, wins or badge change) drops a single entry regardless of how many
+    tokens point at it.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60, negative_ttl: float = 30):
+        self.tokens = TTLCache(maxsize, ttl)
+        self.supabase_ids = TTLCache(maxsize, ttl)
+        self.users = TTLCache(maxsize, ttl)
+        self.rejected = TTLCache(maxsize, negative_ttl)
+
+    def is_rejected(self, token: str) -> bool:
+        return self.rejected.get(token, False)
+
+    def reject(self, token: str):
+        self.tokens.pop(token)
+        self.rejected.set(token, True)
+
+    def user_id_for_token(self, token: str) -> Optional[str]:
+        return self.tokens.get(token)
+
+    def user_id_for_supabase_id(self, supabase_id: str) -> Optional[str]:
+        return self.supabase_ids.get(supabase_id)
+
+    def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        user = self.users.get(user_id)
+        return dict(user) if user is not None else None
+
+    def remember(self, token: str, user: Dict[str, Any], expires_at: Optional[float] = None):
+        """Cache ``user`` for ``token``; ``expires_at`` is the token's exp claim"""
+        ttl = None if expires_at is None else expires_at - time.time()
+        self.tokens.set(token, user["id"], ttl)
+        if user.get("supabase_id"):
+            self.supabase_ids.set(user["supabase_id"], user["id"])
+        self.users.set(user["id"], dict(user))
+
+    def invalidate_user(self, user_id: str):
+        self.users.pop(user_id)
+
+    def clear(self):
+        self.tokens.clear()
+        self.supabase_ids.clear()
+        self.users.clear()
+        self.rejected.clear()
@@ -0,0 +1,192 @@
+"""Declarative catalog of MongoDB indexes and the query shapes they serve.
+
+``INDEXES`` is the full set of indexes per collection and the only place
+indexes are declared, so changing an index is a change to this file.
+``build_indexes`` creates the ones a database is missing; it only issues
+commands for differences, and the server runs it as a background task so a
+build never holds up startup.
+
+Dropping indexes the catalog no longer lists (``prune``) is opt-in: during
+a rolling deploy the previous release still relies on its indexes, and
+operators may have added their own, so pruning is meant to be switched on
+(``INDEX_PRUNE``) once every process runs the new catalog. ``_id`` indexes,
+and collections that are not catalogued (leases, migrations, the event
+broker's collection), are left alone.
+
+``catalog_queries`` registers every query shape the server issues on a
+catalogued collection, with sample values. ``check_query_plans`` runs
+``explain()`` for each and reports the ones MongoDB would not answer from
+an index; the server runs it at startup when ``QUERY_PLAN_CHECK`` is set
+and refuses to start on a failure. Unfiltered listings (all challenges,
+all effects) are full scans by design and are not registered.
+
+The partial indexes on room and challenge status need MongoDB 6.0 or
+later, which is the first release to accept ``$in`` in a partial filter.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from room_finalization import claim_filter, room_results_pipeline
+from room_lifecycle import OPEN_PHASES, TIMED_PHASES
+from vote_buffer import APPLIED_BATCH_TTL_SECONDS
+
+# Rooms that are not closed: the ones the server still lists, schedules or finalizes
+OPEN_ROOMS = {"status": {"$in": list(OPEN_PHASES)}}
+TIMED_ROOMS = {"status": {"$in": list(TIMED_PHASES)}}
+UPCOMING_CHALLENGES = {"status": "upcoming"}
+
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("username", ASCENDING)], unique=True),
+        IndexModel([("supabase_id", ASCENDING)], unique=True),
+        IndexModel([("xp", DESCENDING)]),
+    ],
+    "rooms": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], partialFilterExpression=OPEN_ROOMS),
+        IndexModel([("status", ASCENDING), ("phase_ends_at", ASCENDING)], partialFilterExpression=TIMED_ROOMS),
+        # Only rooms being finalized carry a claim
+        IndexModel([("results_claim.token", ASCENDING)], sparse=True),
+    ],
+    "performances": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Room listings sort by score; results also break ties by submission time
+        IndexModel([("room_id", ASCENDING), ("average_score", DESCENDING), ("submitted_at", ASCENDING)]),
+        IndexModel([("render_status", ASCENDING)], partialFilterExpression={"render_status": "pending"}),
+    ],
+    "votes": [
+        IndexModel([("id", ASCENDING)]),
+        IndexModel([("voter_id", ASCENDING), ("performance_id", ASCENDING)], unique=True),
+        IndexModel([("performance_id", ASCENDING)]),
+        IndexModel([("room_id", ASCENDING), ("voter_id", ASCENDING)]),
+    ],
+    # Journal batches the vote buffer applied, kept for as long as a segment could be replayed
+    "applied_vote_batches": [
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=APPLIED_BATCH_TTL_SECONDS),
+    ],
+    "challenges": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("starts_at", ASCENDING)], partialFilterExpression=UPCOMING_CHALLENGES),
+    ],
+    "audio_effects": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("key", ASCENDING)], unique=True, partialFilterExpression={"key": {"$exists": True}}),
+    ],
+}
+
+
+async def build_indexes(db, prune: bool = False):
+    """Create missing catalog indexes; with ``prune``, also drop ones the catalog does not list"""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        wanted = {model.document["name"] for model in models}
+        missing = [model for model in models if model.document["name"] not in existing]
+        try:
+            if missing:
+                await collection.create_indexes(missing)
+                print(f"Built indexes on {collection_name}: {', '.join(m.document['name'] for m in missing)}")
+            if prune:
+                for name in existing:
+                    if name != "_id_" and name not in wanted:
+                        await collection.drop_index(name)
+                        print(f"Dropped index {collection_name}.{name}")
+        except OperationFailure as e:
+            # Another process may be building or dropping the same index
+            print(f"Error building indexes on {collection_name}: {e}")
+
+
+def catalog_queries(now: Optional[datetime] = None) -> List[dict]:
+    """Every query shape on a catalogued collection, with sample values"""
+    now = now or datetime.now(timezone.utc)
+    sample = "00000000-0000-0000-0000-000000000000"
+    return [
+        {"name": "user by id", "collection": "users", "filter": {"id": sample}},
+        {"name": "test user", "collection": "users", "filter": {"id": sample, "is_test_user": True}},
+        {"name": "user by supabase id", "collection": "users", "filter": {"supabase_id": sample}},
+        {"name": "user by username", "collection": "users", "filter": {"username": "sample"}},
+        {"name": "leaderboard", "collection": "users", "filter": {}, "sort": [("xp", DESCENDING)], "limit": 10},
+
+        {"name": "room by id", "collection": "rooms", "filter": {"id": sample}},
+        {"name": "active rooms", "collection": "rooms",
+         "filter": {"expires_at": {"$gt": now}, **OPEN_ROOMS}},
+        {"name": "expired open rooms", "collection": "rooms",
+         "filter": {"expires_at": {"$lt": now}, **OPEN_ROOMS}},
+        {"name": "room deadlines", "collection": "rooms", "filter": OPEN_ROOMS,
+         "sort": [("expires_at", ASCENDING)]},
+        {"name": "room phase deadlines", "collection": "rooms", "filter": TIMED_ROOMS},
+        {"name": "due room phases", "collection": "rooms",
+         "filter": {"id": {"$in": [sample]}, "phase_ends_at": {"$lte": now}, **TIMED_ROOMS}},
+        {"name": "room claim", "collection": "rooms", "filter": claim_filter([sample], now)},
+        {"name": "claimed rooms", "collection": "rooms", "filter": {"results_claim.token": sample}},
+
+        {"name": "performance by id", "collection": "performances", "filter": {"id": sample}},
+        {"name": "room performances", "collection": "performances", "filter": {"room_id": sample},
+         "sort": [("average_score", DESCENDING)]},
+        {"name": "room results", "collection": "performances", "pipeline": room_results_pipeline([sample])},
+        {"name": "pending renders", "collection": "performances",
+         "filter": {"render_status": "pending", "$or": [{"render_claim": None}, {"render_claim.claimed_at": {"$lt": now}}]}},
+
+        {"name": "votes by id", "collection": "votes", "filter": {"id": {"$in": [sample]}}},
+        {"name": "repeat vote", "collection": "votes", "filter": {"voter_id": sample, "performance_id": sample}},
+        {"name": "my room votes", "collection": "votes", "filter": {"room_id": sample, "voter_id": sample}},
+        {"name": "performance votes", "collection": "votes", "filter": {"performance_id": sample}},
+        {"name": "applied vote batch", "collection": "applied_vote_batches", "filter": {"_id": sample}},
+
+        {"name": "challenge start", "collection": "challenges",
+         "filter": {"id": sample, "starts_at": {"$lte": now}, **UPCOMING_CHALLENGES}},
+        {"name": "upcoming challenges", "collection": "challenges", "filter": UPCOMING_CHALLENGES},
+
+        {"name": "effect by id", "collection": "audio_effects", "filter": {"id": sample}},
+        {"name": "effects by id", "collection": "audio_effects", "filter": {"id": {"$in": [sample]}}},
+        {"name": "effect by key", "collection": "audio_effects", "filter": {"key": "boom"}},
+    ]
+
+
+INDEXED_STAGES = {"IXSCAN", "EXPRESS_IXSCAN", "IDHACK", "EXPRESS_IDHACK", "COUNT_SCAN", "DISTINCT_SCAN"}
+
+
+def plan_stages(explain) -> List[str]:
+    """Stage names of the chosen plan in an explain document (rejected plans are skipped)"""
+    stages = []
+    if isinstance(explain, dict):
+        if isinstance(explain.get("stage"), str):
+            stages.append(explain["stage"])
+        for key, value in explain.items():
+            if key != "rejectedPlans":
+                stages.extend(plan_stages(value))
+    elif isinstance(explain, list):
+        for value in explain:
+            stages.extend(plan_stages(value))
+    return stages
+
+
+def uses_index(explain: dict) -> bool:
+    stages = plan_stages(explain)
+    return "COLLSCAN" not in stages and any(stage in INDEXED_STAGES for stage in stages)
+
+
+async def explain_query(db, query: dict) -> dict:
+    collection = db[query["collection"]]
+    if "pipeline" in query:
+        return await db.command("aggregate", query["collection"], pipeline=query["pipeline"], explain=True)
+    cursor = collection.find(query["filter"])
+    if query.get("sort"):
+        cursor = cursor.sort(query["sort"])
+    if query.get("limit"):
+        cursor = cursor.limit(query["limit"])
+    return await cursor.explain()
+
+
+async def check_query_plans(db) -> List[str]:
+    """Registered queries that are not answered from an index, with their plan stages"""
+    failures = []
+    for query in catalog_queries():
+        explain = await explain_query(db, query)
+        if not uses_index(explain):
+            failures.append(f"{query['name']} ({query['collection']}): {' > '.join(plan_stages(explain))}")
+    return failures
@@ -0,0 +1,212 @@
+"""Asyncio-native background jobs.
+
+Jobs run as tasks on the server's own event loop, so background work yields
+at every await like a request handler does instead of competing with the
+loop from a scheduler thread. Two kinds of job are supported:
+
+* interval jobs (``every``) run a coroutine function every ``seconds``; a
+  tick that finds the job's concurrency limit already reached is skipped
+  rather than queued, so a slow run never piles up behind itself;
+* deadline queues (``deadlines``) hold one-shot deadlines per key (a room's
+  expiry, a challenge's start). Deadlines are kept in a min-heap and a
+  single dispatcher sleeps until the earliest one; keys due at the same
+  moment are handed to the handler together. Cancelled or rescheduled keys
+  are dropped lazily: the heap may hold stale entries, and an entry only
+  fires if it still matches the key's current deadline. A due batch waits
+  for a free slot instead of being skipped.
+
+Every job type has its own concurrency limit. ``stop`` cancels the
+dispatchers, gives running jobs ``shutdown_timeout`` seconds to finish and
+cancels whatever is still running after that.
+"""
+import asyncio
+import heapq
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+
+# Longest single sleep of a deadline dispatcher, so a wall-clock jump is noticed within this time
+MAX_SLEEP_SECONDS = 60.0
+
+
+class JobType:
+    """Concurrency limit, running tasks and counters of one kind of job"""
+
+    def __init__(self, name: str, concurrency: int = 1):
+        self.name = name
+        self.concurrency = concurrency
+        self._slots = asyncio.Semaphore(concurrency)
+        self.running: Set[asyncio.Task] = set()
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+
+    @property
+    def busy(self) -> bool:
+        return len(self.running) >= self.concurrency
+
+    async def submit(self, func: Callable[..., Awaitable[None]], *args):
+        """Wait for a free slot, then run ``func(*args)`` as a task"""
+        await self._slots.acquire()
+        task = asyncio.create_task(self._guarded(func, args))
+        self.running.add(task)
+        # Released here rather than in _guarded, which never runs for a task
+        # cancelled before its first step
+        task.add_done_callback(self._finished)
+
+    async def _guarded(self, func, args):
+        self.runs += 1
+        try:
+            await func(*args)
+        except Exception as e:
+            self.failures += 1
+            print(f"Error in job {self.name}: {e}")
+
+    def _finished(self, task: asyncio.Task):
+        self.running.discard(task)
+        self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "running": len(self.running),
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+        }
+
+
+class IntervalJob(JobType):
+    def __init__(self, name: str, seconds: float, func: Callable[[], Awaitable[None]],
+                 concurrency: int = 1):
+        super().__init__(name, concurrency)
+        self.seconds = seconds
+        self.func = func
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        next_run = loop.time() + self.seconds
+        while True:
+            await asyncio.sleep(max(next_run - loop.time(), 0.0))
+            if self.busy:
+                self.skipped += 1
+            else:
+                await self.submit(self.func)
+            # Ticks missed while the loop was busy are not made up
+            while next_run <= loop.time():
+                next_run += self.seconds
+
+    def stats(self) -> dict:
+        return {"kind": "interval", "seconds": self.seconds, **super().stats()}
+
+
+class DeadlineQueue(JobType):
+    def __init__(self, name: str, handler: Callable[[List[str]], Awaitable[None]],
+                 concurrency: int = 1):
+        super().__init__(name, concurrency)
+        self.handler = handler
+        self._heap: List[Tuple[float, str]] = []
+        self._deadlines: Dict[str, float] = {}
+        self._wakeup = asyncio.Event()
+        self.fired = 0
+
+    def schedule(self, key: str, when: datetime):
+        deadline = when.timestamp()
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, key))
+        if self._heap[0] == (deadline, key):
+            # New earliest deadline: cut the current sleep short
+            self._wakeup.set()
+
+    def cancel(self, key: str):
+        self._deadlines.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def pop_due(self, now: float) -> List[str]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, key = heapq.heappop(self._heap)
+            if self._deadlines.get(key) == deadline:
+                del self._deadlines[key]
+                due.append(key)
+        return due
+
+    def next_delay(self, now: float) -> float:
+        # Skip entries left behind by cancel/reschedule
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return MAX_SLEEP_SECONDS
+        return min(max(self._heap[0][0] - now, 0.0), MAX_SLEEP_SECONDS)
+
+    async def dispatch(self):
+        while True:
+            now = datetime.now(timezone.utc).timestamp()
+            due = self.pop_due(now)
+            if due:
+                self.fired += len(due)
+                await self.submit(self.handler, due)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.next_delay(now))
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "kind": "deadlines",
+            "scheduled": len(self._deadlines),
+            "heap_entries": len(self._heap),
+            "fired": self.fired,
+            **super().stats(),
+        }
+
+
+class JobScheduler:
+    def __init__(self, shutdown_timeout: float = 10.0):
+        self.shutdown_timeout = shutdown_timeout
+        self.jobs: Dict[str, JobType] = {}
+        self._dispatchers: List[asyncio.Task] = []
+        self._started = False
+
+    def _register(self, job: JobType) -> JobType:
+        if job.name in self.jobs:
+            raise ValueError(f"Job {job.name} is already registered")
+        self.jobs[job.name] = job
+        if self._started:
+            self._dispatchers.append(asyncio.create_task(job.dispatch()))
+        return job
+
+    def every(self, name: str, seconds: float, func: Callable[[], Awaitable[None]],
+              concurrency: int = 1) -> IntervalJob:
+        return self._register(IntervalJob(name, seconds, func, concurrency))
+
+    def deadlines(self, name: str, handler: Callable[[List[str]], Awaitable[None]],
+                  concurrency: int = 1) -> DeadlineQueue:
+        return self._register(DeadlineQueue(name, handler, concurrency))
+
+    def start(self):
+        self._started = True
+        self._dispatchers = [asyncio.create_task(job.dispatch()) for job in self.jobs.values()]
+
+    async def stop(self):
+        for task in self._dispatchers:
+            task.cancel()
+        await asyncio.gather(*self._dispatchers, return_exceptions=True)
+        self._dispatchers = []
+        self._started = False
+
+        running = [task for job in self.jobs.values() for task in job.running]
+        if not running:
+            return
+        _, pending = await asyncio.wait(running, timeout=self.shutdown_timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Cancelled {len(pending)} jobs still running at shutdown")
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {name: job.stats() for name, job in self.jobs.items()}
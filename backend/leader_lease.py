@@ -0,0 +1,106 @@
+"""Mongo-backed leader lease for periodic jobs.
+
+Every process competes for one lease document; the holder renews it every
+``renew_interval`` seconds and periodic jobs only run in the process that
+holds it. A lease that has not been renewed for ``ttl`` seconds is free for
+the taking, so a crashed leader is replaced within one TTL; a leader that
+shuts down cleanly releases the lease at once. A TTL index removes lease
+documents nobody renews.
+
+Acquiring and renewing are the same conditional upsert: it matches the
+document only if this process holds it or it has expired, and a competing
+insert for the same ``_id`` fails with a duplicate key error.
+"""
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class LeaderLease:
+    def __init__(self, collection, name: str = "periodic-jobs", ttl: float = 15.0,
+                 renew_interval: float = 5.0):
+        self.collection = collection
+        self.name = name
+        self.ttl = ttl
+        self.renew_interval = renew_interval
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._valid_until: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        # Judged against our own record of the lease, so a leader cut off
+        # from Mongo steps down when its lease runs out instead of carrying on
+        return self._valid_until is not None and datetime.now(timezone.utc) < self._valid_until
+
+    async def acquire(self) -> bool:
+        """Take or renew the lease; True if this process holds it afterwards"""
+        now = datetime.now(timezone.utc)
+        expires_at = now + timedelta(seconds=self.ttl)
+        was_leader = self.is_leader
+        try:
+            lease = await self.collection.find_one_and_update(
+                {"_id": self.name, "$or": [{"holder": self.holder}, {"expires_at": {"$lt": now}}]},
+                [{"$set": {
+                    # Inputs are read before this stage applies, so $holder is the previous holder
+                    "acquired_at": {"$cond": [{"$eq": ["$holder", self.holder]}, "$acquired_at", now]},
+                    "holder": self.holder,
+                    "expires_at": expires_at,
+                    "renewed_at": now,
+                }}],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            lease = None
+        self._valid_until = expires_at if lease is not None else None
+        if self.is_leader != was_leader:
+            print(f"{'Acquired' if self.is_leader else 'Lost'} leader lease {self.name} as {self.holder}")
+        return self.is_leader
+
+    async def release(self):
+        if self._valid_until is not None:
+            self._valid_until = None
+            await self.collection.delete_one({"_id": self.name, "holder": self.holder})
+
+    async def status(self) -> dict:
+        lease = await self.collection.find_one({"_id": self.name})
+        return {
+            "name": self.name,
+            "holder": lease["holder"] if lease else None,
+            "acquired_at": lease.get("acquired_at") if lease else None,
+            "expires_at": lease["expires_at"] if lease else None,
+            "this_process": self.holder,
+            "is_leader": self.is_leader,
+        }
+
+    async def start(self):
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+        self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await self.acquire()
+            except Exception as e:
+                print(f"Error renewing leader lease {self.name}: {e}")
+            await asyncio.sleep(self.renew_interval)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await self.release()
+        except Exception as e:
+            print(f"Error releasing leader lease {self.name}: {e}")
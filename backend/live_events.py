@@ -0,0 +1,213 @@
+"""Fan-out of live events to WebSocket and SSE subscribers.
+
+Handlers publish small events to a channel and every connection watching
+that channel receives them: ``room:<id>`` carries a battle room's joins,
+submissions, vote aggregates and status changes; ``feed`` carries rooms
+and challenges being created, updated and closed for the home feed.
+
+Events published to a channel within ``batch_interval`` of each other are
+sent as one frame (a single event, or a ``batch`` event wrapping several),
+so a burst of votes costs one broker message and one socket write per
+subscriber. Frames go through an ``event_brokers`` broker so that every
+server process delivers them to its own subscribers.
+
+Vote aggregates go through ``ScoreCoalescer`` first, which throttles them
+per room and keeps only the latest state of each performance.
+
+Each frame is serialized once and the same text is queued for every
+subscriber. A subscriber that falls ``queue_size`` frames behind has its
+backlog replaced by a single ``resync`` event, telling it to start over
+from a fresh snapshot instead of holding up the publisher.
+"""
+import asyncio
+import json
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+from event_brokers import EventBroker, InProcessBroker
+
+FEED_CHANNEL = "feed"
+RESYNC_EVENT = json.dumps({"type": "resync"})
+
+
+def room_channel(room_id: str) -> str:
+    return f"room:{room_id}"
+
+
+def encode_event(event: dict) -> str:
+    return json.dumps(jsonable_encoder(event))
+
+
+def encode_frame(events: List[str]) -> str:
+    """One frame for already encoded events, without decoding them again"""
+    if len(events) == 1:
+        return events[0]
+    return '{"type": "batch", "events": [' + ", ".join(events) + "]}"
+
+
+class EventHub:
+    def __init__(self, queue_size: int = 256, batch_interval: float = 0.05,
+                 broker: Optional[EventBroker] = None):
+        self.queue_size = queue_size
+        self.batch_interval = batch_interval
+        self.broker = broker or InProcessBroker()
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._outbox: Dict[str, List[str]] = defaultdict(list)
+        self._flush_task: Optional[asyncio.Task] = None
+        self.published = 0
+        self.frames = 0
+        self.resyncs = 0
+
+    async def start(self, broker: Optional[EventBroker] = None):
+        if broker is not None:
+            self.broker = broker
+        await self.broker.start(self.deliver, self.resync)
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        await self.flush()
+        await self.broker.stop()
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[channel]
+
+    def publish(self, channel: str, event: dict):
+        """Queue ``event`` for the channel's next frame; never blocks"""
+        if self.broker.local_only and not self._subscribers.get(channel):
+            return
+        self._outbox[channel].append(encode_event(event))
+        self.published += 1
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.batch_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        """Send every channel's pending events to the broker, one frame per channel"""
+        outbox, self._outbox = self._outbox, defaultdict(list)
+        for channel, events in outbox.items():
+            try:
+                await self.broker.publish(channel, encode_frame(events))
+                self.frames += 1
+            except Exception as e:
+                print(f"Error publishing events to {channel}: {e}")
+
+    def deliver(self, channel: str, frame: str):
+        """Broker callback: queue ``frame`` for this process's subscribers of ``channel``"""
+        subscribers = self._subscribers.get(channel)
+        if not subscribers:
+            return
+        for queue in subscribers:
+            try:
+                queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._resync_queue(queue)
+
+    def resync(self):
+        """Broker callback: frames may have been lost, so every subscriber here resyncs"""
+        for subscribers in self._subscribers.values():
+            for queue in subscribers:
+                self._resync_queue(queue)
+
+    def _resync_queue(self, queue: asyncio.Queue):
+        # Whatever is still queued is superseded by the full reload
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(RESYNC_EVENT)
+        self.resyncs += 1
+
+    def subscriber_count(self, channel: str) -> int:
+        return len(self._subscribers.get(channel, ()))
+
+    def stats(self) -> dict:
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published,
+            "frames": self.frames,
+            "resyncs": self.resyncs,
+        }
+
+
+class ScoreCoalescer:
+    """Throttle vote-aggregate events to ``max_frames_per_second`` per room
+
+    Updates arriving between two emissions are merged per performance, the
+    latest state winning, and go out together as one ``scores`` event. The
+    intermediate states that never reach subscribers are counted in
+    ``dropped``.
+    """
+
+    # Emission times are only needed for one interval; prune beyond this many rooms
+    PRUNE_THRESHOLD = 1024
+
+    def __init__(self, publish: Callable[[str, dict], None], max_frames_per_second: float = 4.0):
+        self.publish = publish
+        self.min_interval = 1 / max_frames_per_second
+        self._pending: Dict[str, Dict[str, dict]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._last_emit: Dict[str, float] = {}
+        self.updates = 0
+        self.frames = 0
+        self.dropped = 0
+
+    def update(self, room_id: str, performance: dict):
+        self.updates += 1
+        pending = self._pending.setdefault(room_id, {})
+        previous = pending.get(performance["id"])
+        if previous is not None:
+            self.dropped += 1
+            # Concurrent votes can finish out of order; the higher count is the newer state
+            if previous.get("vote_count", 0) > performance.get("vote_count", 0):
+                return
+        pending[performance["id"]] = performance
+        if room_id not in self._timers:
+            loop = asyncio.get_running_loop()
+            due = self._last_emit.get(room_id, 0.0) + self.min_interval
+            self._timers[room_id] = loop.call_later(max(due - loop.time(), 0), self._emit, room_id)
+
+    def _emit(self, room_id: str):
+        self._timers.pop(room_id, None)
+        pending = self._pending.pop(room_id, None)
+        if not pending:
+            return
+        now = asyncio.get_running_loop().time()
+        if len(self._last_emit) > self.PRUNE_THRESHOLD:
+            self._last_emit = {
+                room: emitted for room, emitted in self._last_emit.items()
+                if now - emitted < self.min_interval
+            }
+        self._last_emit[room_id] = now
+        self.frames += 1
+        self.publish(room_id, {"type": "scores", "performances": list(pending.values())})
+
+    def flush(self):
+        """Emit everything pending now, e.g. on shutdown"""
+        for room_id, timer in list(self._timers.items()):
+            timer.cancel()
+            self._emit(room_id)
+
+    def stats(self) -> dict:
+        return {
+            "updates": self.updates,
+            "frames": self.frames,
+            "dropped_intermediate_states": self.dropped,
+            "rooms_pending": len(self._pending),
+        }
@@ -0,0 +1,225 @@
+"""Versioned, idempotent database migrations.
+
+Each step is registered with ``@migration(version, name)`` and applied at
+most once per database: applied versions are recorded in the
+``migrations`` collection, so a worker starting against an up-to-date
+database reads that one small collection and does nothing else.
+
+When steps are pending, the runner takes the ``migrations`` lease first so
+that workers starting together apply them one at a time; a worker that has
+to wait re-reads the applied versions once it holds the lease. Steps are
+still written to be safe to run twice, since a worker can die between
+applying a step and recording it.
+"""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from audio_streaming import DEFAULT_AUDIO_CONTENT_TYPE, TIMELINE_PLACEHOLDER, decode_inline_audio
+from blob_store import blob_reference, create_blob_store
+from index_catalog import INDEXES, build_indexes
+from vote_aggregation import SCORE_FIELDS
+
+Step = Callable[[object], Awaitable[None]]
+MIGRATIONS: List[Tuple[int, str, Step]] = []
+
+# Performances backfilled per aggregation
+BACKFILL_BATCH_SIZE = 500
+
+
+def migration(version: int, name: str):
+    def register(step: Step) -> Step:
+        if any(registered == version for registered, _, _ in MIGRATIONS):
+            raise ValueError(f"Migration {version} is already registered")
+        MIGRATIONS.append((version, name, step))
+        return step
+    return register
+
+
+async def applied_versions(db) -> set:
+    return {doc["_id"] async for doc in db.migrations.find({}, {"_id": 1})}
+
+
+async def run_migrations(db, lease=None, migrations: Optional[list] = None) -> List[int]:
+    """Apply pending migrations in version order; returns the versions applied
+
+    ``lease`` is a LeaderLease used as a lock while steps are applied.
+    """
+    migrations = sorted(MIGRATIONS if migrations is None else migrations, key=lambda m: m[0])
+    applied = await applied_versions(db)
+    if all(version in applied for version, _, _ in migrations):
+        return []
+
+    if lease is not None:
+        await lease.start()
+        while not lease.is_leader:
+            await asyncio.sleep(lease.renew_interval)
+    try:
+        # Another worker may have applied them while we waited for the lease
+        applied = await applied_versions(db)
+        done = []
+        for version, name, step in migrations:
+            if version in applied:
+                continue
+            await step(db)
+            await db.migrations.update_one(
+                {"_id": version},
+                {"$set": {"name": name, "applied_at": datetime.now(timezone.utc)}},
+                upsert=True,
+            )
+            print(f"Applied migration {version}: {name}")
+            done.append(version)
+        return done
+    finally:
+        if lease is not None:
+            await lease.stop()
+
+
+@migration(1, "create indexes")
+async def create_indexes(db):
+    # The catalog is the one list of indexes; later catalog changes are built at startup
+    await build_indexes(db)
+
+
+BUILTIN_EFFECT_AUDIO = (
+    "UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJiv"
+    "rJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwF"
+    "JHfH8N2QQAoUX7Xqz6hVFQlLH"
+)
+
+# Built-in effects are identified by ``key``; their ids are assigned once and never change
+BUILTIN_EFFECTS = [
+    {"key": "boom", "name": "Boom", "duration": 0.5},
+    {"key": "applause", "name": "Applause", "duration": 1.0},
+    {"key": "air-horn", "name": "Air Horn", "duration": 0.8},
+    {"key": "vinyl-scratch", "name": "Vinyl Scratch", "duration": 0.3},
+]
+
+
+def builtin_effect_upserts(now: datetime) -> List[UpdateOne]:
+    return [
+        UpdateOne(
+            {"key": effect["key"]},
+            {
+                "$set": {
+                    "name": effect["name"],
+                    "category": "builtin",
+                    "audio_data": BUILTIN_EFFECT_AUDIO,
+                    "duration": effect["duration"],
+                },
+                "$setOnInsert": {"id": str(uuid.uuid4()), "created_by": None, "created_at": now},
+            },
+            upsert=True,
+        )
+        for effect in BUILTIN_EFFECTS
+    ]
+
+
+@migration(2, "key built-in effects and drop the copies seeded on every restart")
+async def key_builtin_effects(db):
+    for effect in BUILTIN_EFFECTS:
+        keyed = await db.audio_effects.find_one({"key": effect["key"]}, {"_id": 0, "id": 1})
+        copies = await db.audio_effects.find(
+            {"category": "builtin", "name": effect["name"], "key": {"$exists": False}},
+            {"_id": 0, "id": 1}
+        ).sort("created_at", 1).to_list(length=None)
+        copy_ids = [copy["id"] for copy in copies]
+        if keyed:
+            kept, duplicates = keyed["id"], copy_ids
+        elif copy_ids:
+            # The oldest copy becomes the keyed effect
+            kept, duplicates = copy_ids[0], copy_ids[1:]
+            await db.audio_effects.update_one({"id": kept}, {"$set": {"key": effect["key"]}})
+        else:
+            continue
+        if duplicates:
+            # Timelines keep playing the same sound through the copy that stays
+            await db.performances.update_many(
+                {"audio_timeline.effect_id": {"$in": duplicates}},
+                {"$set": {"audio_timeline.$[clip].effect_id": kept}},
+                array_filters=[{"clip.effect_id": {"$in": duplicates}}],
+            )
+            await db.audio_effects.delete_many({"id": {"$in": duplicates}})
+
+    # The unique key index from the catalog must exist before the keyed upserts
+    await db.audio_effects.create_indexes(INDEXES["audio_effects"])
+    await db.audio_effects.bulk_write(builtin_effect_upserts(datetime.now(timezone.utc)), ordered=False)
+
+
+def vote_totals_pipeline(performance_ids: List[str]) -> list:
+    """Per performance: the score totals and count of its votes"""
+    return [
+        {"$match": {"performance_id": {"$in": performance_ids}}},
+        {"$group": {
+            "_id": "$performance_id",
+            **{f"{field}_total": {"$sum": f"${field}"} for field in SCORE_FIELDS},
+            "vote_count": {"$sum": 1},
+        }},
+    ]
+
+
+def vote_totals_update(totals: Optional[dict]) -> dict:
+    """Aggregate fields for a performance with ``totals`` (None when it has no votes)"""
+    totals = totals or {}
+    fields = {f"{field}_total": totals.get(f"{field}_total", 0) for field in SCORE_FIELDS}
+    fields["vote_count"] = totals.get("vote_count", 0)
+    fields["average_score"] = (
+        sum(fields[f"{field}_total"] for field in SCORE_FIELDS) / (fields["vote_count"] * len(SCORE_FIELDS))
+        if fields["vote_count"] else 0.0
+    )
+    # Legacy performances embedded every vote; the votes collection is the record now
+    return {"$set": fields, "$unset": {"votes": ""}}
+
+
+@migration(3, "backfill vote totals of performances from before running aggregates")
+async def backfill_vote_totals(db):
+    legacy = db.performances.find({"flow_total": {"$exists": False}}, {"_id": 0, "id": 1})
+    batch = []
+    async for performance in legacy:
+        batch.append(performance["id"])
+        if len(batch) == BACKFILL_BATCH_SIZE:
+            await backfill_batch(db, batch)
+            batch = []
+    if batch:
+        await backfill_batch(db, batch)
+
+
+async def backfill_batch(db, performance_ids: List[str]):
+    totals = {
+        result["_id"]: result
+        async for result in db.votes.aggregate(vote_totals_pipeline(performance_ids))
+    }
+    await db.performances.bulk_write([
+        UpdateOne({"id": performance_id}, vote_totals_update(totals.get(performance_id)))
+        for performance_id in performance_ids
+    ], ordered=False)
+
+
+@migration(4, "move inline performance audio into the blob store")
+async def move_inline_performance_audio(db, blob_store=None):
+    # Lists leave audio_data out, so players only find these recordings through audio_url
+    blob_store = blob_store or create_blob_store()
+    inline = db.performances.find(
+        {"audio_blob": None, "audio_data": {"$nin": [None, "", TIMELINE_PLACEHOLDER]}},
+        {"_id": 0, "id": 1, "audio_data": 1}
+    )
+    async for performance in inline:
+        try:
+            audio = decode_inline_audio(performance["audio_data"])
+        except ValueError:
+            print(f"Performance {performance['id']} has undecodable audio; leaving it inline")
+            continue
+        digest = await blob_store.put(audio)
+        await db.performances.update_one(
+            {"id": performance["id"], "audio_blob": None},
+            {
+                "$set": {
+                    "audio_blob": blob_reference(digest, len(audio), DEFAULT_AUDIO_CONTENT_TYPE),
+                    "audio_url": f"/api/performances/{performance['id']}/audio",
+                },
+                "$unset": {"audio_data": ""},
+            }
+        )
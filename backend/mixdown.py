@@ -0,0 +1,198 @@
+"""Timeline mixdown engine.
+
+Renders an ``audio_timeline`` (clips placed at offsets on a timeline) into a
+single 16-bit stereo WAV file. Everything here is a pure function of its
+arguments so that ``render_timeline`` can run in a process pool; the server
+resolves clip audio to bytes before submitting the job.
+
+Decoded clip PCM can be cached on disk between renders (see
+``render_cache``); each worker process opens the shared cache directory.
+"""
+import io
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from render_cache import DiskLRUCache, clip_cache_key
+
+SAMPLE_RATE = 44100
+CHANNELS = 2
+MAX_MIX_SECONDS = 15 * 60
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class MixdownError(Exception):
+    pass
+
+
+def decode_wav(data: bytes) -> Tuple[np.ndarray, int]:
+    """Decode a RIFF/WAVE file into float32 samples shaped (frames, channels)"""
+    if len(data) < 12 or data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        raise MixdownError("Not a WAV file")
+
+    fmt = None
+    payload = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack("<I", data[offset + 4:offset + 8])[0]
+        body = data[offset + 8:offset + 8 + chunk_size]
+        if chunk_id == b"fmt ":
+            fmt = body
+        elif chunk_id == b"data":
+            payload = body
+        offset += 8 + chunk_size + (chunk_size & 1)
+    if fmt is None or payload is None or len(fmt) < 16:
+        raise MixdownError("WAV file is missing its fmt or data chunk")
+
+    format_tag, channels, sample_rate, _, block_align, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]
+    if channels == 0 or sample_rate == 0 or block_align == 0:
+        raise MixdownError("Invalid WAV header")
+
+    payload = payload[:len(payload) - len(payload) % block_align]
+    if format_tag == WAVE_FORMAT_PCM:
+        if bits == 8:
+            samples = (np.frombuffer(payload, dtype=np.uint8).astype(np.float32) - 128) / 128
+        elif bits == 16:
+            samples = np.frombuffer(payload, dtype="<i2").astype(np.float32) / 32768
+        elif bits == 24:
+            raw = np.frombuffer(payload, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+            ints = raw[:, 0] | (raw[:, 1] << 8) | (raw[:, 2] << 16)
+            ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+            samples = ints.astype(np.float32) / 8388608
+        elif bits == 32:
+            samples = np.frombuffer(payload, dtype="<i4").astype(np.float32) / 2147483648
+        else:
+            raise MixdownError(f"Unsupported PCM bit depth: {bits}")
+    elif format_tag == WAVE_FORMAT_IEEE_FLOAT and bits in (32, 64):
+        samples = np.frombuffer(payload, dtype="<f4" if bits == 32 else "<f8").astype(np.float32)
+    else:
+        raise MixdownError(f"Unsupported WAV encoding: {format_tag}")
+
+    return samples.reshape(-1, channels), sample_rate
+
+
+def conform(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Resample to SAMPLE_RATE and map to CHANNELS"""
+    if samples.shape[1] == 1:
+        samples = np.repeat(samples, CHANNELS, axis=1)
+    elif samples.shape[1] > CHANNELS:
+        # Fold extra channels down rather than dropping them
+        samples = np.stack([samples[:, 0::2].mean(axis=1), samples[:, 1::2].mean(axis=1)], axis=1)
+
+    if sample_rate != SAMPLE_RATE and len(samples) > 1:
+        frames = int(round(len(samples) * SAMPLE_RATE / sample_rate))
+        source_times = np.arange(len(samples)) / sample_rate
+        target_times = np.arange(frames) / SAMPLE_RATE
+        samples = np.stack(
+            [np.interp(target_times, source_times, samples[:, c]) for c in range(CHANNELS)],
+            axis=1,
+        ).astype(np.float32)
+    return samples
+
+
+_pcm_caches: Dict[str, DiskLRUCache] = {}
+
+
+def pcm_cache_for(root: str, max_bytes: int) -> DiskLRUCache:
+    """The PCM cache for ``root`` in this process"""
+    cache = _pcm_caches.get(root)
+    if cache is None:
+        cache = _pcm_caches[root] = DiskLRUCache(root, max_bytes)
+    return cache
+
+
+def load_clip(audio: bytes, cache: Optional[DiskLRUCache] = None) -> np.ndarray:
+    """Decoded and conformed samples of a clip, going through ``cache`` if given"""
+    if cache is None:
+        return conform(*decode_wav(audio))
+    key = clip_cache_key(audio)
+    cached = cache.get(key)
+    if cached is not None:
+        return np.load(io.BytesIO(cached), allow_pickle=False)
+    samples = conform(*decode_wav(audio))
+    buffer = io.BytesIO()
+    np.save(buffer, samples, allow_pickle=False)
+    cache.put(key, buffer.getvalue())
+    return samples
+
+
+def mix(tracks: List[Tuple[np.ndarray, float, float]]) -> np.ndarray:
+    """Sum (samples, offset_seconds, gain) tracks into one float32 buffer"""
+    placed = []
+    length = 0
+    for samples, offset, gain in tracks:
+        start = int(round(max(offset, 0) * SAMPLE_RATE))
+        placed.append((samples, start, gain))
+        length = max(length, start + len(samples))
+    if length > MAX_MIX_SECONDS * SAMPLE_RATE:
+        raise MixdownError(f"Timeline is longer than {MAX_MIX_SECONDS} seconds")
+
+    buffer = np.zeros((length, CHANNELS), dtype=np.float32)
+    for samples, start, gain in placed:
+        buffer[start:start + len(samples)] += samples * gain
+
+    # Clipping protection: scale the whole mix down if it overshoots full scale
+    peak = float(np.max(np.abs(buffer))) if length else 0.0
+    if peak > 1.0:
+        buffer /= peak
+    return np.clip(buffer, -1.0, 1.0)
+
+
+def encode_wav(samples: np.ndarray) -> bytes:
+    pcm = (samples * 32767).astype("<i2").tobytes()
+    out = io.BytesIO()
+    out.write(b"RIFF")
+    out.write(struct.pack("<I", 36 + len(pcm)))
+    out.write(b"WAVE")
+    out.write(b"fmt ")
+    out.write(struct.pack("<IHHIIHH", 16, WAVE_FORMAT_PCM, CHANNELS, SAMPLE_RATE,
+                          SAMPLE_RATE * CHANNELS * 2, CHANNELS * 2, 16))
+    out.write(b"data")
+    out.write(struct.pack("<I", len(pcm)))
+    out.write(pcm)
+    return out.getvalue()
+
+
+def render_timeline(clips: List[Dict[str, Any]], pcm_cache_dir: Optional[str] = None,
+                    pcm_cache_bytes: int = 0) -> Dict[str, Any]:
+    """Render clips into a WAV file
+
+    Each clip is ``{"audio": bytes, "position": seconds, "gain": float,
+    "duration": Optional[seconds]}``; ``duration`` trims the clip. Clips that
+    cannot be decoded are left out and their indexes reported in ``skipped``.
+    """
+    cache = pcm_cache_for(pcm_cache_dir, pcm_cache_bytes) if pcm_cache_dir else None
+    hits_before, misses_before = (cache.hits, cache.misses) if cache else (0, 0)
+    tracks = []
+    skipped = []
+    for index, clip in enumerate(clips):
+        try:
+            samples = load_clip(clip["audio"], cache)
+        except MixdownError:
+            skipped.append(index)
+            continue
+        duration: Optional[float] = clip.get("duration")
+        if duration:
+            samples = samples[:int(round(float(duration) * SAMPLE_RATE))]
+        gain = clip.get("gain")
+        tracks.append((samples, float(clip.get("position") or 0), 1.0 if gain is None else float(gain)))
+
+    if not tracks:
+        raise MixdownError("No decodable clips in timeline")
+
+    mixed = mix(tracks)
+    return {
+        "audio": encode_wav(mixed),
+        "content_type": "audio/wav",
+        "duration": len(mixed) / SAMPLE_RATE,
+        "skipped": skipped,
+        "pcm_cache_hits": cache.hits - hits_before if cache else 0,
+        "pcm_cache_misses": cache.misses - misses_before if cache else 0,
+    }
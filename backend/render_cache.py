@@ -0,0 +1,144 @@
+"""Size-bounded disk caches for timeline mixdowns.
+
+Two caches live on disk: rendered mixes keyed by a canonical hash of the
+timeline, and decoded clip PCM keyed by the hash of the clip's bytes. Both
+use ``DiskLRUCache``, which keeps no shared index so the server process and
+the mixdown worker processes can use the same directory; a file's mtime is
+its recency and eviction sweeps the directory oldest first.
+"""
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional
+
+# Bump when the mixdown output format changes so old entries stop matching
+RENDER_CACHE_VERSION = 1
+
+
+class DiskLRUCache:
+    def __init__(self, root: str, max_bytes: int, low_water: float = 0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(root, exist_ok=True)
+        self._approx_bytes = self._scan_total()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _entries(self):
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith("."):
+                    yield entry
+
+    def _scan_total(self) -> int:
+        return sum(entry.stat().st_size for entry in self._entries())
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process between the read and the touch
+            pass
+        self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        self._approx_bytes += len(data)
+        if self._approx_bytes > self.max_bytes:
+            self.sweep()
+
+    def sweep(self):
+        """Evict least recently used entries until under the low-water mark"""
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * self.low_water
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._approx_bytes = total
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bytes": self._approx_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def clip_cache_key(audio: bytes) -> str:
+    return f"v{RENDER_CACHE_VERSION}-{hashlib.sha256(audio).hexdigest()}"
+
+
+def timeline_cache_key(clips: List[Dict[str, Any]]) -> str:
+    """Canonical hash of resolved mixdown clips
+
+    Audio is represented by the SHA-256 of its bytes so the key does not
+    depend on how the clip was encoded in the request.
+    """
+    canonical = []
+    for clip in clips:
+        gain = clip.get("gain")
+        duration = clip.get("duration")
+        canonical.append({
+            "audio": hashlib.sha256(clip["audio"]).hexdigest(),
+            "position": float(clip.get("position") or 0),
+            "gain": 1.0 if gain is None else float(gain),
+            "duration": float(duration) if duration else None,
+        })
+    encoded = json.dumps(
+        {"version": RENDER_CACHE_VERSION, "clips": canonical},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def pack_render(result: Dict[str, Any]) -> bytes:
+    """Serialize a render_timeline result for the mix cache"""
+    meta = {k: v for k, v in result.items() if k != "audio"}
+    return json.dumps(meta).encode() + b"\n" + result["audio"]
+
+
+def unpack_render(data: bytes) -> Dict[str, Any]:
+    meta, _, audio = data.partition(b"\n")
+    result = json.loads(meta)
+    result["audio"] = audio
+    return result
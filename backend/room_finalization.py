@@ -0,0 +1,142 @@
+"""Set-based results for batches of finished rooms.
+
+Winners for a whole batch of rooms come from one aggregation pipeline
+(performances sorted by score and grouped per room), and every XP, wins and
+battles increment is applied with one unordered ``bulk_write`` on users plus
+one on rooms, so finalizing thousands of rooms at once stays a handful of
+round trips instead of a query and N updates per room.
+
+Each user award is conditional on the room not yet being in the user's
+``awarded_rooms`` and records it there in the same update. A batch that is
+retried after a crash between the users and the rooms write, or after its
+claim was taken over, therefore skips the awards already made.
+
+Before any of that, a worker claims the rooms it is about to finalize by
+stamping them with a claim token in one conditional update; only rooms
+carrying its token are finalized, so concurrent sweeps, expiry timers and
+``close_room`` calls in any number of processes finalize each room exactly
+once. A claim is released if finalizing fails, and a claim left behind by
+a crashed worker can be taken over after ``CLAIM_TIMEOUT_SECONDS``; a
+worker that is merely slow and loses its claim that way does no harm, as
+every write below can be repeated.
+"""
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+from pymongo import UpdateOne
+
+WINNER_XP = 100
+PARTICIPANT_XP = 25
+WINNER_BADGE = "Battle Winner"
+# Rooms per aggregation; bounds the $in list and the result document sizes
+FINALIZE_BATCH_SIZE = 1000
+CLAIM_TIMEOUT_SECONDS = 600
+# Rooms remembered per user to keep awards idempotent; far more than a retry can span
+AWARDED_ROOM_HISTORY = 100
+
+
+def claim_filter(room_ids: List[str], now: datetime, timeout: float = CLAIM_TIMEOUT_SECONDS) -> dict:
+    """Open rooms among ``room_ids`` that nobody holds a live claim on"""
+    return {
+        "id": {"$in": room_ids},
+        "status": {"$ne": "closed"},
+        "$or": [
+            {"results_claim": None},
+            {"results_claim.claimed_at": {"$lt": now - timedelta(seconds=timeout)}},
+        ],
+    }
+
+
+async def claim_rooms(rooms_collection, room_ids: List[str],
+                      timeout: float = CLAIM_TIMEOUT_SECONDS) -> Tuple[str, List[dict]]:
+    """Claim rooms for finalization; returns the claim token and the rooms won
+
+    Each room document is updated atomically, so of several workers racing
+    for a room exactly one sees it carry its token.
+    """
+    token = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    await rooms_collection.update_many(
+        claim_filter(room_ids, now, timeout),
+        {"$set": {"results_claim": {"token": token, "claimed_at": now}}},
+    )
+    claimed = await rooms_collection.find(
+        {"results_claim.token": token},
+        {"_id": 0, "id": 1, "results_announced": 1},
+    ).to_list(length=None)
+    return token, claimed
+
+
+async def release_claim(rooms_collection, token: str):
+    """Drop a claim without finalizing, so the rooms can be claimed again at once"""
+    await rooms_collection.update_many({"results_claim.token": token}, {"$unset": {"results_claim": ""}})
+
+
+def room_results_pipeline(room_ids: List[str]) -> list:
+    """Per room: the winning performance's user and the users of the others"""
+    return [
+        {"$match": {"room_id": {"$in": room_ids}}},
+        # Earlier submission wins a tie
+        {"$sort": {"room_id": 1, "average_score": -1, "submitted_at": 1}},
+        {"$group": {
+            "_id": "$room_id",
+            "user_ids": {"$push": "$user_id"},
+        }},
+    ]
+
+
+def results_write_ops(results: List[dict]) -> Tuple[List[UpdateOne], List[UpdateOne]]:
+    """User and room updates for pipeline results, one award per user and room
+
+    The winner gets the winner award; every other performance earns its
+    author the participant award, as announced results always have.
+    """
+    user_ops = []
+    room_ops = []
+    for result in results:
+        room_id = result["_id"]
+        winner_id, *others = result["user_ids"]
+        increments: Dict[str, Dict[str, int]] = defaultdict(lambda: {"xp": 0, "wins": 0, "battles": 0})
+        increments[winner_id]["xp"] += WINNER_XP
+        increments[winner_id]["wins"] += 1
+        increments[winner_id]["battles"] += 1
+        for user_id in others:
+            increments[user_id]["xp"] += PARTICIPANT_XP
+            increments[user_id]["battles"] += 1
+
+        for user_id, inc in increments.items():
+            push = {"awarded_rooms": {"$each": [room_id], "$slice": -AWARDED_ROOM_HISTORY}}
+            if user_id == winner_id:
+                push["badges"] = WINNER_BADGE
+            user_ops.append(UpdateOne(
+                {"id": user_id, "awarded_rooms": {"$ne": room_id}},
+                {"$inc": {field: value for field, value in inc.items() if value}, "$push": push},
+            ))
+        room_ops.append(UpdateOne(
+            {"id": room_id},
+            {"$set": {"winner_id": winner_id, "results_announced": True}},
+        ))
+    return user_ops, room_ops
+
+
+async def announce_results(rooms_collection, performances_collection, users_collection,
+                           room_ids: List[str]) -> List[dict]:
+    """Compute and apply results for ``room_ids``; returns the pipeline results
+
+    Rooms without performances have no result and are left untouched.
+    Users are written before rooms, so a room only shows as announced once
+    its awards are in.
+    """
+    all_results = []
+    for start in range(0, len(room_ids), FINALIZE_BATCH_SIZE):
+        batch = room_ids[start:start + FINALIZE_BATCH_SIZE]
+        results = await performances_collection.aggregate(room_results_pipeline(batch)).to_list(length=None)
+        if not results:
+            continue
+        user_ops, room_ops = results_write_ops(results)
+        await users_collection.bulk_write(user_ops, ordered=False)
+        await rooms_collection.bulk_write(room_ops, ordered=False)
+        all_results.extend(results)
+    return all_results
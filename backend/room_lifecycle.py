@@ -0,0 +1,85 @@
+"""Room phases and the timers that move rooms between them.
+
+A room waits in the lobby until its host starts it. Starting opens the
+performing phase (``active``) for ``timer_duration`` seconds, after which
+the room moves to ``judging`` for a fixed judging window. When judging ends
+the results of every room that finished judging at the same moment are
+announced in one batch (after a short delay with buffered votes, see
+server.RESULTS_DELAY_SECONDS) and the rooms become ``completed``; they stay
+viewable until ``expires_at`` closes them as before.
+
+    waiting --start--> active --timer_duration--> judging --judging window--> completed --expires_at--> closed
+
+Performances are accepted while a room is ``active``, votes only while it
+is ``judging``, so both freeze exactly at a phase change. The deadline of
+the current phase is stored on the room as ``phase_ends_at``; the server
+keeps those deadlines in a deadline queue and advances rooms with
+conditional updates, so only one process carries out each transition.
+"""
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+WAITING = "waiting"
+ACTIVE = "active"
+JUDGING = "judging"
+COMPLETED = "completed"
+CLOSED = "closed"
+
+# Phases with a timer; their end moves the room on
+TIMED_PHASES = (ACTIVE, JUDGING)
+# Every phase but closed; listed rather than matched with $ne so it can back a partial index
+OPEN_PHASES = (WAITING, ACTIVE, JUDGING, COMPLETED)
+DEFAULT_TIMER_DURATION = 300
+MAX_TIMER_DURATION = 3600
+
+
+def in_phase(room: dict, status: str, now: datetime) -> bool:
+    """Whether ``room`` is in phase ``status`` at ``now``
+
+    Judged by the stored deadline as well as the status, so a phase ends on
+    time even if the transition itself is carried out a little later.
+    """
+    phase_ends_at = room.get("phase_ends_at")
+    return room.get("status") == status and phase_ends_at is not None and now < phase_ends_at
+
+
+def accepts_submissions(room: dict, now: datetime) -> bool:
+    return in_phase(room, ACTIVE, now)
+
+
+def accepts_votes(room: dict, now: datetime) -> bool:
+    return in_phase(room, JUDGING, now)
+
+
+def timer_duration(value) -> int:
+    """Validated performing time in seconds; raises ValueError when out of range"""
+    seconds = int(value if value is not None else DEFAULT_TIMER_DURATION)
+    if not 1 <= seconds <= MAX_TIMER_DURATION:
+        raise ValueError(f"timer_duration must be between 1 and {MAX_TIMER_DURATION} seconds")
+    return seconds
+
+
+def start_fields(room: dict, now: datetime, judging_seconds: float, results_delay: float = 0) -> dict:
+    """Fields that start a waiting room's performing phase at ``now``
+
+    The room's expiry is pushed back if it would otherwise cut judging, or
+    the ``results_delay`` after it, short.
+    """
+    phase_ends_at = now + timedelta(seconds=room.get("timer_duration", DEFAULT_TIMER_DURATION))
+    judging_ends_at = phase_ends_at + timedelta(seconds=judging_seconds + results_delay)
+    return {
+        "status": ACTIVE,
+        "started_at": now,
+        "phase_ends_at": phase_ends_at,
+        "expires_at": max(room["expires_at"], judging_ends_at),
+    }
+
+
+def next_phase(status: str, phase_ends_at: datetime,
+               judging_seconds: float) -> Tuple[str, Optional[datetime]]:
+    """Status and phase deadline a timed phase moves to when it ends"""
+    if status == ACTIVE:
+        return JUDGING, phase_ends_at + timedelta(seconds=judging_seconds)
+    if status == JUDGING:
+        return COMPLETED, None
+    raise ValueError(f"Rooms in phase {status} have no timer")
@@ -1,56 +1,220 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pymongo import MongoClient
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from datetime import datetime, timedelta, timezone
 import os
 import uuid
+import base64
+import binascii
+import hashlib
+import math
 from typing import List, Optional, Dict, Any
 from pydantic import BaseModel
 import json
 import bcrypt
 from supabase import create_client, Client
 import asyncio
-from apscheduler.schedulers.background import BackgroundScheduler
-import atexit
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
+from auth_tokens import TokenVerifier, TokenVerificationError, UnknownSigningKey
+from identity_cache import IdentityCache, TTLCache
+from blob_store import BlobNotFound, blob_reference, create_blob_store, validate_digest
+from uploads import UploadError, UploadTooLarge, receive_upload
+from audio_streaming import (
+    DEFAULT_AUDIO_CONTENT_TYPE,
+    TIMELINE_PLACEHOLDER,
+    FileRangeResponse,
+    RangeNotSatisfiable,
+    audio_headers,
+    decode_inline_audio,
+    etag_matches,
+    parse_range_header,
+)
+from mixdown import render_timeline
+from render_cache import DiskLRUCache, pack_render, timeline_cache_key, unpack_render
+from vote_aggregation import MAX_SCORE, MIN_SCORE, SCORE_FIELDS, empty_aggregates, vote_aggregate_update
+from vote_buffer import DuplicateVote, VoteBuffer
+from live_events import FEED_CHANNEL, RESYNC_EVENT, EventHub, ScoreCoalescer, room_channel
+from event_brokers import create_event_broker
+from change_versions import VERSIONS_CHANNEL, ChangeVersions
+from job_scheduler import JobScheduler
+from room_finalization import announce_results, claim_rooms, release_claim
+from leader_lease import LeaderLease
+from migrations import run_migrations
+from index_catalog import OPEN_ROOMS, TIMED_ROOMS, UPCOMING_CHALLENGES, build_indexes, check_query_plans
+from room_lifecycle import (
+    CLOSED, COMPLETED, WAITING,
+    accepts_submissions, accepts_votes, next_phase, start_fields, timer_duration,
+)
 
 # Load environment variables from .env file
 load_dotenv('/app/backend/.env')
 
-app = FastAPI(title="RevMix API")
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
 # MongoDB setup
 MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
 DB_NAME = os.environ.get('DB_NAME', 'revmix_production')
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
 
 # Supabase setup
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
 SUPABASE_ANON_KEY = os.environ.get('SUPABASE_ANON_KEY')
 SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_KEY')
+SUPABASE_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')
+SUPABASE_JWT_AUDIENCE = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+JWKS_REFRESH_SECONDS = float(os.environ.get('JWKS_REFRESH_SECONDS', '600'))
+MAX_AUDIO_UPLOAD_BYTES = int(os.environ.get('MAX_AUDIO_UPLOAD_BYTES', str(20 * 1024 * 1024)))
+MIXDOWN_WORKERS = int(os.environ.get('MIXDOWN_WORKERS', '2'))
+RENDER_CACHE_PATH = os.environ.get(
+    'RENDER_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render_cache_data')
+)
+RENDER_CACHE_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+PCM_CACHE_MAX_BYTES = int(os.environ.get('PCM_CACHE_MAX_BYTES', str(1024 * 1024 * 1024)))
+# A pending render claimed longer ago than this is taken over by another worker
+RENDER_CLAIM_TIMEOUT_SECONDS = float(os.environ.get('RENDER_CLAIM_TIMEOUT_SECONDS', '600'))
+IDENTITY_CACHE_SIZE = int(os.environ.get('IDENTITY_CACHE_SIZE', '10000'))
+IDENTITY_CACHE_TTL_SECONDS = float(os.environ.get('IDENTITY_CACHE_TTL_SECONDS', '60'))
+IDENTITY_NEGATIVE_TTL_SECONDS = float(os.environ.get('IDENTITY_NEGATIVE_TTL_SECONDS', '30'))
+PERFORMANCE_OWNER_CACHE_SIZE = int(os.environ.get('PERFORMANCE_OWNER_CACHE_SIZE', '50000'))
+# "direct" writes each vote to Mongo in the request; "buffered" journals it locally and flushes in batches
+VOTE_INGESTION_MODE = os.environ.get('VOTE_INGESTION_MODE', 'direct')
+VOTE_JOURNAL_PATH = os.environ.get(
+    'VOTE_JOURNAL_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vote_journal')
+)
+VOTE_FLUSH_INTERVAL_MS = int(os.environ.get('VOTE_FLUSH_INTERVAL_MS', '200'))
+# Buffered votes accepted just before judging ends may sit in any worker's journal for up to
+# one flush interval and take about as long again to write; results wait that long
+RESULTS_DELAY_SECONDS = 2 * VOTE_FLUSH_INTERVAL_MS / 1000 if VOTE_INGESTION_MODE == "buffered" else 0
+REALTIME_QUEUE_SIZE = int(os.environ.get('REALTIME_QUEUE_SIZE', '256'))
+FEED_KEEPALIVE_SECONDS = float(os.environ.get('FEED_KEEPALIVE_SECONDS', '15'))
+# Events published to a channel within this window go out as one frame
+EVENT_BATCH_MS = int(os.environ.get('EVENT_BATCH_MS', '50'))
+SCORE_UPDATES_PER_SECOND = float(os.environ.get('SCORE_UPDATES_PER_SECOND', '4'))
+# Active rooms also drop out of /api/rooms by the clock, so its ETag rolls over this often
+ROOM_LIST_ETAG_SECONDS = int(os.environ.get('ROOM_LIST_ETAG_SECONDS', '30'))
+# With the in-process event broker, ETags only see this process's writes; set this
+# when the app runs as a single worker to answer If-None-Match with a 304 anyway
+LOCAL_CONDITIONAL_GETS = os.environ.get('LOCAL_CONDITIONAL_GETS', 'false').lower() in ('1', 'true')
+# Voting window that follows a room's performing phase (timer_duration)
+ROOM_JUDGING_SECONDS = float(os.environ.get('ROOM_JUDGING_SECONDS', '120'))
+# Rooms expire on their own deadline; the sweep only catches what the deadline heap missed
+ROOM_RECONCILE_MINUTES = float(os.environ.get('ROOM_RECONCILE_MINUTES', '30'))
+# Periodic jobs run only in the process holding this lease; a dead leader is replaced within the TTL
+LEADER_LEASE_TTL_SECONDS = float(os.environ.get('LEADER_LEASE_TTL_SECONDS', '15'))
+LEADER_LEASE_RENEW_SECONDS = float(os.environ.get('LEADER_LEASE_RENEW_SECONDS', '5'))
+# Run explain() on every catalogued query at startup and refuse to start if one is not an index scan
+QUERY_PLAN_CHECK = os.environ.get('QUERY_PLAN_CHECK', 'false').lower() in ('1', 'true')
+# Drop indexes the catalog no longer lists; only once no process of an older release is running
+INDEX_PRUNE = os.environ.get('INDEX_PRUNE', 'false').lower() in ('1', 'true')
+# Background jobs still running at shutdown get this long to finish before they are cancelled
+JOB_SHUTDOWN_TIMEOUT_SECONDS = float(os.environ.get('JOB_SHUTDOWN_TIMEOUT_SECONDS', '10'))
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 security = HTTPBearer()
+token_verifier = TokenVerifier(
+    SUPABASE_URL,
+    jwt_secret=SUPABASE_JWT_SECRET,
+    audience=SUPABASE_JWT_AUDIENCE,
+    jwks_refresh_interval=JWKS_REFRESH_SECONDS,
+)
+identity_cache = IdentityCache(
+    maxsize=IDENTITY_CACHE_SIZE,
+    ttl=IDENTITY_CACHE_TTL_SECONDS,
+    negative_ttl=IDENTITY_NEGATIVE_TTL_SECONDS,
+)
+blob_store = create_blob_store()
+
+# A performance's owner and room never change, so they can be cached for long
+performance_owner_cache = TTLCache(PERFORMANCE_OWNER_CACHE_SIZE, ttl=3600)
 
-client = MongoClient(MONGO_URL)
-db = client[DB_NAME]
+# Timeline mixdowns run in a process pool created in the lifespan hook
+mixdown_pool: Optional[ProcessPoolExecutor] = None
+background_tasks = set()
+
+# Rendered mixes are cached here; decoded clip PCM is cached by the workers
+render_cache = DiskLRUCache(os.path.join(RENDER_CACHE_PATH, "mixes"), RENDER_CACHE_MAX_BYTES)
+PCM_CACHE_PATH = os.path.join(RENDER_CACHE_PATH, "pcm")
+pcm_cache_stats = {"hits": 0, "misses": 0}
+# Identifies this process on the renders it claims
+RENDER_OWNER = uuid.uuid4().hex
+
+if VOTE_INGESTION_MODE not in ("direct", "buffered"):
+    raise ValueError(f"Unknown VOTE_INGESTION_MODE: {VOTE_INGESTION_MODE}")
+vote_buffer = (
+    VoteBuffer(VOTE_JOURNAL_PATH, flush_interval=VOTE_FLUSH_INTERVAL_MS / 1000)
+    if VOTE_INGESTION_MODE == "buffered" else None
+)
+
+# Live events for /ws/rooms/{room_id} sockets and /api/feed/stream subscribers
+event_hub = EventHub(queue_size=REALTIME_QUEUE_SIZE, batch_interval=EVENT_BATCH_MS / 1000)
+
+def publish_room_event(room_id: str, event: dict):
+    event_hub.publish(room_channel(room_id), {"room_id": room_id, **event})
+
+def publish_feed_event(event: dict):
+    event_hub.publish(FEED_CHANNEL, event)
+
+# Vote aggregates are throttled per room before they reach the hub
+score_coalescer = ScoreCoalescer(publish_room_event, max_frames_per_second=SCORE_UPDATES_PER_SECOND)
+
+# Change counters behind the ETags of polled endpoints
+change_versions = ChangeVersions()
+
+def spawn_background(coro):
+    """Run a coroutine detached from the request, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+# The Motor client is created in the lifespan hook so that its connection pool
+# is bound to the running event loop; the collections below are populated there.
+client: Optional[AsyncIOMotorClient] = None
+db = None
 
 # Collections
-users_collection = db.users
-rooms_collection = db.rooms
-performances_collection = db.performances
-votes_collection = db.votes
-challenges_collection = db.challenges
-audio_effects_collection = db.audio_effects
+users_collection = None
+rooms_collection = None
+performances_collection = None
+votes_collection = None
+challenges_collection = None
+audio_effects_collection = None
+leases_collection = None
+
+def connect_database():
+    """Create the pooled Motor client and bind the collection handles"""
+    global client, db, users_collection, rooms_collection, performances_collection
+    global votes_collection, challenges_collection, audio_effects_collection, leases_collection
+
+    client = AsyncIOMotorClient(
+        MONGO_URL,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        tz_aware=True,
+    )
+    db = client[DB_NAME]
+    users_collection = db.users
+    rooms_collection = db.rooms
+    performances_collection = db.performances
+    votes_collection = db.votes
+    challenges_collection = db.challenges
+    audio_effects_collection = db.audio_effects
+    leases_collection = db.leases
+
+def close_database():
+    global client
+    if client is not None:
+        client.close()
+        client = None
 
 # Pydantic models
 class User(BaseModel):
@@ -74,10 +238,12 @@ class Room(BaseModel):
     type: str  # solo, collab, challenge
     prompt: str
     participants: List[str] = []
-    status: str = "waiting"  # waiting, active, judging, completed, closed
+    status: str = "waiting"  # waiting, active, judging, completed, closed (see room_lifecycle)
     created_at: datetime
-    expires_at: datetime  # 1 hour from creation
+    expires_at: datetime  # 1 hour from creation, pushed back if judging would run past it
     timer_duration: int = 300  # 5 minutes in seconds
+    started_at: Optional[datetime] = None
+    phase_ends_at: Optional[datetime] = None  # end of the active or judging phase
     max_participants: int = 10
     results_announced: bool = False
     winner_id: Optional[str] = None
@@ -87,12 +253,16 @@ class Performance(BaseModel):
     user_id: str
     username: str
     room_id: str
-    audio_data: str  # base64 audio data
+    audio_blob: Optional[Dict[str, Any]] = None  # {sha256, size, content_type} in the blob store
+    audio_url: Optional[str] = None
+    render_status: Optional[str] = None  # pending, ready, failed (timeline mixdowns)
     duration: float
     timeline_marks: List[float] = []
     audio_timeline: List[Dict[str, Any]] = []  # For multi-track audio
     submitted_at: datetime
-    votes: Dict[str, Dict[str, int]] = {}  # {user_id: {flow: int, lyrics: int, creativity: int}}
+    flow_total: int = 0  # running score totals; individual votes live in the votes collection
+    lyrics_total: int = 0
+    creativity_total: int = 0
     average_score: float = 0.0
     vote_count: int = 0
 
@@ -124,7 +294,9 @@ class AudioEffect(BaseModel):
     id: str
     name: str
     category: str  # "builtin" or "custom"
-    audio_data: str  # base64 audio data
+    audio_data: Optional[str] = None  # base64 audio data (built-in effects)
+    audio_blob: Optional[Dict[str, Any]] = None  # {sha256, size, content_type} in the blob store
+    audio_url: Optional[str] = None
     duration: float
     created_by: Optional[str] = None
     created_at: datetime
@@ -139,43 +311,102 @@ class RegisterRequest(BaseModel):
     password: str
 
 # Authentication functions
+async def resolve_supabase_id(token: str):
+    """Validate a Supabase access token
+
+    Returns the Supabase user id and the token's expiry timestamp (None when
+    the token had to be checked remotely).
+    """
+    try:
+        claims = await token_verifier.verify(token)
+        return claims["sub"], claims.get("exp")
+    except UnknownSigningKey:
+        # Only tokens we cannot check locally pay for the round trip to Supabase
+        pass
+    except TokenVerificationError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user = await run_in_threadpool(supabase.auth.get_user, token)
+    if not user or not user.user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user.user.id, None
+
+# Bookkeeping fields that are not part of a user's public document
+USER_PROJECTION = {"_id": 0, "awarded_rooms": 0}
+
+async def load_user(user_id: str, query: dict):
+    """Return the user document, served from the identity cache when possible"""
+    if user_id is not None:
+        cached = identity_cache.get_user(user_id)
+        if cached is not None:
+            return cached
+    db_user = await users_collection.find_one(query, USER_PROJECTION)
+    if db_user:
+        identity_cache.users.set(db_user["id"], db_user)
+    return db_user
+
+async def authenticate_token(token: str):
+    """Resolve a bearer token to its user document and the token expiry"""
+    # Handle test user tokens
+    if token.startswith("test_token_"):
+        user_id = token.replace("test_token_", "")
+        db_user = await load_user(user_id, {"id": user_id, "is_test_user": True})
+        if db_user and db_user.get("is_test_user"):
+            return db_user, None
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid test token",
+        )
+    
+    # Regular Supabase authentication
+    supabase_id, expires_at = await resolve_supabase_id(token)
+    
+    # Get user from our database
+    db_user = await load_user(
+        identity_cache.user_id_for_supabase_id(supabase_id),
+        {"supabase_id": supabase_id},
+    )
+    if not db_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found in database",
+        )
+    return db_user, expires_at
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    token = credentials.credentials
     try:
-        token = credentials.credentials
-        
-        # Handle test user tokens
-        if token.startswith("test_token_"):
-            user_id = token.replace("test_token_", "")
-            db_user = users_collection.find_one({"id": user_id, "is_test_user": True})
-            if db_user:
-                db_user.pop('_id', None)
-                return db_user
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid test token",
-                )
-        
-        # Regular Supabase authentication
-        user = supabase.auth.get_user(token)
-        
-        if not user or not user.user:
+        if identity_cache.is_rejected(token):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
+                detail="Could not validate credentials",
             )
         
-        # Get user from our database
-        db_user = users_collection.find_one({"supabase_id": user.user.id})
-        if not db_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="User not found in database",
-            )
+        user_id = identity_cache.user_id_for_token(token)
+        if user_id is not None:
+            db_user = await load_user(user_id, {"id": user_id})
+            if db_user:
+                return db_user
         
-        db_user.pop('_id', None)
+        db_user, expires_at = await authenticate_token(token)
+        identity_cache.remember(token, db_user, expires_at)
         return db_user
+    except HTTPException:
+        # Negative-cache rejected tokens so repeated attempts skip Mongo and Supabase
+        identity_cache.reject(token)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -183,153 +414,286 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-# Room cleanup scheduler
-scheduler = BackgroundScheduler()
+# Background jobs run on the event loop; see job_scheduler
+job_scheduler = JobScheduler(shutdown_timeout=JOB_SHUTDOWN_TIMEOUT_SECONDS)
+leader_lease: Optional[LeaderLease] = None
 
-def cleanup_expired_rooms():
-    """Remove expired rooms and announce results"""
+def leader_only(job):
+    """Wrap a periodic job so it only runs in the process holding the leader lease"""
+    async def run():
+        if leader_lease is not None and leader_lease.is_leader:
+            await job()
+    run.__name__ = job.__name__
+    return run
+
+async def finalize_rooms(room_ids: list, status: str = CLOSED):
+    """Announce results for rooms that have none yet, then close them all
+
+    With ``status=COMPLETED`` the rooms are marked completed instead of
+    closed, which is how judging ends.
+
+    Only the rooms this call manages to claim are touched, so racing callers
+    (in this or another process) never finalize a room twice. Results for the
+    batch are computed and applied set-wise (see room_finalization); closing
+    is one update_many. On a failure the claim is released, so the next
+    timer or sweep retries the rooms straight away.
+    """
+    if not room_ids:
+        return []
+    token, rooms = await claim_rooms(rooms_collection, room_ids)
+    if not rooms:
+        return []
+    pending = [room["id"] for room in rooms if not room.get("results_announced", False)]
+    try:
+        if pending:
+            await announce_room_results(pending)
+        await close_rooms(token, [room["id"] for room in rooms], status)
+    except Exception:
+        await release_claim(rooms_collection, token)
+        raise
+    return rooms
+
+async def expire_rooms(room_ids: list):
+    """Deadline callback: finalize rooms whose deadline has passed"""
+    rooms = await rooms_collection.find({
+        "id": {"$in": room_ids},
+        "expires_at": {"$lte": datetime.now(timezone.utc)},
+        **OPEN_ROOMS
+    }, {"_id": 0, "id": 1}).to_list(length=None)
+    rooms = await finalize_rooms([room["id"] for room in rooms])
+    if rooms:
+        print(f"Expired {len(rooms)} rooms on their deadline")
+
+async def advance_room_phases(room_ids: list):
+    """Deadline callback: move rooms whose phase timer ran out to the next phase
+
+    Performing rooms start judging one by one; every room whose judging
+    ended at least RESULTS_DELAY_SECONDS ago is finalized in one batch, with
+    its results announced.
+    """
+    now = datetime.now(timezone.utc)
+    rooms = await rooms_collection.find({
+        "id": {"$in": room_ids},
+        **TIMED_ROOMS,
+        "phase_ends_at": {"$lte": now}
+    }, {"_id": 0, "id": 1, "status": 1, "phase_ends_at": 1}).to_list(length=None)
+
+    judged = []
+    for room in rooms:
+        status, phase_ends_at = next_phase(room["status"], room["phase_ends_at"], ROOM_JUDGING_SECONDS)
+        if status == COMPLETED:
+            results_at = room["phase_ends_at"] + timedelta(seconds=RESULTS_DELAY_SECONDS)
+            if now < results_at:
+                room_phases.schedule(room["id"], results_at)
+            else:
+                judged.append(room["id"])
+            continue
+        # Conditional on the phase being unchanged so only one process moves the room
+        result = await rooms_collection.update_one(
+            {"id": room["id"], "status": room["status"], "phase_ends_at": room["phase_ends_at"]},
+            {"$set": {"status": status, "phase_ends_at": phase_ends_at}}
+        )
+        if result.modified_count:
+            publish_phase_change(room["id"], {"status": status, "phase_ends_at": phase_ends_at})
+            room_phases.schedule(room["id"], phase_ends_at)
+
+    if judged:
+        if vote_buffer is not None:
+            # Votes this process accepted before judging ended count towards the results
+            await vote_buffer.flush()
+        rooms = await finalize_rooms(judged, status=COMPLETED)
+        if rooms:
+            print(f"Judging ended for {len(rooms)} rooms")
+
+def publish_phase_change(room_id: str, fields: dict):
+    change_versions.bump("rooms", f"room:{room_id}")
+    publish_room_event(room_id, {"type": "status", **fields})
+    publish_feed_event({"type": "room_updated", "room": {"id": room_id, **fields}})
+
+room_phases = job_scheduler.deadlines("room_phases", advance_room_phases, concurrency=2)
+
+# Claims make concurrent batches safe, so two may finalize at once
+room_deadlines = job_scheduler.deadlines("room_expiry", expire_rooms, concurrency=2)
+
+async def start_challenges(challenge_ids: list):
+    """Deadline callback: open upcoming challenges whose start time has come"""
+    started = 0
+    for challenge_id in challenge_ids:
+        # Conditional on the status so only one process announces the start
+        result = await challenges_collection.update_one(
+            {"id": challenge_id, "status": "upcoming", "starts_at": {"$lte": datetime.now(timezone.utc)}},
+            {"$set": {"status": "active"}}
+        )
+        if result.modified_count:
+            started += 1
+            publish_feed_event({"type": "challenge_updated", "challenge": {"id": challenge_id, "status": "active"}})
+    if started:
+        print(f"Started {started} challenges")
+
+challenge_starts = job_scheduler.deadlines("challenge_start", start_challenges)
+
+async def load_deadlines():
+    """Rebuild the deadline heaps from open rooms and upcoming challenges"""
+    cursor = rooms_collection.find(
+        OPEN_ROOMS,
+        {"_id": 0, "id": 1, "expires_at": 1}
+    ).sort("expires_at", 1)
+    async for room in cursor:
+        room_deadlines.schedule(room["id"], room["expires_at"])
+    cursor = rooms_collection.find(
+        TIMED_ROOMS,
+        {"_id": 0, "id": 1, "phase_ends_at": 1}
+    )
+    async for room in cursor:
+        room_phases.schedule(room["id"], room["phase_ends_at"])
+    cursor = challenges_collection.find(UPCOMING_CHALLENGES, {"_id": 0, "id": 1, "starts_at": 1})
+    async for challenge in cursor:
+        challenge_starts.schedule(challenge["id"], challenge["starts_at"])
+    print(f"Scheduled expiry for {len(room_deadlines)} open rooms, {len(room_phases)} phase changes "
+          f"and {len(challenge_starts)} challenge starts")
+
+async def cleanup_expired_rooms():
+    """Reconciliation sweep: finalize expired rooms the expiry heap did not handle"""
     try:
         current_time = datetime.now(timezone.utc)
-        expired_rooms = list(rooms_collection.find({
+        expired_rooms = await rooms_collection.find({
             "expires_at": {"$lt": current_time},
-            "status": {"$ne": "closed"}
-        }))
+            **OPEN_ROOMS
+        }, {"_id": 0, "id": 1}).to_list(length=None)
         
-        for room in expired_rooms:
-            # Announce results if not already done
-            if not room.get("results_announced", False):
-                announce_room_results(room["id"])
-            
-            # Mark room as closed
-            rooms_collection.update_one(
-                {"id": room["id"]},
-                {"$set": {"status": "closed", "results_announced": True}}
-            )
+        expired_rooms = await finalize_rooms([room["id"] for room in expired_rooms])
         
         if len(expired_rooms) > 0:
             print(f"Cleaned up {len(expired_rooms)} expired rooms")
     except Exception as e:
         print(f"Error cleaning up rooms: {e}")
 
-def announce_room_results(room_id: str):
-    """Calculate and announce room results"""
+job_scheduler.every("room_reconcile", ROOM_RECONCILE_MINUTES * 60, leader_only(cleanup_expired_rooms))
+
+ROOM_STATUS_PROJECTION = {
+    "_id": 0, "id": 1, "status": 1, "phase_ends_at": 1, "results_announced": 1, "winner_id": 1
+}
+
+async def close_rooms(token: str, room_ids: list, status: str = CLOSED):
+    """Close (or complete) claimed rooms and tell their viewers"""
+    await rooms_collection.update_many(
+        {"id": {"$in": room_ids}, "results_claim.token": token},
+        {"$set": {"status": status, "phase_ends_at": None, "results_announced": True},
+         "$unset": {"results_claim": ""}}
+    )
+    rooms = await rooms_collection.find({"id": {"$in": room_ids}}, ROOM_STATUS_PROJECTION).to_list(length=None)
+    for room in rooms:
+        change_versions.bump("rooms", f"room:{room['id']}")
+        room_phases.cancel(room["id"])
+        status_fields = {k: v for k, v in room.items() if k != "id"}
+        publish_room_event(room["id"], {"type": "status", **status_fields})
+        if room["status"] == CLOSED:
+            room_deadlines.cancel(room["id"])
+            publish_feed_event({"type": "room_closed", "room": room})
+        else:
+            publish_feed_event({"type": "room_updated", "room": room})
+
+async def announce_room_results(room_ids: list):
+    """Pick winners and award XP for a batch of rooms"""
+    results = await announce_results(rooms_collection, performances_collection, users_collection, room_ids)
+    for result in results:
+        for user_id in set(result["user_ids"]):
+            identity_cache.invalidate_user(user_id)
+        change_versions.bump(f"room:{result['_id']}")
+    if results:
+        change_versions.bump("users")
+        print(f"Results announced for {len(results)} rooms")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global mixdown_pool, leader_lease
+    connect_database()
+    await event_hub.start(create_event_broker(db))
+    if not event_hub.broker.local_only:
+        # Other processes' writes must invalidate this process's ETags too
+        change_versions.publish = lambda event: event_hub.publish(VERSIONS_CHANNEL, event)
+        spawn_background(change_versions.follow(event_hub.subscribe(VERSIONS_CHANNEL)))
+    elif not LOCAL_CONDITIONAL_GETS:
+        # Writes made by any sibling worker would never bump this process's counters
+        change_versions.conditional = False
+    mixdown_pool = ProcessPoolExecutor(max_workers=MIXDOWN_WORKERS)
+    # Indexes and built-in effects; a no-op unless a new migration is pending
+    await run_migrations(db, LeaderLease(
+        leases_collection,
+        name="migrations",
+        ttl=LEADER_LEASE_TTL_SECONDS,
+        renew_interval=LEADER_LEASE_RENEW_SECONDS,
+    ))
+    if QUERY_PLAN_CHECK:
+        await build_indexes(db, prune=INDEX_PRUNE)
+        failures = await check_query_plans(db)
+        if failures:
+            raise RuntimeError("Queries without an index scan: " + "; ".join(failures))
+    else:
+        # Catalog changes build in the background; MongoDB builds do not block reads and writes
+        spawn_background(build_indexes(db, prune=INDEX_PRUNE))
+    await resume_pending_renders()
+    if vote_buffer is not None:
+        vote_buffer.on_flush = publish_flushed_votes
+        await vote_buffer.start(votes_collection, performances_collection, db.applied_vote_batches)
+    
+    # Start background jobs
+    await load_deadlines()
+    leader_lease = LeaderLease(
+        leases_collection,
+        ttl=LEADER_LEASE_TTL_SECONDS,
+        renew_interval=LEADER_LEASE_RENEW_SECONDS,
+    )
+    await leader_lease.start()
+    job_scheduler.start()
     try:
-        # Get all performances for this room
-        performances = list(performances_collection.find({"room_id": room_id}))
-        
-        if not performances:
-            return
-        
-        # Sort by average score
-        performances.sort(key=lambda x: x.get("average_score", 0), reverse=True)
-        
-        # Update winner
-        if performances:
-            winner = performances[0]
-            rooms_collection.update_one(
-                {"id": room_id},
-                {
-                    "$set": {
-                        "winner_id": winner["user_id"],
-                        "results_announced": True
-                    }
-                }
-            )
-            
-            # Award XP to winner
-            users_collection.update_one(
-                {"id": winner["user_id"]},
-                {
-                    "$inc": {"xp": 100, "wins": 1, "battles": 1},
-                    "$push": {"badges": "Battle Winner"}
-                }
-            )
-            
-            # Award XP to participants
-            for perf in performances[1:]:
-                users_collection.update_one(
-                    {"id": perf["user_id"]},
-                    {"$inc": {"xp": 25, "battles": 1}}
-                )
-        
-        print(f"Results announced for room {room_id}")
-    except Exception as e:
-        print(f"Error announcing results for room {room_id}: {e}")
-
-# Start scheduler
-scheduler.add_job(cleanup_expired_rooms, 'interval', minutes=5)
-scheduler.start()
-atexit.register(lambda: scheduler.shutdown())
-
-# Initialize database and create built-in effects
-@app.on_event("startup")
-async def startup_event():
-    # Create indexes for better performance
-    users_collection.create_index("id", unique=True)
-    users_collection.create_index("username", unique=True)
-    users_collection.create_index("supabase_id", unique=True)
-    rooms_collection.create_index("id", unique=True)
-    rooms_collection.create_index("expires_at")
-    performances_collection.create_index("room_id")
-    performances_collection.create_index("user_id")
-    votes_collection.create_index("performance_id")
-    votes_collection.create_index([("voter_id", 1), ("performance_id", 1)], unique=True)
-    challenges_collection.create_index("id", unique=True)
-    audio_effects_collection.create_index("id", unique=True)
-    
-    # Clear existing data (as requested)
-    users_collection.delete_many({})
-    rooms_collection.delete_many({})
-    performances_collection.delete_many({})
-    votes_collection.delete_many({})
-    challenges_collection.delete_many({})
-    
-    # Create built-in audio effects
-    builtin_effects = [
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Boom",
-            "category": "builtin",
-            "audio_data": "UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUX7Xqz6hVFQlLH", 
-            "duration": 0.5,
-            "created_by": None,
-            "created_at": datetime.now(timezone.utc)
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Applause",
-            "category": "builtin", 
-            "audio_data": "UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUX7Xqz6hVFQlLH",
-            "duration": 1.0,
-            "created_by": None, 
-            "created_at": datetime.now(timezone.utc)
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Air Horn",
-            "category": "builtin",
-            "audio_data": "UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUX7Xqz6hVFQlLH",
-            "duration": 0.8,
-            "created_by": None,
-            "created_at": datetime.now(timezone.utc)
-        },
-        {
-            "id": str(uuid.uuid4()),
-            "name": "Vinyl Scratch",
-            "category": "builtin",
-            "audio_data": "UklGRnoGAABXQVZFZm10IBAAAAABAAEAQB8AAEAfAAABAAgAZGF0YQoGAACBhYqFbF1fdJivrJBhNjVgodDbq2EcBj+a2/LDciUFLIHO8tiJNwgZaLvt559NEAxQp+PwtmMcBjiR1/LMeSwFJHfH8N2QQAoUX7Xqz6hVFQlLH",
-            "duration": 0.3,
-            "created_by": None,
-            "created_at": datetime.now(timezone.utc)
-        }
-    ]
-    
-    for effect in builtin_effects:
-        audio_effects_collection.insert_one(effect)
-    
-    print("Database initialized with indexes and built-in effects")
+        yield
+    finally:
+        await job_scheduler.stop()
+        await leader_lease.stop()
+        for task in list(background_tasks):
+            task.cancel()
+        try:
+            await release_render_claims()
+        except Exception as e:
+            print(f"Error releasing render claims: {e}")
+        if vote_buffer is not None:
+            try:
+                await vote_buffer.stop()
+            except Exception as e:
+                # The journal keeps the votes; the next start replays them
+                print(f"Error stopping vote buffer: {e}")
+        score_coalescer.flush()
+        await event_hub.stop()
+        mixdown_pool.shutdown(wait=False, cancel_futures=True)
+        close_database()
+
+app = FastAPI(title="RevMix API", lifespan=lifespan)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # API Routes
+def check_not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """A 304 if the client already holds ``etag``; otherwise tag the response being built
+
+    Called before querying Mongo: the counters behind ``etag`` are bumped on
+    every write that changes the endpoint's result.
+    """
+    if not change_versions.conditional:
+        return None
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return None
+
 @app.get("/api/")
 async def root():
     return {"message": "RevMix API is running! 🎤"}
@@ -339,7 +703,7 @@ async def root():
 async def register(request: RegisterRequest):
     try:
         # Check if username already exists
-        existing_user = users_collection.find_one({"username": request.username})
+        existing_user = await users_collection.find_one({"username": request.username})
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists")
         
@@ -370,8 +734,9 @@ async def register(request: RegisterRequest):
                 "battles": 0,
                 "created_at": datetime.now(timezone.utc)
             }
-            users_collection.insert_one(new_user)
+            await users_collection.insert_one(new_user)
             new_user.pop('_id', None)
+            change_versions.bump("users")
             
             return {
                 "user": new_user,
@@ -387,7 +752,7 @@ async def register(request: RegisterRequest):
 async def login(request: LoginRequest):
     try:
         # Get user from database
-        db_user = users_collection.find_one({"username": request.username})
+        db_user = await users_collection.find_one({"username": request.username}, USER_PROJECTION)
         if not db_user:
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
@@ -444,7 +809,7 @@ async def logout(current_user: dict = Depends(get_current_user)):
 # User routes
 @app.get("/api/users/profile/{user_id}")
 async def get_user_profile(user_id: str):
-    user = users_collection.find_one({"id": user_id})
+    user = await users_collection.find_one({"id": user_id}, USER_PROJECTION)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.pop('_id', None)
@@ -455,31 +820,49 @@ async def get_current_user_profile(current_user: dict = Depends(get_current_user
     return current_user
 
 @app.get("/api/users/leaderboard")
-async def get_leaderboard(limit: int = 10):
-    users = list(users_collection.find({}, {"_id": 0}).sort("xp", -1).limit(limit))
+async def get_leaderboard(request: Request, response: Response, limit: int = 10):
+    not_modified = check_not_modified(request, response, change_versions.etag("users"))
+    if not_modified:
+        return not_modified
+    users = await users_collection.find({}, USER_PROJECTION).sort("xp", -1).limit(limit).to_list(length=None)
     return {"leaderboard": users}
 
 # Room routes
-@app.get("/api/rooms")
-async def get_rooms():
+# A finalizer's claim is bookkeeping, not part of a room's public document
+ROOM_PROJECTION = {"_id": 0, "results_claim": 0}
+
+async def load_active_rooms():
     current_time = datetime.now(timezone.utc)
     # Only get active rooms (not expired or closed)
-    rooms = list(rooms_collection.find({
+    return await rooms_collection.find({
         "expires_at": {"$gt": current_time},
-        "status": {"$ne": "closed"}
-    }, {"_id": 0}))
-    return {"rooms": rooms}
+        **OPEN_ROOMS
+    }, ROOM_PROJECTION).to_list(length=None)
+
+@app.get("/api/rooms")
+async def get_rooms(request: Request, response: Response):
+    clock = int(datetime.now(timezone.utc).timestamp() // ROOM_LIST_ETAG_SECONDS)
+    not_modified = check_not_modified(request, response, change_versions.etag("rooms", clock))
+    if not_modified:
+        return not_modified
+    return {"rooms": await load_active_rooms()}
 
 @app.get("/api/rooms/{room_id}")
-async def get_room(room_id: str):
-    room = rooms_collection.find_one({"id": room_id})
+async def get_room(room_id: str, request: Request, response: Response):
+    not_modified = check_not_modified(request, response, change_versions.etag(f"room:{room_id}"))
+    if not_modified:
+        return not_modified
+    room = await rooms_collection.find_one({"id": room_id}, ROOM_PROJECTION)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
-    room.pop('_id', None)
     return room
 
 @app.post("/api/rooms")
 async def create_room(room_data: dict, current_user: dict = Depends(get_current_user)):
+    try:
+        duration = timer_duration(room_data.get("timer_duration"))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     room_id = str(uuid.uuid4())
     expires_at = datetime.now(timezone.utc) + timedelta(hours=1)  # 1 hour from now
     
@@ -490,21 +873,26 @@ async def create_room(room_data: dict, current_user: dict = Depends(get_current_
         "type": room_data.get("type", "challenge"),
         "prompt": room_data.get("prompt", "Show us what you got!"),
         "participants": [current_user["id"]],
-        "status": "waiting",
+        "status": WAITING,
         "created_at": datetime.now(timezone.utc),
         "expires_at": expires_at,
-        "timer_duration": room_data.get("timer_duration", 300),
+        "timer_duration": duration,
+        "started_at": None,
+        "phase_ends_at": None,
         "max_participants": room_data.get("max_participants", 10),
         "results_announced": False,
         "winner_id": None
     }
-    rooms_collection.insert_one(new_room)
+    await rooms_collection.insert_one(new_room)
     new_room.pop('_id', None)
+    change_versions.bump("rooms", f"room:{room_id}")
+    publish_feed_event({"type": "room_created", "room": new_room})
+    room_deadlines.schedule(room_id, expires_at)
     return new_room
 
 @app.post("/api/rooms/{room_id}/join")
 async def join_room(room_id: str, current_user: dict = Depends(get_current_user)):
-    room = rooms_collection.find_one({"id": room_id})
+    room = await rooms_collection.find_one({"id": room_id})
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -519,114 +907,652 @@ async def join_room(room_id: str, current_user: dict = Depends(get_current_user)
         if len(room["participants"]) >= room["max_participants"]:
             raise HTTPException(status_code=400, detail="Room is full")
             
-        rooms_collection.update_one(
+        updated = await rooms_collection.find_one_and_update(
             {"id": room_id},
-            {"$push": {"participants": current_user["id"]}}
+            {"$push": {"participants": current_user["id"]}},
+            projection={"_id": 0, "participants": 1},
+            return_document=ReturnDocument.AFTER
         )
+        change_versions.bump("rooms", f"room:{room_id}")
+        publish_room_event(room_id, {
+            "type": "join",
+            "user_id": current_user["id"],
+            "username": current_user["username"],
+            "participants": updated["participants"]
+        })
+        publish_feed_event({
+            "type": "room_updated",
+            "room": {"id": room_id, "participants": updated["participants"]}
+        })
     
     return {"message": "Joined room successfully"}
 
+@app.post("/api/rooms/{room_id}/start")
+async def start_room(room_id: str, current_user: dict = Depends(get_current_user)):
+    """Open the performing phase; the room then moves through judging on its own timers"""
+    room = await rooms_collection.find_one({"id": room_id})
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room["host_id"] != current_user["id"]:
+        raise HTTPException(status_code=403, detail="Only the host can start the battle")
+    now = datetime.now(timezone.utc)
+    if room["status"] != WAITING or room["expires_at"] < now:
+        raise HTTPException(status_code=400, detail="Room has already started")
+    
+    fields = start_fields(room, now, ROOM_JUDGING_SECONDS, RESULTS_DELAY_SECONDS)
+    result = await rooms_collection.update_one({"id": room_id, "status": WAITING}, {"$set": fields})
+    if not result.modified_count:
+        raise HTTPException(status_code=400, detail="Room has already started")
+    publish_phase_change(room_id, fields)
+    room_phases.schedule(room_id, fields["phase_ends_at"])
+    room_deadlines.schedule(room_id, fields["expires_at"])
+    return {"id": room_id, **fields}
+
 # Performance routes  
-@app.post("/api/performances")
-async def submit_performance(performance_data: dict, current_user: dict = Depends(get_current_user)):
+# Audio is fetched separately through /api/performances/{id}/audio
+PERFORMANCE_LIST_PROJECTION = {"_id": 0, "audio_data": 0, "vote_batches": 0, "render_claim": 0}
+
+def decode_submitted_audio(audio_data, content_type: Optional[str] = None):
+    """Bytes and content type of submitted base64 audio; a 400 if it does not decode"""
+    if not isinstance(audio_data, str):
+        raise HTTPException(status_code=400, detail="Invalid audio data")
+    # Accept full data URLs as well as bare base64 payloads
+    if audio_data.startswith("data:"):
+        header, _, audio_data = audio_data.partition(",")
+        content_type = content_type or header[5:].split(";")[0] or None
+    try:
+        return base64.b64decode(audio_data, validate=True), content_type
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid audio data")
+
+async def store_audio_data(audio_data: Optional[str], content_type: Optional[str] = None):
+    """Decode base64 audio and move it into the blob store, returning its reference"""
+    if not audio_data or audio_data == TIMELINE_PLACEHOLDER:
+        return None
+    
+    raw, content_type = decode_submitted_audio(audio_data, content_type)
+    digest = await blob_store.put(raw)
+    return blob_reference(digest, len(raw), content_type or DEFAULT_AUDIO_CONTENT_TYPE)
+
+async def receive_audio_upload(request: Request, validate_fields=None):
+    """Stream a multipart upload's "audio" part into the blob store
+
+    Returns the remaining form fields and the blob reference of the audio.
+    ``validate_fields`` is awaited with the form fields while the audio is
+    still only spooled; if it raises, the upload is dropped and nothing
+    reaches the blob store.
+    """
+    try:
+        fields, upload = await receive_upload(request, "audio", blob_store.spool_dir, MAX_AUDIO_UPLOAD_BYTES)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if upload is None or upload.size == 0:
+        if upload is not None:
+            upload.cleanup()
+        raise HTTPException(status_code=400, detail="Missing audio file")
+    try:
+        if validate_fields is not None:
+            await validate_fields(fields)
+        await blob_store.put_file(upload.path, upload.sha256)
+    except Exception:
+        upload.cleanup()
+        raise
+    content_type = fields.get("content_type") or upload.content_type or DEFAULT_AUDIO_CONTENT_TYPE
+    return fields, blob_reference(upload.sha256, upload.size, content_type)
+
+def parse_form_json(fields: dict, name: str, default):
+    """Decode a JSON-encoded multipart form field"""
+    if not fields.get(name):
+        return default
+    try:
+        return json.loads(fields[name])
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON in field '{name}'")
+
+def parse_form_float(fields: dict, name: str, default: float = 0):
+    try:
+        return float(fields.get(name) or default)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid number in field '{name}'")
+
+async def blob_audio_response(request: Request, document: dict):
+    """Serve the audio of a performance or effect with Range and ETag support"""
+    audio_blob = document.get("audio_blob")
+    inline_data = None
+    if audio_blob:
+        digest = audio_blob["sha256"]
+        size = audio_blob["size"]
+        content_type = audio_blob["content_type"]
+    else:
+        # Documents stored before the blob store carry their audio inline
+        audio_data = document.get("audio_data")
+        if not audio_data or audio_data == TIMELINE_PLACEHOLDER:
+            raise HTTPException(status_code=404, detail="Audio not found")
+        inline_data = decode_inline_audio(audio_data)
+        digest = hashlib.sha256(inline_data).hexdigest()
+        size = len(inline_data)
+        content_type = DEFAULT_AUDIO_CONTENT_TYPE
+    
+    etag = f'"{digest}"'
+    headers = audio_headers(etag, content_type)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    
+    byte_range = None
+    if_range = request.headers.get("if-range")
+    if not if_range or if_range == etag:
+        try:
+            byte_range = parse_range_header(request.headers.get("range"), size)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+    
+    if byte_range is None:
+        start, end, status_code = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    
+    if inline_data is not None:
+        return Response(content=inline_data[start:end + 1], status_code=status_code, headers=headers)
+    
+    path = blob_store.local_path(digest)
+    if path is not None:
+        if not os.path.exists(path):
+            raise HTTPException(status_code=404, detail="Audio not found")
+        return FileRangeResponse(path, start, end - start + 1, status_code=status_code, headers=headers)
+    
+    try:
+        if byte_range is None:
+            data = await blob_store.get(digest)
+        else:
+            data = await blob_store.get_range(digest, start, end)
+    except BlobNotFound:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return Response(content=data, status_code=status_code, headers=headers)
+
+TIMELINE_NUMBER_FIELDS = ("position", "duration", "gain")
+
+def timeline_clip_fields(entry: dict) -> dict:
+    """The name and numeric placement of a timeline entry, validated"""
+    clip = {}
+    if entry.get("name") is not None:
+        clip["name"] = str(entry["name"])
+    for key in TIMELINE_NUMBER_FIELDS:
+        value = entry.get(key)
+        if value is None:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise HTTPException(status_code=400, detail=f"audio_timeline {key} must be a number")
+        if key != "gain" and value < 0:
+            raise HTTPException(status_code=400, detail=f"audio_timeline {key} must not be negative")
+        clip[key] = value
+    return clip
+
+async def normalize_audio_timeline(audio_timeline: list):
+    """Store timeline clips as references instead of embedded audio
+
+    Entries may already reference an audio effect ("effect_id") or a blob
+    ("audio_sha256"); both must exist when the timeline is submitted. Inline
+    base64 clips are moved into the blob store, so a clip repeated across the
+    timeline is decoded and stored only once.
+    """
+    if not isinstance(audio_timeline, list):
+        raise HTTPException(status_code=400, detail="audio_timeline must be a list")
+    
+    stored = {}
+    normalized = []
+    for entry in audio_timeline:
+        if not isinstance(entry, dict):
+            raise HTTPException(status_code=400, detail="audio_timeline entries must be objects")
+        clip = timeline_clip_fields(entry)
+        if entry.get("effect_id"):
+            clip["effect_id"] = str(entry["effect_id"])
+        elif entry.get("audio_sha256"):
+            try:
+                clip["audio_sha256"] = validate_digest(entry["audio_sha256"])
+            except (BlobNotFound, TypeError):
+                raise HTTPException(status_code=400, detail="Invalid audio_sha256 in audio_timeline")
+        elif entry.get("audio_data"):
+            audio_data = entry["audio_data"]
+            if not isinstance(audio_data, str):
+                raise HTTPException(status_code=400, detail="Invalid audio data")
+            if audio_data not in stored:
+                raw, _ = decode_submitted_audio(audio_data)
+                stored[audio_data] = await blob_store.put(raw)
+            clip["audio_sha256"] = stored[audio_data]
+        normalized.append(clip)
+    await check_timeline_references(normalized, set(stored.values()))
+    return normalized
+
+async def check_timeline_references(audio_timeline: list, stored: set):
+    """A 400 naming the first effect or blob the timeline refers to that does not exist"""
+    effect_ids = {clip["effect_id"] for clip in audio_timeline if "effect_id" in clip}
+    if effect_ids:
+        found = await audio_effects_collection.find(
+            {"id": {"$in": list(effect_ids)}}, {"_id": 0, "id": 1}
+        ).to_list(length=None)
+        missing = effect_ids - {effect["id"] for effect in found}
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown audio effect {sorted(missing)[0]}")
+    for digest in {clip["audio_sha256"] for clip in audio_timeline if "audio_sha256" in clip} - stored:
+        if not await blob_store.exists(digest):
+            raise HTTPException(status_code=400, detail=f"Unknown audio_sha256 {digest}")
+
+async def load_effect_audio(effect_ids):
+    """Raw audio bytes of the given audio effects, keyed by effect id"""
+    effects = await audio_effects_collection.find(
+        {"id": {"$in": list(effect_ids)}},
+        {"_id": 0, "id": 1, "audio_blob": 1, "audio_data": 1}
+    ).to_list(length=None)
+    audio = {}
+    for effect in effects:
+        if effect.get("audio_blob"):
+            audio[effect["id"]] = await blob_store.get(effect["audio_blob"]["sha256"])
+        elif effect.get("audio_data"):
+            audio[effect["id"]] = decode_inline_audio(effect["audio_data"])
+    return audio
+
+async def resolve_timeline_clips(audio_timeline: list):
+    """Turn audio_timeline entries into mixdown clips carrying raw audio bytes"""
+    effect_audio = await load_effect_audio(
+        {entry["effect_id"] for entry in audio_timeline if entry.get("effect_id")}
+    )
+    blobs = {}
+    clips = []
+    for entry in audio_timeline:
+        audio = b""
+        if entry.get("effect_id"):
+            audio = effect_audio.get(entry["effect_id"], b"")
+        elif entry.get("audio_sha256"):
+            digest = entry["audio_sha256"]
+            if digest not in blobs:
+                try:
+                    blobs[digest] = await blob_store.get(digest)
+                except BlobNotFound:
+                    blobs[digest] = b""
+            audio = blobs[digest]
+        elif entry.get("audio_data"):
+            # Timelines stored before clips were moved into the blob store
+            audio = decode_inline_audio(entry["audio_data"])
+        clips.append({
+            "audio": audio,
+            "position": entry.get("position", 0),
+            "gain": entry.get("gain"),
+            "duration": entry.get("duration"),
+        })
+    return clips
+
+async def update_performance_and_publish(performance_id: str, fields: dict):
+    performance = await performances_collection.find_one_and_update(
+        {"id": performance_id},
+        {"$set": fields},
+        projection=PERFORMANCE_LIST_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if performance:
+        change_versions.bump(f"performances:{performance['room_id']}")
+        publish_room_event(performance["room_id"], {"type": "performance", "performance": performance})
+
+async def render_performance_timeline(performance_id: str, audio_timeline: list):
+    """Mix a performance's timeline in the process pool and attach the rendered asset"""
+    try:
+        clips = await resolve_timeline_clips(audio_timeline)
+        cache_key = await asyncio.to_thread(timeline_cache_key, clips)
+        cached = await asyncio.to_thread(render_cache.get, cache_key)
+        if cached is not None:
+            result = unpack_render(cached)
+        else:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                mixdown_pool, render_timeline, clips, PCM_CACHE_PATH, PCM_CACHE_MAX_BYTES
+            )
+            pcm_cache_stats["hits"] += result.pop("pcm_cache_hits")
+            pcm_cache_stats["misses"] += result.pop("pcm_cache_misses")
+            await asyncio.to_thread(render_cache.put, cache_key, pack_render(result))
+        digest = await blob_store.put(result["audio"])
+        await update_performance_and_publish(performance_id, {
+            "audio_blob": blob_reference(digest, len(result["audio"]), result["content_type"]),
+            "audio_url": f"/api/performances/{performance_id}/audio",
+            "render_status": "ready",
+            "render_skipped_clips": result["skipped"]
+        })
+        print(f"Rendered timeline for performance {performance_id}")
+    except Exception as e:
+        print(f"Error rendering timeline for performance {performance_id}: {e}")
+        await update_performance_and_publish(performance_id, {"render_status": "failed", "render_error": str(e)})
+
+def pending_render_filter(now: datetime) -> dict:
+    """Pending renders that no worker holds a live claim on"""
+    return {
+        "render_status": "pending",
+        "$or": [
+            {"render_claim": None},
+            {"render_claim.claimed_at": {"$lt": now - timedelta(seconds=RENDER_CLAIM_TIMEOUT_SECONDS)}},
+        ],
+    }
+
+async def resume_pending_renders():
+    """Re-queue mixdowns left pending by a process that stopped
+
+    Each render is claimed with one conditional update, so of several
+    workers starting together only one mixes it. A claim is taken over once
+    it is older than RENDER_CLAIM_TIMEOUT_SECONDS, which is how renders of a
+    crashed worker are picked up again.
+    """
+    while True:
+        now = datetime.now(timezone.utc)
+        performance = await performances_collection.find_one_and_update(
+            pending_render_filter(now),
+            {"$set": {"render_claim": {"owner": RENDER_OWNER, "claimed_at": now}}},
+            projection={"_id": 0, "id": 1, "audio_timeline": 1}
+        )
+        if performance is None:
+            break
+        spawn_background(render_performance_timeline(performance["id"], performance.get("audio_timeline", [])))
+
+async def release_render_claims():
+    """Hand this process's unfinished renders back at shutdown
+
+    Without this, another worker would only take them over once the claims
+    are RENDER_CLAIM_TIMEOUT_SECONDS old.
+    """
+    await performances_collection.update_many(
+        {"render_status": "pending", "render_claim.owner": RENDER_OWNER},
+        {"$unset": {"render_claim": ""}}
+    )
+
+# Every worker sweeps; the claim keeps each render to one of them
+job_scheduler.every("render_resume", RENDER_CLAIM_TIMEOUT_SECONDS, resume_pending_renders)
+
+async def check_room_accepts_submissions(room_id: Optional[str]):
+    room = await rooms_collection.find_one({"id": room_id}, {"_id": 0, "status": 1, "phase_ends_at": 1})
+    if not room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if not accepts_submissions(room, datetime.now(timezone.utc)):
+        raise HTTPException(status_code=400, detail="Submissions are closed for this room")
+
+async def create_performance(current_user: dict, performance_data: dict, audio_blob: Optional[dict]):
     performance_id = str(uuid.uuid4())
+    audio_timeline = await normalize_audio_timeline(performance_data.get("audio_timeline") or [])
+    needs_render = audio_blob is None and bool(audio_timeline)
+    submitted_at = datetime.now(timezone.utc)
     new_performance = {
         "id": performance_id,
         "user_id": current_user["id"],
         "username": current_user["username"],
         "room_id": performance_data.get("room_id"),
-        "audio_data": performance_data.get("audio_data"),
+        "audio_blob": audio_blob,
+        "audio_url": f"/api/performances/{performance_id}/audio" if audio_blob else None,
         "duration": performance_data.get("duration", 0),
         "timeline_marks": performance_data.get("timeline_marks", []),
-        "audio_timeline": performance_data.get("audio_timeline", []),
-        "submitted_at": datetime.now(timezone.utc),
-        "votes": {},
-        "average_score": 0.0,
-        "vote_count": 0
+        "audio_timeline": audio_timeline,
+        "render_status": "pending" if needs_render else None,
+        "submitted_at": submitted_at,
+        **empty_aggregates()
     }
-    performances_collection.insert_one(new_performance)
+    if needs_render:
+        # Rendered right here, so no other worker resumes it
+        new_performance["render_claim"] = {"owner": RENDER_OWNER, "claimed_at": submitted_at}
+    await performances_collection.insert_one(new_performance)
     new_performance.pop('_id', None)
+    new_performance.pop('render_claim', None)
+    change_versions.bump(f"performances:{new_performance['room_id']}")
+    publish_room_event(new_performance["room_id"], {"type": "submission", "performance": new_performance})
+    
+    if needs_render:
+        spawn_background(render_performance_timeline(performance_id, audio_timeline))
     return new_performance
 
+@app.post("/api/performances")
+async def submit_performance(performance_data: dict, current_user: dict = Depends(get_current_user)):
+    await check_room_accepts_submissions(performance_data.get("room_id"))
+    audio_blob = await store_audio_data(
+        performance_data.get("audio_data"),
+        performance_data.get("content_type"),
+    )
+    return await create_performance(current_user, performance_data, audio_blob)
+
+@app.post("/api/performances/upload")
+async def upload_performance(request: Request, room_id: Optional[str] = None,
+                             current_user: dict = Depends(get_current_user)):
+    """Submit a performance as multipart/form-data with the recording in the "audio" part
+
+    The room may be given as a ``room_id`` query parameter, which rejects a
+    closed room before the body is read, or as a form field, which is
+    checked before the audio is stored.
+    """
+    if room_id is not None:
+        await check_room_accepts_submissions(room_id)
+
+    async def check_form_room(fields: dict):
+        if room_id is None:
+            await check_room_accepts_submissions(fields.get("room_id"))
+
+    fields, audio_blob = await receive_audio_upload(request, check_form_room)
+    performance_data = {
+        "room_id": room_id or fields.get("room_id"),
+        "duration": parse_form_float(fields, "duration"),
+        "timeline_marks": parse_form_json(fields, "timeline_marks", []),
+        "audio_timeline": parse_form_json(fields, "audio_timeline", []),
+    }
+    return await create_performance(current_user, performance_data, audio_blob)
+
+@app.get("/api/mixdown/cache")
+async def get_mixdown_cache_stats():
+    return {
+        "renders": render_cache.stats(),
+        "clip_pcm": pcm_cache_stats
+    }
+
 @app.get("/api/performances/room/{room_id}")
-async def get_room_performances(room_id: str):
-    performances = list(performances_collection.find({"room_id": room_id}, {"_id": 0}).sort("average_score", -1))
+async def get_room_performances(room_id: str, request: Request, response: Response):
+    not_modified = check_not_modified(request, response, change_versions.etag(f"performances:{room_id}"))
+    if not_modified:
+        return not_modified
+    performances = await performances_collection.find({"room_id": room_id}, PERFORMANCE_LIST_PROJECTION).sort("average_score", -1).to_list(length=None)
     return {"performances": performances}
 
+@app.websocket("/ws/rooms/{room_id}")
+async def room_socket(websocket: WebSocket, room_id: str):
+    """Push a room snapshot, then join/submission/performance/scores/status events"""
+    await websocket.accept()
+    # Subscribe before reading the snapshot so no event falls in between
+    queue = event_hub.subscribe(room_channel(room_id))
+    forward = None
+    try:
+        room = await rooms_collection.find_one({"id": room_id}, ROOM_PROJECTION)
+        if not room:
+            await websocket.close(code=4404, reason="Room not found")
+            return
+        performances = await performances_collection.find(
+            {"room_id": room_id},
+            PERFORMANCE_LIST_PROJECTION
+        ).sort("average_score", -1).to_list(length=None)
+        await websocket.send_text(json.dumps(jsonable_encoder({
+            "type": "snapshot",
+            "room": room,
+            "performances": performances
+        })))
+
+        async def forward_events():
+            try:
+                while True:
+                    await websocket.send_text(await queue.get())
+            except Exception:
+                # The socket went away; the receive loop below notices and cleans up
+                pass
+
+        forward = asyncio.create_task(forward_events())
+        # Clients only listen; reading just tells us when they go away
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+    finally:
+        if forward is not None:
+            forward.cancel()
+        event_hub.unsubscribe(room_channel(room_id), queue)
+
+@app.get("/api/jobs")
+async def get_jobs():
+    """Counters of every background job type"""
+    return job_scheduler.stats()
+
+@app.get("/api/jobs/leader")
+async def get_job_leader():
+    """Which process holds the periodic-jobs lease"""
+    return await leader_lease.status()
+
+@app.get("/api/realtime/stats")
+async def get_realtime_stats():
+    return {**event_hub.stats(), "scores": score_coalescer.stats()}
+
+@app.get("/api/performances/{performance_id}/audio")
+async def get_performance_audio(performance_id: str, request: Request):
+    performance = await performances_collection.find_one(
+        {"id": performance_id},
+        {"_id": 0, "audio_blob": 1, "audio_data": 1}
+    )
+    if not performance:
+        raise HTTPException(status_code=404, detail="Performance not found")
+    return await blob_audio_response(request, performance)
+
 # Voting routes
+def parse_vote_scores(vote_data: dict):
+    """Validated flow/lyrics/creativity scores of a vote (default 5)"""
+    scores = {}
+    for field in SCORE_FIELDS:
+        try:
+            value = int(vote_data.get(field, 5))
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"{field} must be a number")
+        if not MIN_SCORE <= value <= MAX_SCORE:
+            raise HTTPException(status_code=400, detail=f"{field} must be between {MIN_SCORE} and {MAX_SCORE}")
+        scores[field] = value
+    return scores
+
+async def get_performance_owner(performance_id: str):
+    """{user_id, room_id} of a performance, or None if it does not exist"""
+    owner = performance_owner_cache.get(performance_id)
+    if owner is None:
+        owner = await performances_collection.find_one(
+            {"id": performance_id},
+            {"_id": 0, "user_id": 1, "room_id": 1}
+        )
+        if owner is not None:
+            performance_owner_cache.set(performance_id, owner)
+    return owner
+
+VOTE_AGGREGATE_PROJECTION = {
+    "_id": 0, "id": 1, "room_id": 1, "vote_count": 1, "average_score": 1,
+    **{f"{field}_total": 1 for field in SCORE_FIELDS}
+}
+
+def publish_vote_aggregates(aggregates: list):
+    for room_id in {performance["room_id"] for performance in aggregates}:
+        change_versions.bump(f"performances:{room_id}")
+    for performance in aggregates:
+        score_coalescer.update(performance["room_id"], performance)
+
+async def publish_flushed_votes(performance_ids: list):
+    """Vote buffer callback: push the aggregates a flush just wrote"""
+    aggregates = await performances_collection.find(
+        {"id": {"$in": performance_ids}},
+        VOTE_AGGREGATE_PROJECTION
+    ).to_list(length=None)
+    publish_vote_aggregates(aggregates)
+
 @app.post("/api/votes")
 async def submit_vote(vote_data: dict, current_user: dict = Depends(get_current_user)):
     performance_id = vote_data.get("performance_id")
     
-    # Check if user already voted for this performance
-    existing_vote = votes_collection.find_one({
-        "voter_id": current_user["id"],
-        "performance_id": performance_id
-    })
-    
-    if existing_vote:
-        raise HTTPException(status_code=400, detail="You have already voted for this performance")
+    performance = await get_performance_owner(performance_id)
+    if not performance:
+        raise HTTPException(status_code=404, detail="Performance not found")
     
     # Check if user is trying to vote for their own performance
-    performance = performances_collection.find_one({"id": performance_id})
-    if performance and performance["user_id"] == current_user["id"]:
+    if performance["user_id"] == current_user["id"]:
         raise HTTPException(status_code=400, detail="You cannot vote for your own performance")
     
+    room = await rooms_collection.find_one(
+        {"id": performance["room_id"]},
+        {"_id": 0, "status": 1, "phase_ends_at": 1}
+    )
+    if not room or not accepts_votes(room, datetime.now(timezone.utc)):
+        raise HTTPException(status_code=400, detail="Voting is closed for this room")
+    
+    scores = parse_vote_scores(vote_data)
     vote_id = str(uuid.uuid4())
     new_vote = {
         "id": vote_id,
         "voter_id": current_user["id"],
         "voter_username": current_user["username"],
         "performance_id": performance_id,
-        "room_id": vote_data.get("room_id"),
-        "flow": vote_data.get("flow", 5),
-        "lyrics": vote_data.get("lyrics", 5),
-        "creativity": vote_data.get("creativity", 5),
+        "room_id": performance["room_id"],
+        **scores,
         "emoji_reaction": vote_data.get("emoji_reaction", "🔥"),
         "created_at": datetime.now(timezone.utc)
     }
-    votes_collection.insert_one(new_vote)
     
-    # Update performance with new vote
-    if performance:
-        votes = performance.get("votes", {})
-        votes[current_user["id"]] = {
-            "flow": vote_data.get("flow"),
-            "lyrics": vote_data.get("lyrics"),
-            "creativity": vote_data.get("creativity")
-        }
-        
-        # Calculate average score
-        total_votes = len(votes)
-        if total_votes > 0:
-            avg_flow = sum(v["flow"] for v in votes.values()) / total_votes
-            avg_lyrics = sum(v["lyrics"] for v in votes.values()) / total_votes
-            avg_creativity = sum(v["creativity"] for v in votes.values()) / total_votes
-            average_score = (avg_flow + avg_lyrics + avg_creativity) / 3
-        else:
-            average_score = 0.0
-            
-        performances_collection.update_one(
-            {"id": performance_id},
-            {"$set": {
-                "votes": votes, 
-                "average_score": average_score,
-                "vote_count": total_votes
-            }}
-        )
+    if vote_buffer is not None:
+        # Acknowledged once journaled; the buffer writes the vote and its aggregates in its next flush
+        try:
+            await vote_buffer.accept(new_vote)
+        except DuplicateVote:
+            raise HTTPException(status_code=400, detail="You have already voted for this performance")
+        return new_vote
+    
+    # The unique (voter_id, performance_id) index rejects repeat votes atomically
+    try:
+        await votes_collection.insert_one(new_vote)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="You have already voted for this performance")
+    
+    # Fold the vote into the performance's running totals in one atomic update
+    aggregates = await performances_collection.find_one_and_update(
+        {"id": performance_id},
+        vote_aggregate_update(scores),
+        projection=VOTE_AGGREGATE_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if aggregates:
+        publish_vote_aggregates([aggregates])
     
     new_vote.pop('_id', None)
     return new_vote
 
+@app.get("/api/votes/room/{room_id}/mine")
+async def get_my_room_votes(room_id: str, current_user: dict = Depends(get_current_user)):
+    votes = await votes_collection.find(
+        {"room_id": room_id, "voter_id": current_user["id"]},
+        {"_id": 0, "performance_id": 1}
+    ).to_list(length=None)
+    return {"performance_ids": [vote["performance_id"] for vote in votes]}
+
+@app.get("/api/votes/buffer")
+async def get_vote_buffer_stats():
+    if vote_buffer is None:
+        return {"mode": VOTE_INGESTION_MODE}
+    return {"mode": VOTE_INGESTION_MODE, **vote_buffer.stats()}
+
 @app.get("/api/votes/performance/{performance_id}")
 async def get_performance_votes(performance_id: str):
-    votes = list(votes_collection.find({"performance_id": performance_id}, {"_id": 0}))
+    votes = await votes_collection.find({"performance_id": performance_id}, {"_id": 0}).to_list(length=None)
     return {"votes": votes}
 
 # Audio effects routes
 @app.get("/api/audio-effects")
-async def get_audio_effects():
-    effects = list(audio_effects_collection.find({}, {"_id": 0}))
+async def get_audio_effects(request: Request, response: Response):
+    not_modified = check_not_modified(request, response, change_versions.etag("effects"))
+    if not_modified:
+        return not_modified
+    # Timeline clips reference effects by id; audio is served by /api/audio-effects/{id}/audio
+    effects = await audio_effects_collection.find({}, {"_id": 0, "audio_data": 0}).to_list(length=None)
     return {"effects": effects}
 
 @app.post("/api/audio-effects")
@@ -641,15 +1567,87 @@ async def create_audio_effect(effect_data: dict, current_user: dict = Depends(ge
         "created_by": current_user["id"],
         "created_at": datetime.now(timezone.utc)
     }
-    audio_effects_collection.insert_one(new_effect)
+    await audio_effects_collection.insert_one(new_effect)
+    change_versions.bump("effects")
     new_effect.pop('_id', None)
     return new_effect
 
+@app.post("/api/audio-effects/upload")
+async def upload_audio_effect(request: Request, current_user: dict = Depends(get_current_user)):
+    """Create a custom effect from multipart/form-data with the sample in the "audio" part"""
+    fields, audio_blob = await receive_audio_upload(request)
+    effect_id = str(uuid.uuid4())
+    new_effect = {
+        "id": effect_id,
+        "name": fields.get("name"),
+        "category": "custom",
+        "audio_blob": audio_blob,
+        "audio_url": f"/api/audio-effects/{effect_id}/audio",
+        "duration": parse_form_float(fields, "duration"),
+        "created_by": current_user["id"],
+        "created_at": datetime.now(timezone.utc)
+    }
+    await audio_effects_collection.insert_one(new_effect)
+    change_versions.bump("effects")
+    new_effect.pop('_id', None)
+    return new_effect
+
+@app.get("/api/audio-effects/{effect_id}/audio")
+async def get_audio_effect_audio(effect_id: str, request: Request):
+    effect = await audio_effects_collection.find_one(
+        {"id": effect_id},
+        {"_id": 0, "audio_blob": 1, "audio_data": 1}
+    )
+    if not effect:
+        raise HTTPException(status_code=404, detail="Audio effect not found")
+    return await blob_audio_response(request, effect)
+
 # Challenge routes
+async def load_challenges():
+    return await challenges_collection.find({}, {"_id": 0}).to_list(length=None)
+
 @app.get("/api/challenges")
 async def get_challenges():
-    challenges = list(challenges_collection.find({}, {"_id": 0}))
-    return {"challenges": challenges}
+    return {"challenges": await load_challenges()}
+
+def sse_message(data: str) -> str:
+    return f"data: {data}\n\n"
+
+async def feed_snapshot() -> str:
+    rooms, challenges = await asyncio.gather(load_active_rooms(), load_challenges())
+    return sse_message(json.dumps(jsonable_encoder({
+        "type": "snapshot",
+        "rooms": rooms,
+        "challenges": challenges
+    })))
+
+@app.get("/api/feed/stream")
+async def stream_feed():
+    """Server-Sent Events: a snapshot of rooms and challenges, then incremental changes"""
+    async def events():
+        # Subscribe before reading the snapshot so no event falls in between
+        queue = event_hub.subscribe(FEED_CHANNEL)
+        try:
+            yield await feed_snapshot()
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), FEED_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                if message == RESYNC_EVENT:
+                    # We fell behind; start over from a fresh snapshot
+                    yield await feed_snapshot()
+                else:
+                    yield sse_message(message)
+        finally:
+            event_hub.unsubscribe(FEED_CHANNEL, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @app.post("/api/challenges")
 async def create_challenge(challenge_data: dict, current_user: dict = Depends(get_current_user)):
@@ -666,24 +1664,26 @@ async def create_challenge(challenge_data: dict, current_user: dict = Depends(ge
         "starts_at": datetime.now(timezone.utc) + timedelta(hours=1),
         "status": "upcoming"
     }
-    challenges_collection.insert_one(new_challenge)
+    await challenges_collection.insert_one(new_challenge)
     new_challenge.pop('_id', None)
+    publish_feed_event({"type": "challenge_created", "challenge": new_challenge})
+    challenge_starts.schedule(challenge_id, new_challenge["starts_at"])
     return new_challenge
 
 # Room results and cleanup
 @app.get("/api/rooms/{room_id}/results")
 async def get_room_results(room_id: str):
-    room = rooms_collection.find_one({"id": room_id})
+    room = await rooms_collection.find_one({"id": room_id}, ROOM_PROJECTION)
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
-    performances = list(performances_collection.find(
+    performances = await performances_collection.find(
         {"room_id": room_id}, 
-        {"_id": 0}
-    ).sort("average_score", -1))
+        PERFORMANCE_LIST_PROJECTION
+    ).sort("average_score", -1).to_list(length=None)
     
     return {
-        "room": {k: v for k, v in room.items() if k != '_id'},
+        "room": room,
         "performances": performances,
         "results_announced": room.get("results_announced", False),
         "winner_id": room.get("winner_id")
@@ -691,7 +1691,7 @@ async def get_room_results(room_id: str):
 
 @app.post("/api/rooms/{room_id}/close")
 async def close_room(room_id: str, current_user: dict = Depends(get_current_user)):
-    room = rooms_collection.find_one({"id": room_id})
+    room = await rooms_collection.find_one({"id": room_id})
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     
@@ -699,15 +1699,8 @@ async def close_room(room_id: str, current_user: dict = Depends(get_current_user
     if room["host_id"] != current_user["id"]:
         raise HTTPException(status_code=403, detail="Only the room host can close the room")
     
-    # Announce results if not already done
-    if not room.get("results_announced", False):
-        announce_room_results(room_id)
-    
-    # Mark room as closed
-    rooms_collection.update_one(
-        {"id": room_id},
-        {"$set": {"status": "closed", "results_announced": True}}
-    )
+    # A no-op when the room was already finalized or another worker is finalizing it
+    await finalize_rooms([room_id])
     
     return {"message": "Room closed successfully"}
 
@@ -0,0 +1,194 @@
+"""Streaming multipart/form-data uploads.
+
+The request body is fed to python-multipart chunk by chunk as it arrives.
+The single file part is written straight to a spool file and hashed on the
+fly, so memory use per upload stays constant whatever the file size. The
+caller then hands the spooled file to the blob store under its digest.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Dict, Optional, Tuple
+
+from starlette.requests import Request
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(Exception):
+    """The request is not a well-formed single-file multipart upload"""
+
+
+class UploadTooLarge(UploadError):
+    pass
+
+
+class SpooledUpload:
+    """A file part written to disk together with its digest and size"""
+
+    def __init__(self, path: str, filename: Optional[str], content_type: Optional[str]):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = 0
+        self.sha256 = None
+        self._hasher = hashlib.sha256()
+
+    def cleanup(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class _UploadParser:
+    """python-multipart callbacks collecting text fields and one file part"""
+
+    def __init__(self, file_field: str, spool_dir: str, max_bytes: int):
+        self.file_field = file_field
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        self.fields: Dict[str, str] = {}
+        self.upload: Optional[SpooledUpload] = None
+        self.error: Optional[UploadError] = None
+        self._file = None
+        self._pending = []
+        self._header_name = b""
+        self._header_value = b""
+        self._headers: Dict[bytes, bytes] = {}
+        self._field_name: Optional[str] = None
+        self._field_data = bytearray()
+        self._in_file = False
+        self._field_bytes = 0
+
+    def _fail(self, error: UploadError):
+        if self.error is None:
+            self.error = error
+
+    def on_part_begin(self):
+        self._headers = {}
+        self._field_name = None
+        self._field_data = bytearray()
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_name.lower()] = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name")
+        if name is None:
+            self._fail(UploadError("Multipart part without a field name"))
+            return
+        self._field_name = name.decode("utf-8", "replace")
+        if b"filename" not in options:
+            return
+        if self._field_name != self.file_field or self.upload is not None:
+            self._fail(UploadError(f"Unexpected file field: {self._field_name}"))
+            return
+        content_type = self._headers.get(b"content-type")
+        fd, path = tempfile.mkstemp(dir=self.spool_dir, prefix="upload-")
+        self._file = os.fdopen(fd, "wb")
+        self.upload = SpooledUpload(
+            path,
+            options[b"filename"].decode("utf-8", "replace"),
+            content_type.decode("latin-1") if content_type else None,
+        )
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.error is not None:
+            return
+        chunk = data[start:end]
+        if self._in_file:
+            self.upload.size += len(chunk)
+            if self.upload.size > self.max_bytes:
+                self._fail(UploadTooLarge(f"Upload exceeds {self.max_bytes} bytes"))
+                return
+            self.upload._hasher.update(chunk)
+            self._pending.append(chunk)
+        else:
+            self._field_bytes += len(chunk)
+            if self._field_bytes > MAX_FIELD_BYTES:
+                self._fail(UploadError("Form fields too large"))
+                return
+            self._field_data += chunk
+
+    def on_part_end(self):
+        if self.error is None and not self._in_file and self._field_name is not None:
+            self.fields[self._field_name] = self._field_data.decode("utf-8", "replace")
+
+    async def flush(self):
+        """Write the file chunks collected since the last flush off the event loop"""
+        if self._pending and self._file is not None:
+            chunks, self._pending = self._pending, []
+            await asyncio.to_thread(self._file.writelines, chunks)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+async def receive_upload(request: Request, file_field: str, spool_dir: str,
+                         max_bytes: int) -> Tuple[Dict[str, str], Optional[SpooledUpload]]:
+    """Stream a multipart request body, spooling ``file_field`` to ``spool_dir``
+
+    Returns the text fields and the spooled file (None when the request did
+    not include one). The caller owns the spool file and must either move it
+    into the blob store or call ``cleanup()``.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError("Expected a multipart/form-data request")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MAX_FIELD_BYTES:
+        raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+
+    state = _UploadParser(file_field, spool_dir, max_bytes)
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": state.on_part_begin,
+        "on_part_data": state.on_part_data,
+        "on_part_end": state.on_part_end,
+        "on_header_field": state.on_header_field,
+        "on_header_value": state.on_header_value,
+        "on_header_end": state.on_header_end,
+        "on_headers_finished": state.on_headers_finished,
+    })
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if state.error is not None:
+                raise state.error
+            await state.flush()
+        parser.finalize()
+        if state.error is not None:
+            raise state.error
+        await state.flush()
+    except Exception as e:
+        state.close()
+        if state.upload is not None:
+            state.upload.cleanup()
+        if isinstance(e, UploadError):
+            raise
+        raise UploadError(f"Malformed multipart body: {e}")
+
+    state.close()
+    if state.upload is not None:
+        state.upload.sha256 = state.upload._hasher.hexdigest()
+    return state.fields, state.upload
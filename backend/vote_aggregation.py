@@ -0,0 +1,44 @@
+"""Running vote aggregates stored on performance documents.
+
+Each performance keeps ``vote_count`` and per-category score totals; the
+stored ``average_score`` (used for ranking) is derived from them inside the
+same update, so applying a vote is one atomic O(1) write however many votes
+the performance already has. Individual votes live only in the votes
+collection.
+"""
+from typing import Dict
+
+SCORE_FIELDS = ("flow", "lyrics", "creativity")
+MIN_SCORE = 1
+MAX_SCORE = 10
+
+
+def empty_aggregates() -> Dict[str, float]:
+    aggregates = {f"{field}_total": 0 for field in SCORE_FIELDS}
+    aggregates["vote_count"] = 0
+    aggregates["average_score"] = 0.0
+    return aggregates
+
+
+def vote_aggregate_update(totals: Dict[str, int], count: int = 1) -> list:
+    """Update pipeline adding ``count`` votes whose scores sum to ``totals``"""
+    increments = {
+        f"{field}_total": {"$add": [{"$ifNull": [f"${field}_total", 0]}, totals[field]]}
+        for field in SCORE_FIELDS
+    }
+    increments["vote_count"] = {"$add": [{"$ifNull": ["$vote_count", 0]}, count]}
+    return [
+        {"$set": increments},
+        {"$set": {
+            "average_score": {
+                "$cond": [
+                    {"$gt": ["$vote_count", 0]},
+                    {"$divide": [
+                        {"$add": [f"${field}_total" for field in SCORE_FIELDS]},
+                        {"$multiply": ["$vote_count", len(SCORE_FIELDS)]},
+                    ]},
+                    0.0,
+                ]
+            }
+        }},
+    ]
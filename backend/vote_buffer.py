@@ -0,0 +1,297 @@
+"""Write-behind vote ingestion backed by a local append-only journal.
+
+In buffered mode an accepted vote is appended to the journal and
+acknowledged at once, once a lookup on the unique (voter, performance) key
+shows no earlier vote from any worker; a background task flushes the accumulated votes to
+Mongo every ``flush_interval`` seconds with one unordered ``insert_many``
+and one unordered ``bulk_write`` of per-performance aggregate updates.
+
+The journal is a directory of segments. Each process appends to its own
+segment, holding an exclusive ``flock`` on it; a flush seals the active
+segment and starts a new one. A segment's file name is its batch id.
+Before a batch's aggregate updates are written, the batch is recorded in
+the ``applied_vote_batches`` collection with the performances it still has
+to update, and each performance leaves that list once its update lands, so
+replaying a segment after a crash or retrying a failed flush skips the
+updates already applied. Duplicate-key errors for votes that already made
+it into the votes collection are recognised by their vote id. On startup,
+segments that no live process holds a lock on are replayed and removed.
+
+The record expires after APPLIED_BATCH_TTL_SECONDS, far longer than a
+segment is left waiting for a restart. A crash between a performance's
+update and its removal from the list leaves that one update to be applied
+again on replay.
+
+Votes are durable in the page cache as soon as they are acknowledged and
+are fsynced once per flush interval.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from identity_cache import TTLCache
+from vote_aggregation import SCORE_FIELDS, vote_aggregate_update
+
+SEGMENT_SUFFIX = ".journal"
+DUPLICATE_KEY = 11000
+# How long an applied batch is remembered (a TTL index on applied_vote_batches)
+APPLIED_BATCH_TTL_SECONDS = 7 * 24 * 3600
+
+
+class DuplicateVote(Exception):
+    pass
+
+
+class JournalSegment:
+    """One append-only journal file, exclusively locked while open"""
+
+    def __init__(self, path: str, create: bool = True):
+        self.path = path
+        self.batch_id = os.path.basename(path)[:-len(SEGMENT_SUFFIX)]
+        flags = os.O_RDWR | os.O_APPEND | (os.O_CREAT if create else 0)
+        self.fd = os.open(path, flags, 0o644)
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    @classmethod
+    def create(cls, directory: str) -> "JournalSegment":
+        return cls(os.path.join(directory, f"{uuid.uuid4().hex}{SEGMENT_SUFFIX}"))
+
+    def append(self, record: dict):
+        os.write(self.fd, (json.dumps(record, default=_encode) + "\n").encode())
+
+    def read(self) -> List[dict]:
+        with open(self.path, "rb") as f:
+            lines = f.read().split(b"\n")
+        records = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                records.append(_decode(json.loads(line)))
+            except ValueError:
+                # A torn final write from a crash; nothing after it was acknowledged
+                break
+        return records
+
+    def fsync(self):
+        os.fsync(self.fd)
+
+    def remove(self):
+        os.unlink(self.path)
+        self.close()
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot journal {type(value).__name__}")
+
+
+def _decode(record: dict) -> dict:
+    for key, value in record.items():
+        if isinstance(value, dict) and set(value) == {"$date"}:
+            record[key] = datetime.fromisoformat(value["$date"])
+    return record
+
+
+class VoteBuffer:
+    def __init__(self, journal_dir: str, flush_interval: float = 0.2, recent_keys: int = 100000,
+                 on_flush: Optional[Callable[[List[str]], Awaitable[None]]] = None):
+        self.journal_dir = journal_dir
+        self.flush_interval = flush_interval
+        # Called with the ids of performances whose aggregates a flush changed
+        self.on_flush = on_flush
+        self.votes_collection = None
+        self.performances_collection = None
+        self.batches_collection = None
+        self._active: Optional[JournalSegment] = None
+        self._pending: List[dict] = []
+        self._pending_keys = set()
+        self._sealed: List[tuple] = []
+        # Keys of votes this process already accepted, to answer repeats with a 400
+        self._recent = TTLCache(recent_keys, ttl=3600)
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        self.flushed = 0
+        self.discarded = 0
+
+    async def start(self, votes_collection, performances_collection, batches_collection):
+        self.votes_collection = votes_collection
+        self.performances_collection = performances_collection
+        self.batches_collection = batches_collection
+        os.makedirs(self.journal_dir, exist_ok=True)
+        await self.replay()
+        self._active = JournalSegment.create(self.journal_dir)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._active is not None and not self._sealed:
+            self._active.remove()
+            self._active = None
+
+    async def replay(self):
+        """Apply segments left behind by processes that are no longer running"""
+        for name in sorted(os.listdir(self.journal_dir)):
+            if not name.endswith(SEGMENT_SUFFIX):
+                continue
+            try:
+                segment = JournalSegment(os.path.join(self.journal_dir, name), create=False)
+            except (OSError, FileNotFoundError):
+                # Held by a live process, or already replayed by another worker
+                continue
+            votes = segment.read()
+            if votes:
+                await self._apply(segment.batch_id, votes)
+            segment.remove()
+            print(f"Replayed {len(votes)} journaled votes from {name}")
+
+    def _seen(self, key) -> bool:
+        return key in self._pending_keys or bool(self._recent.get(key))
+
+    async def accept(self, vote: dict):
+        """Journal ``vote`` and queue it for the next flush
+
+        Raises ``DuplicateVote`` if this voter already voted for the
+        performance, whether the earlier vote was accepted here or has been
+        written by any worker. Only two copies sent to different workers
+        within one flush interval can still both be acknowledged; the flush
+        then keeps the first and discards the other.
+        """
+        key = (vote["voter_id"], vote["performance_id"])
+        if self._seen(key):
+            raise DuplicateVote(key)
+        existing = await self.votes_collection.find_one(
+            {"voter_id": vote["voter_id"], "performance_id": vote["performance_id"]}, {"_id": 1}
+        )
+        if existing is not None:
+            self._recent.set(key, True)
+        # Checked again: a repeat may have been accepted here during the lookup
+        if existing is not None or self._seen(key):
+            raise DuplicateVote(key)
+        self._active.append(vote)
+        self._pending.append(vote)
+        self._pending_keys.add(key)
+        self._recent.set(key, True)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error flushing vote buffer: {e}")
+
+    async def flush(self):
+        async with self._flush_lock:
+            if self._pending:
+                sealed = self._active
+                votes, self._pending = self._pending, []
+                self._pending_keys = set()
+                self._active = JournalSegment.create(self.journal_dir)
+                await asyncio.to_thread(sealed.fsync)
+                self._sealed.append((sealed, votes))
+            elif self._active is not None:
+                await asyncio.to_thread(self._active.fsync)
+
+            # Segments whose earlier flush failed are retried first, in order
+            while self._sealed:
+                segment, votes = self._sealed[0]
+                await self._apply(segment.batch_id, votes)
+                self._sealed.pop(0)
+                segment.remove()
+
+    async def _apply(self, batch_id: str, votes: List[dict]):
+        applied = votes
+        try:
+            await self.votes_collection.insert_many([dict(vote) for vote in votes], ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY for error in errors):
+                raise
+            duplicate_ids = {votes[error["index"]]["id"] for error in errors}
+            # A duplicate carrying the same vote id was inserted by an earlier attempt at this batch
+            ours = {
+                doc["id"] for doc in await self.votes_collection.find(
+                    {"id": {"$in": list(duplicate_ids)}}, {"_id": 0, "id": 1}
+                ).to_list(length=None)
+            }
+            applied = [vote for vote in votes if vote["id"] not in duplicate_ids or vote["id"] in ours]
+            self.discarded += len(votes) - len(applied)
+
+        totals: Dict[str, Dict[str, int]] = defaultdict(lambda: {field: 0 for field in SCORE_FIELDS})
+        counts: Dict[str, int] = defaultdict(int)
+        for vote in applied:
+            for field in SCORE_FIELDS:
+                totals[vote["performance_id"]][field] += vote[field]
+            counts[vote["performance_id"]] += 1
+
+        if counts:
+            pending = await self._pending_updates(batch_id, list(counts))
+            if pending:
+                try:
+                    await self.performances_collection.bulk_write([
+                        UpdateOne(
+                            {"id": performance_id},
+                            vote_aggregate_update(totals[performance_id], counts[performance_id]),
+                        )
+                        for performance_id in pending
+                    ], ordered=False)
+                except BulkWriteError as e:
+                    failed = {pending[error["index"]] for error in e.details.get("writeErrors", [])}
+                    landed = [performance_id for performance_id in pending if performance_id not in failed]
+                    await self._mark_applied(batch_id, landed)
+                    raise
+                await self._mark_applied(batch_id, pending)
+        self.flushed += len(applied)
+        if counts and self.on_flush is not None:
+            try:
+                await self.on_flush(list(counts))
+            except Exception as e:
+                print(f"Error in vote buffer flush callback: {e}")
+
+    async def _pending_updates(self, batch_id: str, performance_ids: List[str]) -> List[str]:
+        """Record the batch on its first attempt; the performances it has yet to update"""
+        batch = await self.batches_collection.find_one_and_update(
+            {"_id": batch_id},
+            {"$setOnInsert": {"pending": performance_ids, "created_at": datetime.now(timezone.utc)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return batch["pending"]
+
+    async def _mark_applied(self, batch_id: str, performance_ids: List[str]):
+        if performance_ids:
+            await self.batches_collection.update_one({"_id": batch_id}, {"$pullAll": {"pending": performance_ids}})
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "sealed_segments": len(self._sealed),
+            "flushed": self.flushed,
+            "discarded_duplicates": self.discarded,
+        }
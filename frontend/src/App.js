@@ -283,9 +283,10 @@ function AudioTimeline({ onTimelineReady }) {
 
     // In a real implementation, this would merge the audio clips
     const finalAudioData = {
+      // Library effects are referenced by id; only local uploads carry their audio
       audio_timeline: timelineClips.map(clip => ({
         name: clip.name,
-        audio_data: clip.audio_data,
+        ...(clip.category ? { effect_id: clip.id } : { audio_data: clip.audio_data }),
         position: clip.position,
         duration: clip.duration
       })),
@@ -531,23 +532,6 @@ function AudioRecorder({ onAudioReady, maxDuration = 120 }) {
     }
   };
 
-  const convertToBase64 = (audioSource) => {
-    return new Promise((resolve, reject) => {
-      const reader = new FileReader();
-      reader.onloadend = () => {
-        const base64String = reader.result.split(',')[1];
-        resolve(base64String);
-      };
-      reader.onerror = reject;
-      
-      if (audioSource.blob) {
-        reader.readAsDataURL(audioSource.blob);
-      } else if (audioSource.file) {
-        reader.readAsDataURL(audioSource.file);
-      }
-    });
-  };
-
   const handleTimelineReady = (timelineData) => {
     setTimelineData(timelineData);
     setShowTimeline(false);
@@ -579,19 +563,13 @@ function AudioRecorder({ onAudioReady, maxDuration = 120 }) {
         return;
       }
 
-      try {
-        const base64Audio = await convertToBase64(audioSource);
-        finalAudioData = {
-          audio_data: base64Audio,
-          duration: uploadMode === 'record' ? recordingTime : 60,
-          source: uploadMode,
-          audio_timeline: []
-        };
-      } catch (error) {
-        console.error('Error processing audio:', error);
-        alert('Error processing audio file');
-        return;
-      }
+      // The raw recording is streamed to the server as multipart form data
+      finalAudioData = {
+        audio_file: audioSource.blob || audioSource.file,
+        duration: uploadMode === 'record' ? recordingTime : 60,
+        source: uploadMode,
+        audio_timeline: []
+      };
     }
 
     onAudioReady(finalAudioData);
@@ -783,43 +761,58 @@ function LiveLeaderboard({ performances }) {
 
 // Component: Home Feed
 function HomeFeed({ user, session, onNavigate }) {
-  const [feed, setFeed] = useState([]);
   const [rooms, setRooms] = useState([]);
   const [challenges, setChallenges] = useState([]);
 
   useEffect(() => {
-    fetchFeedData();
-    const interval = setInterval(fetchFeedData, 10000); // Refresh every 10 seconds
-    return () => clearInterval(interval);
+    // The server sends a snapshot, then room/challenge changes as they happen;
+    // EventSource reconnects on its own and each reconnect starts with a new snapshot
+    const source = new EventSource(`${BACKEND_URL}/api/feed/stream`);
+    source.onmessage = (message) => handleFeedEvent(JSON.parse(message.data));
+    source.onerror = (error) => console.error('Feed stream error:', error);
+    return () => source.close();
   }, []);
 
-  const fetchFeedData = async () => {
-    try {
-      const headers = {
-        'Authorization': `Bearer ${session.access_token}`
-      };
-
-      const [roomsRes, challengesRes] = await Promise.all([
-        fetch(`${BACKEND_URL}/api/rooms`, { headers }),
-        fetch(`${BACKEND_URL}/api/challenges`, { headers })
-      ]);
-      
-      const roomsData = await roomsRes.json();
-      const challengesData = await challengesRes.json();
-      
-      setRooms(roomsData.rooms || []);
-      setChallenges(challengesData.challenges || []);
-      
-      const feedItems = [
-        ...roomsData.rooms.map(room => ({ ...room, type: 'room' })),
-        ...challengesData.challenges.map(challenge => ({ ...challenge, type: 'challenge' }))
-      ];
-      setFeed(feedItems);
-    } catch (error) {
-      console.error('Error fetching feed:', error);
+  const handleFeedEvent = (event) => {
+    switch (event.type) {
+      case 'batch':
+        event.events.forEach(handleFeedEvent);
+        break;
+      case 'snapshot':
+        setRooms(event.rooms || []);
+        setChallenges(event.challenges || []);
+        break;
+      case 'room_created':
+        setRooms(prev => [...prev.filter(room => room.id !== event.room.id), event.room]);
+        break;
+      case 'room_updated':
+        setRooms(prev => prev.map(room => (room.id === event.room.id ? { ...room, ...event.room } : room)));
+        break;
+      case 'room_closed':
+        setRooms(prev => prev.filter(room => room.id !== event.room.id));
+        break;
+      case 'challenge_created':
+        setChallenges(prev => [...prev.filter(challenge => challenge.id !== event.challenge.id), event.challenge]);
+        break;
+      case 'challenge_updated':
+        setChallenges(prev => prev.map(challenge => (
+          challenge.id === event.challenge.id ? { ...challenge, ...event.challenge } : challenge
+        )));
+        break;
+      default:
+        break;
     }
   };
 
+  // Expired rooms drop out of the feed even before the cleanup job closes them
+  const now = new Date();
+  const feed = [
+    ...rooms
+      .filter(room => new Date(room.expires_at) > now)
+      .map(room => ({ ...room, type: 'room' })),
+    ...challenges.map(challenge => ({ ...challenge, type: 'challenge' }))
+  ];
+
   return (
     <div className="home-feed">
       <div className="feed-header">
@@ -879,6 +872,7 @@ function HomeFeed({ user, session, onNavigate }) {
                 >
                   {item.status === 'active' ? 'Join Battle' : 
                    item.status === 'waiting' ? 'Enter Lobby' : 
+                   item.status === 'judging' ? 'Judge Battle' :
                    item.status === 'closed' ? 'Battle Ended' :
                    'View Results'}
                 </button>
@@ -894,59 +888,158 @@ function HomeFeed({ user, session, onNavigate }) {
 // Component: Room/Battle Interface with Live Updates
 function BattleRoom({ user, session, roomId, onNavigate }) {
   const [room, setRoom] = useState(null);
-  const [timeLeft, setTimeLeft] = useState(300);
-  const [phase, setPhase] = useState('create');
+  const [timeLeft, setTimeLeft] = useState(0);
   const [performances, setPerformances] = useState([]);
+  const [votedPerformanceIds, setVotedPerformanceIds] = useState([]);
   const [audioSubmitted, setAudioSubmitted] = useState(false);
   const [roomExpired, setRoomExpired] = useState(false);
   
   const timerRef = useRef(null);
 
   useEffect(() => {
-    fetchRoom();
-    const interval = setInterval(fetchRoom, 5000); // Update every 5 seconds
+    fetchMyVotes();
+
+    // Room state arrives over a WebSocket: a snapshot on connect, then live events
+    let socket = null;
+    let retryTimer = null;
+    let retryDelay = 1000;
+    let unmounted = false;
+
+    const connect = () => {
+      socket = new WebSocket(`${BACKEND_URL.replace(/^http/, 'ws')}/ws/rooms/${roomId}`);
+      socket.onopen = () => { retryDelay = 1000; };
+      socket.onmessage = (message) => {
+        const event = JSON.parse(message.data);
+        if (event.type === 'resync') {
+          // We fell behind; reconnecting delivers a fresh snapshot
+          socket.close();
+          return;
+        }
+        handleRoomEvent(event);
+      };
+      socket.onclose = (closeEvent) => {
+        if (unmounted || closeEvent.code === 4404) return;
+        retryTimer = setTimeout(connect, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+      };
+    };
+    connect();
+
     return () => {
-      clearInterval(interval);
+      unmounted = true;
+      clearTimeout(retryTimer);
+      if (socket) socket.close();
       if (timerRef.current) clearInterval(timerRef.current);
     };
   }, [roomId]);
 
-  const fetchRoom = async () => {
+  useEffect(() => {
+    // Rooms expire on the clock even before the server announces the close
+    if (!room || roomExpired) return;
+    const remaining = new Date(room.expires_at) - new Date();
+    const timeout = setTimeout(() => setRoomExpired(true), Math.max(remaining, 0));
+    return () => clearTimeout(timeout);
+  }, [room?.expires_at, roomExpired]);
+
+  useEffect(() => {
+    // Count down the current phase; the server announces the phase change itself
+    if (timerRef.current) clearInterval(timerRef.current);
+    if (!room?.phase_ends_at) {
+      setTimeLeft(0);
+      return;
+    }
+    const tick = () => {
+      setTimeLeft(Math.max(Math.ceil((new Date(room.phase_ends_at) - new Date()) / 1000), 0));
+    };
+    tick();
+    timerRef.current = setInterval(tick, 1000);
+    return () => clearInterval(timerRef.current);
+  }, [room?.phase_ends_at]);
+
+  const applyRoom = (roomData) => {
+    setRoom(roomData);
+    if (roomData.status === 'closed') setRoomExpired(true);
+  };
+
+  const upsertPerformance = (performance) => {
+    setPerformances(prev => {
+      if (!prev.some(p => p.id === performance.id)) return [...prev, performance];
+      return prev.map(p => (p.id === performance.id ? { ...p, ...performance } : p));
+    });
+  };
+
+  const handleRoomEvent = (event) => {
+    switch (event.type) {
+      case 'batch':
+        event.events.forEach(handleRoomEvent);
+        break;
+      case 'snapshot':
+        applyRoom(event.room);
+        setPerformances(event.performances || []);
+        setAudioSubmitted((event.performances || []).some(p => p.user_id === user.id));
+        break;
+      case 'join':
+        setRoom(prev => prev && { ...prev, participants: event.participants });
+        break;
+      case 'submission':
+        upsertPerformance(event.performance);
+        if (event.performance.user_id === user.id) setAudioSubmitted(true);
+        break;
+      case 'performance':
+        upsertPerformance(event.performance);
+        break;
+      case 'scores':
+        event.performances.forEach(upsertPerformance);
+        break;
+      case 'status': {
+        const { type, room_id, ...fields } = event;
+        setRoom(prev => prev && { ...prev, ...fields });
+        if (event.status === 'closed') setRoomExpired(true);
+        break;
+      }
+      default:
+        break;
+    }
+  };
+
+  const fetchMyVotes = async () => {
     try {
       const headers = {
         'Authorization': `Bearer ${session.access_token}`
       };
 
-      const response = await fetch(`${BACKEND_URL}/api/rooms/${roomId}`, { headers });
-      const roomData = await response.json();
-      
-      if (response.ok) {
-        setRoom(roomData);
-        
-        // Check if room expired
-        const expiresAt = new Date(roomData.expires_at);
-        const now = new Date();
-        if (now > expiresAt || roomData.status === 'closed') {
-          setRoomExpired(true);
-          setPhase('results');
-        }
-        
-        // Fetch performances
-        const perfResponse = await fetch(`${BACKEND_URL}/api/performances/room/${roomId}`, { headers });
-        const perfData = await perfResponse.json();
-        setPerformances(perfData.performances || []);
-        
-        // Check if user already submitted
-        const userPerf = perfData.performances?.find(p => p.user_id === user.id);
-        setAudioSubmitted(!!userPerf);
+      // Performances the user already judged
+      const votesResponse = await fetch(`${BACKEND_URL}/api/votes/room/${roomId}/mine`, { headers });
+      if (votesResponse.ok) {
+        const votesData = await votesResponse.json();
+        setVotedPerformanceIds(votesData.performance_ids || []);
       }
     } catch (error) {
-      console.error('Error fetching room:', error);
+      console.error('Error fetching votes:', error);
     }
   };
 
   const handleAudioSubmission = async (audioData) => {
     try {
+      if (audioData.audio_file) {
+        const form = new FormData();
+        form.append('room_id', roomId);
+        form.append('duration', String(audioData.duration));
+        form.append('audio', audioData.audio_file, audioData.audio_file.name || 'performance.webm');
+
+        const response = await fetch(`${BACKEND_URL}/api/performances/upload?room_id=${encodeURIComponent(roomId)}`, {
+          method: 'POST',
+          headers: { 'Authorization': `Bearer ${session.access_token}` },
+          body: form
+        });
+
+        if (response.ok) {
+          setAudioSubmitted(true);
+          alert('🔥 Performance submitted successfully!');
+        }
+        return;
+      }
+
       const perfData = {
         user_id: user.id,
         room_id: roomId,
@@ -969,7 +1062,6 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
 
       if (response.ok) {
         setAudioSubmitted(true);
-        fetchRoom();
         alert('🔥 Performance submitted successfully!');
       }
     } catch (error) {
@@ -978,6 +1070,21 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
     }
   };
 
+  const startBattle = async () => {
+    try {
+      const response = await fetch(`${BACKEND_URL}/api/rooms/${roomId}/start`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${session.access_token}` }
+      });
+      if (!response.ok) {
+        const error = await response.json();
+        alert(error.detail || 'Could not start the battle');
+      }
+    } catch (error) {
+      console.error('Error starting battle:', error);
+    }
+  };
+
   const formatTime = (seconds) => {
     const mins = Math.floor(seconds / 60);
     const secs = seconds % 60;
@@ -986,18 +1093,26 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
 
   if (!room) return <div className="loading">Loading battle room...</div>;
 
+  // waiting -> active (performing) -> judging -> completed/closed (results)
+  const phase = roomExpired || room.status === 'completed' || room.status === 'closed' ? 'results' : room.status;
+
   return (
     <div className="battle-room">
       <div className="room-header">
         <button onClick={() => onNavigate('home')} className="back-btn">← Back</button>
         <div className="room-info">
           <h2>{room.name}</h2>
-          {!roomExpired && (
+          {(phase === 'active' || phase === 'judging') && (
+            <div className="timer">
+              ⏰ {phase === 'active' ? 'Performing' : 'Judging'} ends in {formatTime(timeLeft)}
+            </div>
+          )}
+          {phase === 'waiting' && (
             <div className="timer">
               ⏰ Expires: {new Date(room.expires_at).toLocaleString()}
             </div>
           )}
-          {roomExpired && (
+          {phase === 'results' && (
             <div className="timer" style={{ color: '#ff4444' }}>
               ⚠️ Battle Ended
             </div>
@@ -1015,11 +1130,25 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
         </div>
 
         {/* Live Leaderboard during voting/results */}
-        {(phase === 'judge' || phase === 'results' || performances.length > 0) && (
+        {(phase === 'judging' || phase === 'results' || performances.length > 0) && (
           <LiveLeaderboard performances={performances} />
         )}
 
-        {!roomExpired && !audioSubmitted && (
+        {phase === 'waiting' && (
+          <div className="waiting-phase">
+            <h3>🎟️ Lobby</h3>
+            {room.host_id === user.id ? (
+              <>
+                <p>Everyone gets {formatTime(room.timer_duration)} to perform once the battle starts.</p>
+                <button onClick={startBattle} className="create-btn">Start Battle</button>
+              </>
+            ) : (
+              <p>Waiting for the host to start the battle...</p>
+            )}
+          </div>
+        )}
+
+        {phase === 'active' && !audioSubmitted && (
           <div className="create-phase">
             <h3>🎤 Creation Phase</h3>
             <AudioRecorder 
@@ -1029,16 +1158,16 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
           </div>
         )}
 
-        {audioSubmitted && !roomExpired && (
+        {phase === 'active' && audioSubmitted && (
           <div className="waiting-phase">
-            <h3>⏳ Waiting for battle to end...</h3>
-            <p>Your performance has been submitted! The battle ends at {new Date(room.expires_at).toLocaleString()}.</p>
+            <h3>⏳ Waiting for judging to start...</h3>
+            <p>Your performance has been submitted! Judging starts in {formatTime(timeLeft)}.</p>
           </div>
         )}
 
-        {(roomExpired || phase === 'judge' || phase === 'results') && (
+        {(phase === 'judging' || phase === 'results') && (
           <div className="judge-phase">
-            <h3>⚖️ {roomExpired ? 'Final Results' : 'Judgment Phase'}</h3>
+            <h3>⚖️ {phase === 'results' ? 'Final Results' : 'Judgment Phase'}</h3>
             <div className="performances-list">
               {performances.length === 0 ? (
                 <p>No performances to judge yet.</p>
@@ -1050,8 +1179,9 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
                     user={user}
                     session={session}
                     roomId={roomId}
-                    onVote={() => fetchRoom()}
-                    canVote={!roomExpired}
+                    onVote={() => setVotedPerformanceIds(prev => [...prev, perf.id])}
+                    canVote={phase === 'judging' && timeLeft > 0}
+                    alreadyVoted={votedPerformanceIds.includes(perf.id)}
                   />
                 ))
               )}
@@ -1064,16 +1194,15 @@ function BattleRoom({ user, session, roomId, onNavigate }) {
 }
 
 // Component: Performance Card with Enhanced Voting
-function PerformanceCard({ performance, user, session, roomId, onVote, canVote = true }) {
+function PerformanceCard({ performance, user, session, roomId, onVote, canVote = true, alreadyVoted = false }) {
   const [vote, setVote] = useState({ flow: 5, lyrics: 5, creativity: 5 });
   const [hasVoted, setHasVoted] = useState(false);
   const [isSubmitting, setIsSubmitting] = useState(false);
 
   useEffect(() => {
     // Check if user already voted for this performance
-    const existingVote = performance.votes && performance.votes[user.id];
-    setHasVoted(!!existingVote);
-  }, [performance.votes, user.id]);
+    if (alreadyVoted) setHasVoted(true);
+  }, [alreadyVoted]);
 
   const submitVote = async () => {
     if (!canVote) {
@@ -1130,11 +1259,18 @@ function PerformanceCard({ performance, user, session, roomId, onVote, canVote =
         </div>
       </div>
 
-      {performance.audio_data && performance.audio_data !== 'timeline_placeholder' && (
+      {performance.render_status === 'pending' && (
+        <div className="audio-section">
+          <p style={{ color: '#cccccc' }}>🎛️ Rendering mixdown...</p>
+        </div>
+      )}
+
+      {performance.audio_url && (
         <div className="audio-section">
           <audio 
             controls 
-            src={`data:audio/webm;base64,${performance.audio_data}`}
+            preload="none"
+            src={`${BACKEND_URL}${performance.audio_url}`}
           />
         </div>
       )}
@@ -0,0 +1,19 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# The backend is run from its own directory (``uvicorn server:app``), so its
+# modules import each other as top-level modules.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+# Importing the server builds its blob store, caches and Supabase client from
+# the environment; keep them out of the source tree and off the network.
+_scratch = tempfile.mkdtemp(prefix="revmix-tests-")
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault("BLOB_STORE_PATH", os.path.join(_scratch, "blobs"))
+os.environ.setdefault("RENDER_CACHE_PATH", os.path.join(_scratch, "render_cache"))
+os.environ.setdefault("VOTE_JOURNAL_PATH", os.path.join(_scratch, "vote_journal"))
+os.environ.setdefault("SUPABASE_URL", "https://project.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "test-anon-key")
@@ -0,0 +1,82 @@
+import asyncio
+import base64
+import hashlib
+
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from blob_store import LocalBlobStore, blob_reference
+
+AUDIO = bytes(range(256)) * 4
+ETAG = f'"{hashlib.sha256(AUDIO).hexdigest()}"'
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    db = AsyncMongoMockClient(tz_aware=True)["revmix_test"]
+    monkeypatch.setattr(server, "performances_collection", db.performances)
+    blob_store = LocalBlobStore(str(tmp_path / "blobs"))
+    monkeypatch.setattr(server, "blob_store", blob_store)
+
+    async def seed():
+        digest = await blob_store.put(AUDIO)
+        await db.performances.insert_many([
+            {"id": "stored", "audio_blob": blob_reference(digest, len(AUDIO), "audio/ogg")},
+            # Stored by a release from before the blob store
+            {"id": "inline", "audio_blob": None, "audio_data": base64.b64encode(AUDIO).decode()},
+            {"id": "unmixed", "audio_blob": None, "audio_data": "timeline_placeholder"},
+        ])
+
+    asyncio.run(seed())
+    return TestClient(server.app)
+
+
+@pytest.mark.parametrize("performance_id", ["stored", "inline"])
+def test_range_request_gets_the_slice_and_its_position(client, performance_id):
+    response = client.get(f"/api/performances/{performance_id}/audio", headers={"Range": "bytes=100-199"})
+
+    assert response.status_code == 206
+    assert response.content == AUDIO[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(AUDIO)}"
+    assert response.headers["content-length"] == "100"
+    assert response.headers["etag"] == ETAG
+
+
+def test_full_request_serves_every_byte_with_the_stored_type(client):
+    response = client.get("/api/performances/stored/audio")
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert response.headers["content-type"] == "audio/ogg"
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("performance_id", ["stored", "inline"])
+def test_matching_if_none_match_is_not_modified(client, performance_id):
+    response = client.get(f"/api/performances/{performance_id}/audio", headers={"If-None-Match": ETAG})
+
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_range_past_the_end_is_not_satisfiable(client):
+    response = client.get("/api/performances/stored/audio", headers={"Range": f"bytes={len(AUDIO)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(AUDIO)}"
+
+
+def test_range_for_another_version_falls_back_to_the_whole_file(client):
+    response = client.get("/api/performances/stored/audio",
+                          headers={"Range": "bytes=0-9", "If-Range": '"an-older-version"'})
+
+    assert response.status_code == 200
+    assert response.content == AUDIO
+    assert "content-range" not in response.headers
+
+
+def test_missing_audio_is_not_found(client):
+    assert client.get("/api/performances/unmixed/audio").status_code == 404
+    assert client.get("/api/performances/unknown/audio").status_code == 404
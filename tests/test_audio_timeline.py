@@ -0,0 +1,69 @@
+import asyncio
+import base64
+import os
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from blob_store import LocalBlobStore
+
+CLIP = b"\x1aE\xdf\xa3" * 32
+EFFECT = b"RIFF" * 16
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    db = AsyncMongoMockClient(tz_aware=True)["revmix_test"]
+    monkeypatch.setattr(server, "audio_effects_collection", db.audio_effects)
+    monkeypatch.setattr(server, "blob_store", LocalBlobStore(str(tmp_path / "blobs")))
+    asyncio.run(db.audio_effects.insert_one({"id": "e1", "audio_data": base64.b64encode(EFFECT).decode()}))
+    return db
+
+
+def stored_blobs():
+    return sorted(name for _, _, names in os.walk(server.blob_store.root) for name in names)
+
+
+def test_repeated_inline_clip_is_stored_once_and_resolves_with_references(db):
+    inline = base64.b64encode(CLIP).decode()
+
+    async def main():
+        recorded = await server.blob_store.put(b"recorded take")
+        timeline = await server.normalize_audio_timeline([
+            {"audio_data": inline, "position": 0, "name": "hook"},
+            {"effect_id": "e1", "position": 1.5, "gain": 0.8},
+            {"audio_data": inline, "position": 4},
+            {"audio_sha256": recorded, "position": 6, "duration": 2},
+        ])
+        return recorded, timeline, await server.resolve_timeline_clips(timeline)
+
+    recorded, timeline, clips = asyncio.run(main())
+    assert "audio_data" not in str(timeline)
+    assert timeline[0]["audio_sha256"] == timeline[2]["audio_sha256"]
+    assert len(stored_blobs()) == 2
+    assert [clip["audio"] for clip in clips] == [CLIP, EFFECT, CLIP, b"recorded take"]
+    assert [(clip["position"], clip["gain"], clip["duration"]) for clip in clips] == [
+        (0, None, None), (1.5, 0.8, None), (4, None, None), (6, None, 2),
+    ]
+
+
+@pytest.mark.parametrize("entry", [
+    {"audio_data": "=abc"},
+    {"audio_data": "ab=c"},
+    {"audio_data": 42},
+    {"effect_id": "e1", "position": "oops"},
+    {"effect_id": "e1", "gain": True},
+    {"effect_id": "e1", "duration": float("nan")},
+    {"effect_id": "e1", "position": -1},
+    {"effect_id": "missing"},
+    {"audio_sha256": "0" * 64},
+    {"audio_sha256": "not-a-digest"},
+])
+def test_invalid_or_dangling_clips_are_rejected(db, entry):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(server.normalize_audio_timeline([entry]))
+
+    assert error.value.status_code == 400
+    assert stored_blobs() == []
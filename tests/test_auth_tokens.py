@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+import auth_tokens
+from auth_tokens import TokenVerificationError, TokenVerifier, UnknownSigningKey
+
+SUPABASE_URL = "https://project.supabase.co"
+ISSUER = f"{SUPABASE_URL}/auth/v1"
+SECRET = "test-secret-with-enough-bytes-for-hs256"
+
+
+def claims(**overrides):
+    now = int(time.time())
+    return {"sub": "user-1", "aud": "authenticated", "iss": ISSUER, "iat": now, "exp": now + 60, **overrides}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def signing_key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def jwks(monkeypatch, signing_key):
+    """Serve ``signing_key`` as kid ``key-1`` and count the fetches"""
+    fetches = []
+    public_jwk = {**jwt.algorithms.RSAAlgorithm.to_jwk(signing_key.public_key(), as_dict=True),
+                  "kid": "key-1", "alg": "RS256"}
+
+    def get(url, timeout):
+        fetches.append(url)
+        return FakeResponse({"keys": [public_jwk]})
+
+    monkeypatch.setattr(auth_tokens.requests, "get", get)
+    return fetches
+
+
+def verify(verifier, token):
+    return asyncio.run(verifier.verify(token))
+
+
+def test_shared_secret_token_is_verified():
+    verifier = TokenVerifier(SUPABASE_URL, jwt_secret=SECRET)
+    token = jwt.encode(claims(), SECRET, algorithm="HS256")
+
+    assert verify(verifier, token)["sub"] == "user-1"
+
+
+def test_jwks_signed_token_is_verified(jwks, signing_key):
+    verifier = TokenVerifier(SUPABASE_URL)
+    token = jwt.encode(claims(), signing_key, algorithm="RS256", headers={"kid": "key-1"})
+
+    assert verify(verifier, token)["sub"] == "user-1"
+    assert jwks == [f"{ISSUER}/.well-known/jwks.json"]
+
+
+@pytest.mark.parametrize("overrides", [
+    {"exp": int(time.time()) - 3600},
+    {"aud": "anon"},
+    {"iss": "https://other.supabase.co/auth/v1"},
+])
+def test_expired_or_misaddressed_tokens_are_rejected(overrides):
+    verifier = TokenVerifier(SUPABASE_URL, jwt_secret=SECRET)
+    token = jwt.encode(claims(**overrides), SECRET, algorithm="HS256")
+
+    with pytest.raises(TokenVerificationError) as error:
+        verify(verifier, token)
+    assert not isinstance(error.value, UnknownSigningKey)
+
+
+def test_bad_signature_is_rejected(jwks, signing_key):
+    verifier = TokenVerifier(SUPABASE_URL, jwt_secret=SECRET)
+    forged = jwt.encode(claims(), "some-other-secret-of-the-same-length", algorithm="HS256")
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    wrong_key = jwt.encode(claims(), other_key, algorithm="RS256", headers={"kid": "key-1"})
+
+    for token in (forged, wrong_key):
+        with pytest.raises(TokenVerificationError) as error:
+            verify(verifier, token)
+        assert not isinstance(error.value, UnknownSigningKey)
+
+
+def test_unknown_key_id_forces_one_refresh_then_falls_back(jwks, signing_key):
+    verifier = TokenVerifier(SUPABASE_URL)
+    verifier.jwks.min_refresh_interval = 0
+    token = jwt.encode(claims(), signing_key, algorithm="RS256", headers={"kid": "rotated"})
+
+    with pytest.raises(UnknownSigningKey):
+        verify(verifier, token)
+    # The regular fetch, then a forced one in case the keys were rotated
+    assert len(jwks) == 2
+
+
+def test_forced_refreshes_back_off(jwks, signing_key):
+    verifier = TokenVerifier(SUPABASE_URL)
+    token = jwt.encode(claims(), signing_key, algorithm="RS256", headers={"kid": "rotated"})
+
+    async def main():
+        for _ in range(3):
+            with pytest.raises(UnknownSigningKey):
+                await verifier.verify(token)
+
+    asyncio.run(main())
+    # Within min_refresh_interval of the first fetch, unknown key ids fetch nothing more
+    assert len(jwks) == 1
@@ -0,0 +1,27 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+
+from blob_store import BlobNotFound, LocalBlobStore
+
+
+def test_local_blob_store_is_content_addressed(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    data = b"RIFF" + os.urandom(128)
+
+    digest = asyncio.run(store.put(data))
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert asyncio.run(store.put(data)) == digest
+    assert asyncio.run(store.get(digest)) == data
+    assert asyncio.run(store.exists(digest))
+    assert store.local_path(digest).endswith(os.path.join(digest[:2], digest[2:4], digest))
+
+
+def test_local_blob_store_rejects_unknown_and_malformed_digests(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    with pytest.raises(BlobNotFound):
+        asyncio.run(store.get("0" * 64))
+    with pytest.raises(BlobNotFound):
+        asyncio.run(store.get("../../etc/passwd"))
@@ -0,0 +1,97 @@
+import asyncio
+
+from change_versions import VERSIONS_CHANNEL, ChangeVersions
+from event_brokers import EventBroker
+from live_events import EventHub
+
+
+class SharedBroker:
+    """Stands in for Redis or a change stream: every frame reaches every process"""
+
+    def __init__(self):
+        self.delivers = []
+
+    def connect(self) -> EventBroker:
+        shared = self
+
+        class Connection(EventBroker):
+            local_only = False
+
+            async def start(self, deliver, resync=None):
+                shared.delivers.append(deliver)
+
+            async def publish(self, channel, frame):
+                for deliver in shared.delivers:
+                    deliver(channel, frame)
+
+        return Connection()
+
+
+def test_etag_changes_only_when_its_keys_are_bumped():
+    versions = ChangeVersions()
+    rooms = versions.etag("rooms")
+    room = versions.etag("room:r1")
+
+    versions.bump("room:r1")
+
+    assert versions.etag("rooms") == rooms
+    assert versions.etag("room:r1") != room
+    assert versions.etag("rooms").startswith('W/"')
+
+
+def test_etags_differ_between_processes():
+    assert ChangeVersions().etag("rooms") != ChangeVersions().etag("rooms")
+
+
+def test_remote_bumps_apply_and_own_bumps_are_not_counted_twice():
+    versions = ChangeVersions()
+    sent = []
+    versions.publish = sent.append
+    versions.bump("users")
+    versions.apply(sent[0])
+    assert versions.version("users") == 1
+
+    versions.apply({"type": "batch", "events": [
+        {"type": "bump", "origin": "other", "keys": ["users", "effects"]},
+    ]})
+    assert versions.version("users") == 2
+    assert versions.version("effects") == 1
+
+
+def test_resync_invalidates_every_tag():
+    versions = ChangeVersions()
+    before = versions.etag("rooms")
+    versions.apply({"type": "resync"})
+    assert versions.etag("rooms") != before
+
+
+def test_bump_in_one_process_changes_the_etag_in_another():
+    async def main():
+        broker = SharedBroker()
+        processes = []
+        for _ in range(2):
+            hub = EventHub(batch_interval=0)
+            await hub.start(broker.connect())
+            versions = ChangeVersions()
+            versions.publish = lambda event, hub=hub: hub.publish(VERSIONS_CHANNEL, event)
+            follower = asyncio.create_task(versions.follow(hub.subscribe(VERSIONS_CHANNEL)))
+            processes.append((hub, versions, follower))
+        (_, writer, _), (_, reader, _) = processes
+
+        before = reader.etag("room:r1")
+        writer.bump("room:r1")
+        for _ in range(100):
+            if reader.version("room:r1"):
+                break
+            await asyncio.sleep(0.01)
+        after = reader.etag("room:r1")
+
+        for hub, _, follower in processes:
+            follower.cancel()
+            await hub.stop()
+        return before, after, writer.version("room:r1")
+
+    before, after, written = asyncio.run(main())
+    assert before != after
+    # The writer counts its own bump once even though it also hears it from the broker
+    assert written == 1
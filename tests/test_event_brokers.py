@@ -0,0 +1,191 @@
+import asyncio
+import fnmatch
+import json
+
+import pytest
+
+from event_brokers import MongoChangeStreamBroker, RedisBroker, encode_command, read_reply
+from live_events import RESYNC_EVENT, EventHub, room_channel
+
+
+class FakeRedis:
+    """Just enough of a Redis server for PUBLISH and PSUBSCRIBE"""
+
+    def __init__(self):
+        self.pattern_subscribers = []
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def drop_subscribers(self):
+        for _, writer in self.pattern_subscribers:
+            writer.close()
+        self.pattern_subscribers = []
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                command = await read_reply(reader)
+                name = command[0].upper()
+                if name == b"PSUBSCRIBE":
+                    pattern = command[1]
+                    self.pattern_subscribers.append((pattern.decode(), writer))
+                    writer.write(b"*3\r\n$10\r\npsubscribe\r\n" + self._bulk(pattern) + b":1\r\n")
+                elif name == b"PUBLISH":
+                    channel, message = command[1], command[2]
+                    receivers = [w for p, w in self.pattern_subscribers if fnmatch.fnmatchcase(channel.decode(), p)]
+                    for subscriber in receivers:
+                        subscriber.write(
+                            b"*4\r\n$8\r\npmessage\r\n" + self._bulk(b"p") + self._bulk(channel) + self._bulk(message)
+                        )
+                    writer.write(f":{len(receivers)}\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+
+    @staticmethod
+    def _bulk(data: bytes) -> bytes:
+        return f"${len(data)}\r\n".encode() + data + b"\r\n"
+
+
+def test_encode_command_round_trips_through_read_reply():
+    async def main():
+        reader = asyncio.StreamReader()
+        reader.feed_data(encode_command("PUBLISH", "chan", "hello"))
+        return await read_reply(reader)
+
+    assert asyncio.run(main()) == [b"PUBLISH", b"chan", b"hello"]
+
+
+def test_redis_broker_fans_out_across_processes():
+    async def main():
+        fake = FakeRedis()
+        port = await fake.start()
+        # Two hubs stand in for two server workers sharing one Redis
+        hubs = [EventHub(batch_interval=0) for _ in range(2)]
+        for hub in hubs:
+            await hub.start(RedisBroker(f"redis://127.0.0.1:{port}"))
+        try:
+            watching = hubs[1].subscribe(room_channel("r1"))
+            hubs[0].publish(room_channel("r1"), {"type": "votes", "n": 1})
+            hubs[0].publish(room_channel("r1"), {"type": "votes", "n": 2})
+            frame = json.loads(await asyncio.wait_for(watching.get(), 2))
+        finally:
+            for hub in hubs:
+                await hub.stop()
+            await fake.stop()
+        return frame
+
+    frame = asyncio.run(main())
+    assert frame["type"] == "batch"
+    assert [event["n"] for event in frame["events"]] == [1, 2]
+
+
+def test_redis_broker_resyncs_subscribers_after_reconnecting():
+    async def main():
+        fake = FakeRedis()
+        port = await fake.start()
+        hub = EventHub(batch_interval=0)
+        await hub.start(RedisBroker(f"redis://127.0.0.1:{port}"))
+        try:
+            watching = hub.subscribe(room_channel("r1"))
+            fake.drop_subscribers()
+            return await asyncio.wait_for(watching.get(), 5)
+        finally:
+            await hub.stop()
+            await fake.stop()
+
+    assert asyncio.run(main()) == RESYNC_EVENT
+
+
+class FakeChangeStream:
+    def __init__(self, collection, resume_after):
+        self.collection = collection
+        self.resume_after = resume_after
+        self.resume_token = resume_after
+        self.changes = asyncio.Queue()
+
+    async def __aenter__(self):
+        if self.collection.unsupported:
+            raise RuntimeError("The $changeStream stage is only supported on replica sets")
+        self.collection.streams.append(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.collection.streams.remove(self)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        change = await self.changes.get()
+        if isinstance(change, Exception):
+            raise change
+        self.resume_token = change["_id"]
+        return change
+
+
+class FakeEventsCollection:
+    """A collection whose inserts reach every open change stream"""
+
+    def __init__(self, unsupported=False):
+        self.unsupported = unsupported
+        self.streams = []
+        self.inserted = 0
+
+    async def create_index(self, key, expireAfterSeconds):
+        pass
+
+    def watch(self, pipeline, resume_after=None):
+        return FakeChangeStream(self, resume_after)
+
+    async def insert_one(self, document):
+        self.inserted += 1
+        for stream in self.streams:
+            stream.changes.put_nowait({"_id": {"_data": self.inserted}, "fullDocument": document})
+
+    def interrupt(self):
+        for stream in self.streams:
+            stream.changes.put_nowait(ConnectionError("primary stepped down"))
+
+
+def test_mongo_broker_delivers_once_the_stream_is_open_and_resyncs_on_resume():
+    async def main():
+        collection = FakeEventsCollection()
+        hubs = [EventHub(batch_interval=0) for _ in range(2)]
+        for hub in hubs:
+            await hub.start(MongoChangeStreamBroker(collection))
+        # start() returns only once this process is watching
+        open_streams = len(collection.streams)
+        try:
+            watching = hubs[1].subscribe(room_channel("r1"))
+            hubs[0].publish(room_channel("r1"), {"type": "votes", "n": 1})
+            frame = json.loads(await asyncio.wait_for(watching.get(), 2))
+            collection.interrupt()
+            resynced = await asyncio.wait_for(watching.get(), 5)
+            resumed_after = [stream.resume_after for stream in collection.streams]
+        finally:
+            for hub in hubs:
+                await hub.stop()
+        return open_streams, frame, resynced, resumed_after
+
+    open_streams, frame, resynced, resumed_after = asyncio.run(main())
+    assert open_streams == 2
+    assert frame["n"] == 1
+    assert resynced == RESYNC_EVENT
+    # Reopened from the last change seen rather than from the present
+    assert resumed_after and all(token == {"_data": 1} for token in resumed_after)
+
+
+def test_mongo_broker_start_fails_without_change_streams():
+    async def main():
+        await MongoChangeStreamBroker(FakeEventsCollection(unsupported=True)).start(lambda channel, frame: None)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(main())
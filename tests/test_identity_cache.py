@@ -0,0 +1,51 @@
+import time
+
+from identity_cache import IdentityCache, TTLCache
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=1)
+    now[0] += 2
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    now[0] += 5
+    assert cache.get("a") is None
+
+
+def test_identity_cache_invalidation_keeps_token_mapping():
+    cache = IdentityCache()
+    cache.remember("tok", {"id": "u1", "supabase_id": "s1", "xp": 0})
+    assert cache.user_id_for_token("tok") == "u1"
+    assert cache.user_id_for_supabase_id("s1") == "u1"
+    cache.invalidate_user("u1")
+    assert cache.get_user("u1") is None
+    assert cache.user_id_for_token("tok") == "u1"
+
+
+def test_identity_cache_respects_token_expiry():
+    cache = IdentityCache()
+    cache.remember("expired", {"id": "u1"}, expires_at=time.time() - 1)
+    assert cache.user_id_for_token("expired") is None
+
+
+def test_rejected_tokens_are_negative_cached():
+    cache = IdentityCache()
+    cache.remember("tok", {"id": "u1"})
+    cache.reject("tok")
+    assert cache.is_rejected("tok")
+    assert cache.user_id_for_token("tok") is None
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from index_catalog import INDEXES, build_indexes, catalog_queries, check_query_plans, plan_stages, uses_index
+
+FIND_EXPLAIN = {
+    "queryPlanner": {
+        "winningPlan": {
+            "stage": "FETCH",
+            "inputStage": {"stage": "IXSCAN", "indexName": "status_1_expires_at_1"},
+        },
+        "rejectedPlans": [{"stage": "COLLSCAN"}],
+    }
+}
+
+AGGREGATE_EXPLAIN = {
+    "stages": [
+        {"$cursor": {"queryPlanner": {"winningPlan": {"stage": "COLLSCAN", "direction": "forward"}}}},
+        {"$group": {"_id": "$room_id"}},
+    ]
+}
+
+
+def test_chosen_plan_is_read_and_rejected_plans_are_ignored():
+    assert plan_stages(FIND_EXPLAIN) == ["FETCH", "IXSCAN"]
+    assert uses_index(FIND_EXPLAIN)
+
+
+def test_collection_scan_anywhere_in_a_pipeline_fails():
+    assert plan_stages(AGGREGATE_EXPLAIN) == ["COLLSCAN"]
+    assert not uses_index(AGGREGATE_EXPLAIN)
+    assert not uses_index({"queryPlanner": {"winningPlan": {"stage": "EOF"}}})
+
+
+def test_every_registered_query_targets_a_catalogued_collection():
+    queries = catalog_queries()
+    assert {query["collection"] for query in queries} == set(INDEXES)
+    assert len({query["name"] for query in queries}) == len(queries)
+
+
+def test_indexes_outside_the_catalog_are_only_dropped_when_pruning():
+    async def main():
+        db = AsyncMongoMockClient()["revmix_test"]
+        # Left by an earlier release, or added by an operator
+        await db.rooms.create_index("expires_at")
+        await build_indexes(db)
+        kept = set(await db.rooms.index_information())
+        await build_indexes(db, prune=True)
+        return kept, set(await db.rooms.index_information())
+
+    kept, pruned = asyncio.run(main())
+    catalogued = {model.document["name"] for model in INDEXES["rooms"]}
+    assert kept == catalogued | {"_id_", "expires_at_1"}
+    assert pruned == catalogued | {"_id_"}
+
+
+@pytest.mark.skipif(not os.environ.get("MONGO_TEST_URL"), reason="set MONGO_TEST_URL to check query plans")
+def test_registered_queries_use_an_index():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def main():
+        client = AsyncIOMotorClient(os.environ["MONGO_TEST_URL"], tz_aware=True)
+        db = client[f"revmix_plans_{uuid.uuid4().hex[:8]}"]
+        try:
+            await build_indexes(db)
+            return await check_query_plans(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    assert asyncio.run(main()) == []
@@ -0,0 +1,117 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from job_scheduler import DeadlineQueue, JobScheduler
+
+
+def in_seconds(seconds: float) -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=seconds)
+
+
+def test_deadlines_fire_in_order():
+    async def main():
+        fired = []
+
+        async def on_due(keys):
+            fired.append(keys)
+
+        scheduler = JobScheduler()
+        rooms = scheduler.deadlines("room_expiry", on_due)
+        scheduler.start()
+        rooms.schedule("late", in_seconds(0.2))
+        rooms.schedule("early", in_seconds(0.05))
+        rooms.schedule("overdue", in_seconds(-10))
+        await asyncio.sleep(0.35)
+        await scheduler.stop()
+        return fired
+
+    assert [key for batch in asyncio.run(main()) for key in batch] == ["overdue", "early", "late"]
+
+
+def test_cancelled_and_rescheduled_keys_fire_once_at_their_latest_deadline():
+    queue = DeadlineQueue("room_expiry", None)
+    now = datetime.now(timezone.utc)
+    queue.schedule("a", now - timedelta(seconds=5))
+    queue.schedule("b", now - timedelta(seconds=5))
+    queue.schedule("b", now + timedelta(seconds=60))
+    queue.schedule("c", now - timedelta(seconds=1))
+    queue.cancel("c")
+
+    assert queue.pop_due(now.timestamp()) == ["a"]
+    assert queue.next_delay(now.timestamp()) > 50
+    assert len(queue) == 1
+
+
+def test_interval_ticks_are_skipped_while_the_job_is_still_running():
+    async def main():
+        async def slow():
+            await asyncio.sleep(0.12)
+
+        scheduler = JobScheduler()
+        job = scheduler.every("sweep", 0.05, slow)
+        scheduler.start()
+        await asyncio.sleep(0.28)
+        await scheduler.stop()
+        return job.stats()
+
+    stats = asyncio.run(main())
+    assert stats["runs"] == 2
+    assert stats["skipped"] >= 2
+
+
+def test_due_batches_wait_for_a_free_slot():
+    async def main():
+        active = []
+        peak = []
+
+        async def on_due(keys):
+            active.append(keys)
+            peak.append(len(active))
+            await asyncio.sleep(0.05)
+            active.remove(keys)
+
+        scheduler = JobScheduler()
+        queue = scheduler.deadlines("challenge_start", on_due, concurrency=2)
+        scheduler.start()
+        for n in range(4):
+            queue.schedule(f"c{n}", in_seconds(-1))
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.2)
+        await scheduler.stop()
+        return max(peak), queue.stats()
+
+    peak, stats = asyncio.run(main())
+    assert peak == 2
+    assert stats["fired"] == 4
+    assert stats["running"] == 0
+
+
+def test_stop_cancels_jobs_that_outlive_the_shutdown_timeout():
+    async def main():
+        finished = []
+        cancelled = []
+
+        async def quick(keys):
+            await asyncio.sleep(0.01)
+            finished.append(keys)
+
+        async def stuck(keys):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(keys)
+                raise
+
+        scheduler = JobScheduler(shutdown_timeout=0.05)
+        quick_queue = scheduler.deadlines("quick", quick)
+        stuck_queue = scheduler.deadlines("stuck", stuck)
+        scheduler.start()
+        quick_queue.schedule("q", in_seconds(-1))
+        stuck_queue.schedule("s", in_seconds(-1))
+        await asyncio.sleep(0.005)
+        await scheduler.stop()
+        return finished, cancelled
+
+    finished, cancelled = asyncio.run(main())
+    assert finished == [["q"]]
+    assert cancelled == [["s"]]
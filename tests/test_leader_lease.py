@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from leader_lease import LeaderLease
+
+
+def contenders(count=2, **kwargs):
+    collection = AsyncMongoMockClient(tz_aware=True)["revmix_test"].leases
+    return collection, [LeaderLease(collection, **kwargs) for _ in range(count)]
+
+
+def test_only_one_contender_becomes_leader():
+    async def main():
+        _, leases = contenders(3)
+        won = await asyncio.gather(*(lease.acquire() for lease in leases))
+        return won, [lease.is_leader for lease in leases]
+
+    won, leaders = asyncio.run(main())
+    assert won.count(True) == 1
+    assert leaders == won
+
+
+def test_holder_renews_its_lease():
+    async def main():
+        collection, (leader, other) = contenders()
+        await leader.acquire()
+        first = await collection.find_one({"_id": leader.name})
+        await asyncio.sleep(0.01)
+        renewed = await leader.acquire()
+        second = await collection.find_one({"_id": leader.name})
+        return renewed, await other.acquire(), first, second
+
+    renewed, other_won, first, second = asyncio.run(main())
+    assert renewed and not other_won
+    assert second["expires_at"] > first["expires_at"]
+    # Renewing keeps the original acquisition time
+    assert second["acquired_at"] == first["acquired_at"]
+
+
+def test_expired_lease_is_taken_over():
+    async def main():
+        collection, (crashed, other) = contenders()
+        await crashed.acquire()
+        # The holder stopped renewing a while ago
+        past = datetime.now(timezone.utc) - timedelta(seconds=1)
+        await collection.update_one({"_id": crashed.name}, {"$set": {"expires_at": past}})
+        took_over = await other.acquire()
+        return took_over, await crashed.acquire(), await other.status()
+
+    took_over, crashed_won, status = asyncio.run(main())
+    assert took_over and not crashed_won
+    assert status["holder"] == status["this_process"]
+
+
+def test_release_lets_another_process_acquire_at_once():
+    async def main():
+        _, (leader, other) = contenders(ttl=3600)
+        await leader.acquire()
+        blocked = await other.acquire()
+        await leader.release()
+        return blocked, leader.is_leader, await other.acquire()
+
+    assert asyncio.run(main()) == (False, False, True)
@@ -0,0 +1,91 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from live_events import FEED_CHANNEL, EventHub, ScoreCoalescer, room_channel
+
+
+def run_with_hub(scenario, **kwargs):
+    async def main():
+        hub = EventHub(batch_interval=0, **kwargs)
+        await hub.start()
+        try:
+            return await scenario(hub)
+        finally:
+            await hub.stop()
+    return asyncio.run(main())
+
+
+def test_publish_reaches_only_subscribers_of_the_channel():
+    async def scenario(hub):
+        watching = hub.subscribe(room_channel("r1"))
+        elsewhere = hub.subscribe(room_channel("r2"))
+        hub.publish(room_channel("r1"), {"type": "join", "at": datetime(2026, 1, 1, tzinfo=timezone.utc)})
+        message = json.loads(await asyncio.wait_for(watching.get(), 1))
+        assert message["type"] == "join"
+        assert message["at"].startswith("2026-01-01T00:00:00")
+        assert elsewhere.empty()
+
+    run_with_hub(scenario)
+
+
+def test_burst_of_events_goes_out_as_one_frame():
+    async def scenario(hub):
+        first = hub.subscribe(FEED_CHANNEL)
+        second = hub.subscribe(FEED_CHANNEL)
+        for n in range(3):
+            hub.publish(FEED_CHANNEL, {"type": "room_updated", "n": n})
+        frame = await asyncio.wait_for(first.get(), 1)
+        assert frame is second.get_nowait()
+        batch = json.loads(frame)
+        assert batch["type"] == "batch"
+        assert [event["n"] for event in batch["events"]] == [0, 1, 2]
+        assert hub.stats()["frames"] == 1
+        assert hub.stats()["published"] == 3
+
+    run_with_hub(scenario)
+
+
+def test_slow_subscriber_is_told_to_resync():
+    async def scenario(hub):
+        queue = hub.subscribe(FEED_CHANNEL)
+        for n in range(3):
+            hub.publish(FEED_CHANNEL, {"type": "room_updated", "n": n})
+            await hub.flush()
+        assert json.loads(queue.get_nowait()) == {"type": "resync"}
+        assert queue.empty()
+        assert hub.stats()["resyncs"] == 1
+
+    run_with_hub(scenario, queue_size=2)
+
+
+def test_unsubscribe_forgets_empty_channels():
+    hub = EventHub()
+    queue = hub.subscribe(room_channel("r1"))
+    hub.unsubscribe(room_channel("r1"), queue)
+
+    assert hub.subscriber_count(room_channel("r1")) == 0
+    assert hub.stats()["channels"] == 0
+
+
+def test_score_coalescer_throttles_and_keeps_latest_state():
+    async def main():
+        published = []
+        coalescer = ScoreCoalescer(lambda room_id, event: published.append((room_id, event)),
+                                   max_frames_per_second=20)
+        coalescer.update("r1", {"id": "p1", "vote_count": 1})
+        await asyncio.sleep(0.01)
+        for count in (2, 4, 3):
+            coalescer.update("r1", {"id": "p1", "vote_count": count})
+        coalescer.update("r1", {"id": "p2", "vote_count": 1})
+        assert len(published) == 1
+        await asyncio.sleep(0.1)
+        return published, coalescer.stats()
+
+    published, stats = asyncio.run(main())
+    assert [event["performances"] for _, event in published] == [
+        [{"id": "p1", "vote_count": 1}],
+        [{"id": "p1", "vote_count": 4}, {"id": "p2", "vote_count": 1}],
+    ]
+    assert stats["frames"] == 2
+    assert stats["dropped_intermediate_states"] == 2
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from blob_store import LocalBlobStore
+from migrations import (
+    BUILTIN_EFFECTS,
+    key_builtin_effects,
+    move_inline_performance_audio,
+    run_migrations,
+    vote_totals_update,
+)
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeMigrationsCollection:
+    def __init__(self, versions=()):
+        self.documents = {version: {"_id": version} for version in versions}
+
+    def find(self, query, projection):
+        return FakeCursor(list(self.documents.values()))
+
+    async def update_one(self, query, update, upsert=False):
+        self.documents[query["_id"]] = {"_id": query["_id"], **update["$set"]}
+
+
+class FakeDatabase:
+    def __init__(self, applied=()):
+        self.migrations = FakeMigrationsCollection(applied)
+
+
+def recording_steps(calls, versions):
+    def step(version):
+        async def apply(db):
+            calls.append(version)
+        return apply
+    return [(version, f"step {version}", step(version)) for version in versions]
+
+
+def test_pending_migrations_run_in_version_order_and_are_recorded():
+    calls = []
+    db = FakeDatabase(applied=[1])
+
+    applied = asyncio.run(run_migrations(db, migrations=recording_steps(calls, [3, 1, 2])))
+
+    assert applied == [2, 3]
+    assert calls == [2, 3]
+    assert db.migrations.documents[3]["name"] == "step 3"
+
+
+def test_startup_against_an_up_to_date_database_does_nothing():
+    calls = []
+    db = FakeDatabase(applied=[1, 2])
+
+    assert asyncio.run(run_migrations(db, migrations=recording_steps(calls, [1, 2]))) == []
+    assert calls == []
+
+
+class FakePerformances:
+    """Timelines, and the one array-filter update the effects migration issues"""
+
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def update_many(self, query, update, array_filters):
+        (path, value), = update["$set"].items()
+        array, _, field = path.partition(".$[clip].")
+        (condition,) = array_filters
+        duplicates = condition[f"clip.{field}"]["$in"]
+        for document in self.documents:
+            for clip in document[array]:
+                if clip.get(field) in duplicates:
+                    clip[field] = value
+
+
+class EffectsDatabase:
+    def __init__(self, performances):
+        self.audio_effects = AsyncMongoMockClient()["revmix_test"].audio_effects
+        self.performances = FakePerformances(performances)
+
+    async def snapshot(self):
+        effects = await self.audio_effects.find({}, {"_id": 0}).sort("id", 1).to_list(length=None)
+        return effects, [list(performance["audio_timeline"]) for performance in self.performances.documents]
+
+
+def test_builtin_effects_are_keyed_and_duplicates_merged():
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    # Every restart of the old server seeded another copy of each built-in effect
+    copies = [
+        {"id": f"boom-{n}", "name": "Boom", "category": "builtin", "created_at": start + timedelta(days=n)}
+        for n in range(3)
+    ] + [{"id": "custom", "name": "Boom", "category": "custom", "created_at": start}]
+    db = EffectsDatabase([
+        {"id": "p1", "audio_timeline": [{"effect_id": "boom-2", "position": 1}, {"effect_id": "custom"}]},
+        {"id": "p2", "audio_timeline": [{"effect_id": "boom-1"}, {"audio_blob": "recording"}]},
+    ])
+
+    async def main():
+        await db.audio_effects.insert_many(copies)
+        await key_builtin_effects(db)
+        first = await db.snapshot()
+        await key_builtin_effects(db)
+        return first, await db.snapshot()
+
+    first, second = asyncio.run(main())
+    effects, timelines = first
+    builtin = {effect["key"]: effect for effect in effects if effect["category"] == "builtin"}
+    assert set(builtin) == {effect["key"] for effect in BUILTIN_EFFECTS}
+    # The oldest copy keeps its id, so timelines already pointing at it stay valid
+    assert builtin["boom"]["id"] == "boom-0"
+    assert "custom" in {effect["id"] for effect in effects}
+    assert timelines == [
+        [{"effect_id": "boom-0", "position": 1}, {"effect_id": "custom"}],
+        [{"effect_id": "boom-0"}, {"audio_blob": "recording"}],
+    ]
+    assert second == first
+
+
+def test_vote_totals_backfill_derives_average_and_drops_embedded_votes():
+    update = vote_totals_update({"flow_total": 10, "lyrics_total": 8, "creativity_total": 6, "vote_count": 2})
+
+    assert update["$set"]["average_score"] == 4.0
+    assert update["$unset"] == {"votes": ""}
+    assert vote_totals_update(None)["$set"] == {
+        "flow_total": 0, "lyrics_total": 0, "creativity_total": 0, "vote_count": 0, "average_score": 0.0
+    }
+
+
+def test_inline_performance_audio_moves_into_the_blob_store(tmp_path):
+    audio = b"\x1aE\xdf\xa3" * 64
+    blob_store = LocalBlobStore(str(tmp_path))
+    db = AsyncMongoMockClient()["revmix_test"]
+
+    async def main():
+        await db.performances.insert_many([
+            {"id": "old", "audio_data": base64.b64encode(audio).decode()},
+            {"id": "mixed", "audio_data": "timeline_placeholder", "audio_blob": None},
+            {"id": "new", "audio_blob": {"sha256": "f" * 64, "size": 1, "content_type": "audio/webm"}},
+        ])
+        await move_inline_performance_audio(db, blob_store)
+        await move_inline_performance_audio(db, blob_store)
+        performances = await db.performances.find({}, {"_id": 0}).sort("id", 1).to_list(length=None)
+        return {performance["id"]: performance for performance in performances}
+
+    performances = asyncio.run(main())
+    old = performances["old"]
+    assert "audio_data" not in old
+    assert old["audio_url"] == "/api/performances/old/audio"
+    assert old["audio_blob"]["size"] == len(audio)
+    assert asyncio.run(blob_store.get(old["audio_blob"]["sha256"])) == audio
+    # Timelines still waiting for a mixdown and audio already in the store are left alone
+    assert performances["mixed"]["audio_data"] == "timeline_placeholder"
+    assert performances["new"]["audio_blob"]["sha256"] == "f" * 64
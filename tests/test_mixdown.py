@@ -0,0 +1,65 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+from mixdown import CHANNELS, SAMPLE_RATE, MixdownError, decode_wav, render_timeline
+
+
+def make_wav(samples, rate, channels=1, width=2):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(width)
+        w.setframerate(rate)
+        w.writeframes(np.asarray(samples, dtype="<i2").tobytes())
+    return buffer.getvalue()
+
+
+def test_decode_wav_reads_16_bit_pcm():
+    samples, rate = decode_wav(make_wav([0, 16384, -32768, 32767], 8000))
+    assert rate == 8000
+    assert samples.shape == (4, 1)
+    assert samples[1, 0] == pytest.approx(0.5)
+    assert samples[2, 0] == pytest.approx(-1.0)
+
+
+def test_decode_wav_rejects_non_wav_data():
+    with pytest.raises(MixdownError):
+        decode_wav(b"OggS" + b"\0" * 40)
+
+
+def test_render_places_clips_at_offsets_and_resamples():
+    one_second = make_wav(np.full(22050, 8000), 22050)
+    result = render_timeline([
+        {"audio": one_second, "position": 0},
+        {"audio": one_second, "position": 2, "gain": 0.5},
+    ])
+    mixed, rate = decode_wav(result["audio"])
+
+    assert rate == SAMPLE_RATE
+    assert mixed.shape == (3 * SAMPLE_RATE, CHANNELS)
+    assert result["duration"] == pytest.approx(3.0)
+    assert mixed[SAMPLE_RATE // 2, 0] == pytest.approx(8000 / 32768, abs=1e-3)
+    assert mixed[int(1.5 * SAMPLE_RATE), 0] == 0
+    assert mixed[int(2.5 * SAMPLE_RATE), 0] == pytest.approx(4000 / 32768, abs=1e-3)
+
+
+def test_render_protects_against_clipping_and_skips_bad_clips():
+    loud = make_wav(np.full(100, 30000), SAMPLE_RATE)
+    result = render_timeline([
+        {"audio": loud, "position": 0},
+        {"audio": loud, "position": 0},
+        {"audio": b"not audio", "position": 0},
+    ])
+    mixed, _ = decode_wav(result["audio"])
+
+    assert result["skipped"] == [2]
+    assert np.max(np.abs(mixed)) <= 1.0
+    assert mixed[0, 0] == pytest.approx(1.0, abs=1e-3)
+
+
+def test_render_requires_a_decodable_clip():
+    with pytest.raises(MixdownError):
+        render_timeline([{"audio": b"", "position": 0}])
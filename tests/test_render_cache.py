@@ -0,0 +1,43 @@
+import os
+import time
+
+from render_cache import DiskLRUCache, pack_render, timeline_cache_key, unpack_render
+
+
+def test_disk_lru_cache_counts_hits_and_misses(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("a") is None
+    cache.put("a", b"data")
+    assert cache.get("a") == b"data"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_disk_lru_cache_evicts_least_recently_used(tmp_path):
+    cache = DiskLRUCache(str(tmp_path), max_bytes=250, low_water=1.0)
+    cache.put("a", b"x" * 100)
+    cache.put("b", b"x" * 100)
+    past = time.time() - 60
+    os.utime(tmp_path / "a", (past, past))
+    os.utime(tmp_path / "b", (past + 1, past + 1))
+    assert cache.get("a") is not None
+
+    cache.put("c", b"x" * 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_timeline_cache_key_is_canonical():
+    clips = [{"audio": b"boom", "position": 2, "gain": None, "duration": 1}]
+    same = [{"audio": b"boom", "position": 2.0, "gain": 1.0, "duration": 1.0, "name": "Boom"}]
+    moved = [{"audio": b"boom", "position": 3, "gain": None, "duration": 1}]
+    assert timeline_cache_key(clips) == timeline_cache_key(same)
+    assert timeline_cache_key(clips) != timeline_cache_key(moved)
+
+
+def test_pack_render_round_trips():
+    result = {"audio": b"RIFF\n\x00data", "content_type": "audio/wav", "duration": 1.5, "skipped": [2]}
+    assert unpack_render(pack_render(result)) == result
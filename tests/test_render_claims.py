@@ -0,0 +1,32 @@
+import asyncio
+from datetime import datetime, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+
+def test_shutdown_hands_back_only_this_workers_pending_renders(monkeypatch):
+    db = AsyncMongoMockClient(tz_aware=True)["revmix_test"]
+    monkeypatch.setattr(server, "performances_collection", db.performances)
+    now = datetime.now(timezone.utc)
+
+    async def main():
+        await db.performances.insert_many([
+            {"id": "mine", "render_status": "pending",
+             "render_claim": {"owner": server.RENDER_OWNER, "claimed_at": now}},
+            {"id": "other", "render_status": "pending",
+             "render_claim": {"owner": "another-worker", "claimed_at": now}},
+            {"id": "done", "render_status": "ready",
+             "render_claim": {"owner": server.RENDER_OWNER, "claimed_at": now}},
+        ])
+        await server.release_render_claims()
+        claimable = await db.performances.find(server.pending_render_filter(now), {"_id": 0, "id": 1}).to_list(None)
+        performances = await db.performances.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+        return [p["id"] for p in claimable], {p["id"]: p for p in performances}
+
+    claimable, performances = asyncio.run(main())
+    # Another worker can take it over at once rather than after the claim timeout
+    assert claimable == ["mine"]
+    assert performances["other"]["render_claim"]["owner"] == "another-worker"
+    assert "render_claim" in performances["done"]
@@ -0,0 +1,144 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from mongomock_motor import AsyncMongoMockClient
+
+from room_finalization import (
+    CLAIM_TIMEOUT_SECONDS,
+    PARTICIPANT_XP,
+    WINNER_BADGE,
+    WINNER_XP,
+    announce_results,
+    claim_rooms,
+    release_claim,
+)
+
+START = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+async def database(performances):
+    db = AsyncMongoMockClient()["revmix_test"]
+    user_ids = sorted({user_id for _, user_id, _ in performances})
+    await db.users.insert_many([{"id": user_id, "xp": 0, "wins": 0, "battles": 0, "badges": []}
+                                for user_id in user_ids])
+    room_ids = sorted({room_id for room_id, _, _ in performances})
+    await db.rooms.insert_many([{"id": room_id, "results_announced": False} for room_id in room_ids])
+    await db.performances.insert_many([
+        {"room_id": room_id, "user_id": user_id, "average_score": score,
+         "submitted_at": START + timedelta(seconds=n)}
+        for n, (room_id, user_id, score) in enumerate(performances)
+    ])
+    return db
+
+
+async def users(db):
+    return {user["id"]: user for user in await db.users.find({}, {"_id": 0}).to_list(length=None)}
+
+
+def test_winner_and_participants_are_awarded_per_room():
+    async def main():
+        db = await database([
+            ("r1", "alice", 8.0), ("r1", "bob", 6.0),
+            ("r2", "carol", 7.0), ("r2", "alice", 9.0), ("r2", "bob", 5.0),
+        ])
+        results = await announce_results(db.rooms, db.performances, db.users, ["r1", "r2"])
+        rooms = await db.rooms.find({}, {"_id": 0}).sort("id", 1).to_list(length=None)
+        return results, await users(db), rooms
+
+    results, awarded, rooms = asyncio.run(main())
+    assert len(results) == 2
+    assert awarded["alice"]["xp"] == 2 * WINNER_XP
+    assert (awarded["alice"]["wins"], awarded["alice"]["battles"]) == (2, 2)
+    assert awarded["alice"]["badges"] == [WINNER_BADGE, WINNER_BADGE]
+    assert awarded["bob"]["xp"] == 2 * PARTICIPANT_XP
+    assert (awarded["bob"]["wins"], awarded["bob"]["battles"]) == (0, 2)
+    assert awarded["carol"]["xp"] == PARTICIPANT_XP
+    assert [(room["winner_id"], room["results_announced"]) for room in rooms] == [("alice", True), ("alice", True)]
+
+
+def test_earlier_submission_wins_a_tie():
+    async def main():
+        db = await database([("r1", "bob", 7.0), ("r1", "alice", 7.0)])
+        await announce_results(db.rooms, db.performances, db.users, ["r1"])
+        return await db.rooms.find_one({"id": "r1"})
+
+    assert asyncio.run(main())["winner_id"] == "bob"
+
+
+def test_room_without_performances_is_left_alone():
+    async def main():
+        db = await database([("r1", "alice", 7.0)])
+        await db.rooms.insert_one({"id": "empty", "results_announced": False})
+        results = await announce_results(db.rooms, db.performances, db.users, ["r1", "empty"])
+        return results, await db.rooms.find_one({"id": "empty"}, {"_id": 0})
+
+    results, empty = asyncio.run(main())
+    assert [result["_id"] for result in results] == ["r1"]
+    assert empty == {"id": "empty", "results_announced": False}
+
+
+def test_retry_after_a_crash_between_users_and_rooms_awards_once():
+    async def main():
+        db = await database([("r1", "alice", 8.0), ("r1", "bob", 6.0)])
+        rooms_bulk_write = db.rooms.bulk_write
+
+        async def crash(*args, **kwargs):
+            raise ConnectionError("primary stepped down")
+
+        db.rooms.bulk_write = crash
+        try:
+            await announce_results(db.rooms, db.performances, db.users, ["r1"])
+        except ConnectionError:
+            pass
+        db.rooms.bulk_write = rooms_bulk_write
+        # The room still reads as unannounced, so the next finalizer announces it again
+        await announce_results(db.rooms, db.performances, db.users, ["r1"])
+        return await users(db), await db.rooms.find_one({"id": "r1"})
+
+    awarded, room = asyncio.run(main())
+    assert awarded["alice"]["xp"] == WINNER_XP
+    assert awarded["alice"]["badges"] == [WINNER_BADGE]
+    assert awarded["bob"]["xp"] == PARTICIPANT_XP
+    assert room["results_announced"]
+
+
+async def open_rooms(room_ids):
+    db = AsyncMongoMockClient()["revmix_test"]
+    await db.rooms.insert_many([{"id": room_id, "status": "judging"} for room_id in room_ids])
+    return db
+
+
+def test_racing_claimers_split_the_rooms_between_them():
+    room_ids = [f"r{n}" for n in range(20)]
+
+    async def main():
+        db = await open_rooms(room_ids)
+        return await asyncio.gather(*(claim_rooms(db.rooms, room_ids) for _ in range(2)))
+
+    (first_token, first), (second_token, second) = asyncio.run(main())
+    first_ids = {room["id"] for room in first}
+    second_ids = {room["id"] for room in second}
+    assert first_token != second_token
+    assert first_ids.isdisjoint(second_ids)
+    assert first_ids | second_ids == set(room_ids)
+
+
+def test_live_claims_are_kept_and_stale_or_released_ones_are_taken_over():
+    async def main():
+        db = await open_rooms(["r1", "r2"])
+        await db.rooms.update_one({"id": "r2"}, {"$set": {"status": "closed"}})
+        _, claimed = await claim_rooms(db.rooms, ["r1", "r2"])
+        assert [room["id"] for room in claimed] == ["r1"]
+        assert (await claim_rooms(db.rooms, ["r1"]))[1] == []
+
+        # A finalizer that stalled past the timeout loses the room
+        stale = datetime.now(timezone.utc) - timedelta(seconds=CLAIM_TIMEOUT_SECONDS + 1)
+        await db.rooms.update_one({"id": "r1"}, {"$set": {"results_claim.claimed_at": stale}})
+        taken_over, claimed = await claim_rooms(db.rooms, ["r1"])
+        assert [room["id"] for room in claimed] == ["r1"]
+
+        # One that failed gives the room back without waiting for the timeout
+        await release_claim(db.rooms, taken_over)
+        assert [room["id"] for room in (await claim_rooms(db.rooms, ["r1"]))[1]] == ["r1"]
+
+    asyncio.run(main())
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from room_lifecycle import (
+    ACTIVE, COMPLETED, JUDGING, WAITING,
+    accepts_submissions, accepts_votes, next_phase, start_fields, timer_duration,
+)
+
+NOW = datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_start_opens_performing_phase_and_keeps_judging_inside_the_expiry():
+    room = {"status": WAITING, "timer_duration": 300, "expires_at": NOW + timedelta(minutes=6)}
+
+    fields = start_fields(room, NOW, judging_seconds=120)
+
+    assert fields["status"] == ACTIVE
+    assert fields["phase_ends_at"] == NOW + timedelta(seconds=300)
+    assert fields["expires_at"] == NOW + timedelta(seconds=420)
+    # Results of buffered votes are announced a little after judging ends
+    assert start_fields(room, NOW, judging_seconds=120, results_delay=0.4)["expires_at"] == (
+        NOW + timedelta(seconds=420.4)
+    )
+
+
+def test_phases_freeze_submissions_and_votes_at_their_deadline():
+    active = {"status": ACTIVE, "phase_ends_at": NOW + timedelta(seconds=1)}
+    judging = {"status": JUDGING, "phase_ends_at": NOW + timedelta(seconds=1)}
+
+    assert accepts_submissions(active, NOW) and not accepts_votes(active, NOW)
+    assert accepts_votes(judging, NOW) and not accepts_submissions(judging, NOW)
+    # Past the deadline, before the transition has been carried out
+    assert not accepts_submissions(active, NOW + timedelta(seconds=1))
+    assert not accepts_votes(judging, NOW + timedelta(seconds=1))
+    assert not accepts_submissions({"status": WAITING, "phase_ends_at": None}, NOW)
+
+
+def test_timed_phases_move_on_to_judging_then_completed():
+    assert next_phase(ACTIVE, NOW, judging_seconds=120) == (JUDGING, NOW + timedelta(seconds=120))
+    assert next_phase(JUDGING, NOW, judging_seconds=120) == (COMPLETED, None)
+    with pytest.raises(ValueError):
+        next_phase(WAITING, NOW, judging_seconds=120)
+
+
+def test_timer_duration_is_validated():
+    assert timer_duration(None) == 300
+    assert timer_duration("90") == 90
+    with pytest.raises(ValueError):
+        timer_duration(0)
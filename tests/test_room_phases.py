@@ -0,0 +1,182 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from blob_store import LocalBlobStore
+from job_scheduler import JobScheduler
+from room_finalization import WINNER_XP
+from room_lifecycle import ACTIVE, COMPLETED, JUDGING, WAITING
+
+HOST = {"id": "host", "username": "Host"}
+GUEST = {"id": "guest", "username": "Guest"}
+
+
+@pytest.fixture
+def db(monkeypatch, tmp_path):
+    db = AsyncMongoMockClient(tz_aware=True)["revmix_test"]
+    for name in ("users", "rooms", "performances", "votes"):
+        monkeypatch.setattr(server, f"{name}_collection", db[name])
+    scheduler = JobScheduler()
+    monkeypatch.setattr(server, "room_phases", scheduler.deadlines("room_phases", server.advance_room_phases))
+    monkeypatch.setattr(server, "room_deadlines", scheduler.deadlines("room_expiry", server.expire_rooms))
+    monkeypatch.setattr(server, "blob_store", LocalBlobStore(str(tmp_path / "blobs")))
+    monkeypatch.setattr(server, "vote_buffer", None)
+    monkeypatch.setattr(server, "RESULTS_DELAY_SECONDS", 0)
+    server.performance_owner_cache.clear()
+    return db
+
+
+def run(db, scenario):
+    async def main():
+        await db.users.insert_many([{**user, "xp": 0, "wins": 0, "battles": 0, "badges": []}
+                                    for user in (HOST, GUEST)])
+        return await scenario()
+    return asyncio.run(main())
+
+
+async def insert_room(db, status, phase_ends_in=None, **fields):
+    now = datetime.now(timezone.utc)
+    # BSON dates keep milliseconds
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    room = {
+        "id": "r1", "host_id": HOST["id"], "status": status, "timer_duration": 60,
+        "phase_ends_at": now + timedelta(seconds=phase_ends_in) if phase_ends_in is not None else None,
+        "expires_at": now + timedelta(hours=1), "results_announced": False, **fields,
+    }
+    await db.rooms.insert_one(room)
+    return room
+
+
+def due(queue, after_seconds):
+    return queue.pop_due((datetime.now(timezone.utc) + timedelta(seconds=after_seconds)).timestamp())
+
+
+def test_only_the_host_starts_a_waiting_room(db):
+    async def scenario():
+        await insert_room(db, WAITING)
+        with pytest.raises(HTTPException) as not_host:
+            await server.start_room("r1", GUEST)
+        started = await server.start_room("r1", HOST)
+        with pytest.raises(HTTPException) as again:
+            await server.start_room("r1", HOST)
+        return not_host.value.status_code, started, again.value.status_code
+
+    not_host, started, again = run(db, scenario)
+    assert (not_host, again) == (403, 400)
+    assert started["status"] == ACTIVE
+    assert started["phase_ends_at"] - started["started_at"] == timedelta(seconds=60)
+    # The performing phase ends on the room's own timer
+    assert due(server.room_phases, 59) == []
+    assert due(server.room_phases, 61) == ["r1"]
+
+
+def test_submissions_are_accepted_only_while_performing(db):
+    async def scenario():
+        codes = {}
+        for status, phase_ends_in in ((WAITING, None), (ACTIVE, 60), (ACTIVE, -1), (JUDGING, 60)):
+            await db.rooms.delete_many({})
+            await insert_room(db, status, phase_ends_in)
+            try:
+                await server.check_room_accepts_submissions("r1")
+                codes[(status, phase_ends_in)] = 200
+            except HTTPException as e:
+                codes[(status, phase_ends_in)] = e.status_code
+        with pytest.raises(HTTPException) as missing:
+            await server.check_room_accepts_submissions("unknown")
+        return codes, missing.value.status_code
+
+    codes, missing = run(db, scenario)
+    assert codes == {(WAITING, None): 400, (ACTIVE, 60): 200, (ACTIVE, -1): 400, (JUDGING, 60): 400}
+    assert missing == 404
+
+
+def test_votes_are_accepted_only_while_judging(db):
+    async def scenario():
+        await insert_room(db, ACTIVE, 60)
+        await db.performances.insert_one({"id": "p1", "room_id": "r1", "user_id": HOST["id"]})
+        with pytest.raises(HTTPException) as performing:
+            await server.submit_vote({"performance_id": "p1", "flow": 8}, GUEST)
+        await db.rooms.update_one({"id": "r1"}, {"$set": {"status": JUDGING}})
+        vote = await server.submit_vote({"performance_id": "p1", "flow": 8}, GUEST)
+        return performing.value.status_code, vote, await db.performances.find_one({"id": "p1"})
+
+    performing, vote, performance = run(db, scenario)
+    assert performing == 400
+    assert vote["flow"] == 8
+    assert performance["vote_count"] == 1
+
+
+def test_upload_to_a_closed_room_stores_no_audio(db):
+    client = TestClient(server.app)
+    server.app.dependency_overrides[server.get_current_user] = lambda: GUEST
+    files = {"audio": ("take.webm", b"\x1aE\xdf\xa3" * 256, "audio/webm")}
+    try:
+        asyncio.run(insert_room(db, JUDGING, 60))
+        by_query = client.post("/api/performances/upload?room_id=r1", files=files)
+        by_field = client.post("/api/performances/upload", data={"room_id": "r1"}, files=files)
+    finally:
+        server.app.dependency_overrides.clear()
+
+    assert by_query.status_code == by_field.status_code == 400
+    blobs = [name for _, _, names in os.walk(server.blob_store.root) for name in names]
+    assert blobs == []
+
+
+def test_performing_ends_in_judging_and_judging_in_announced_results(db):
+    async def scenario():
+        room = await insert_room(db, ACTIVE, -1)
+        await db.performances.insert_one({"id": "p1", "room_id": "r1", "user_id": GUEST["id"],
+                                          "average_score": 7.0, "submitted_at": datetime.now(timezone.utc)})
+        await server.advance_room_phases(["r1"])
+        judging = await db.rooms.find_one({"id": "r1"})
+
+        await db.rooms.update_one({"id": "r1"}, {"$set": {
+            "phase_ends_at": datetime.now(timezone.utc) - timedelta(seconds=1)
+        }})
+        await server.advance_room_phases(["r1"])
+        # A second timer for the same room finds nothing left to do
+        await server.advance_room_phases(["r1"])
+        return room, judging, await db.rooms.find_one({"id": "r1"}), await db.users.find_one({"id": GUEST["id"]})
+
+    room, judging, completed, winner = run(db, scenario)
+    assert judging["status"] == JUDGING
+    assert judging["phase_ends_at"] == room["phase_ends_at"] + timedelta(seconds=server.ROOM_JUDGING_SECONDS)
+    assert (completed["status"], completed["results_announced"], completed["winner_id"]) == (
+        COMPLETED, True, GUEST["id"]
+    )
+    assert completed["phase_ends_at"] is None
+    assert (winner["xp"], winner["wins"]) == (WINNER_XP, 1)
+
+
+def test_results_wait_for_buffered_votes_after_judging_ends(db, monkeypatch):
+    monkeypatch.setattr(server, "RESULTS_DELAY_SECONDS", 30)
+
+    async def scenario():
+        await insert_room(db, JUDGING, -1)
+        await server.advance_room_phases(["r1"])
+        return await db.rooms.find_one({"id": "r1"})
+
+    room = run(db, scenario)
+    assert room["status"] == JUDGING
+    assert due(server.room_phases, 0) == []
+    assert due(server.room_phases, 30) == ["r1"]
+
+
+def test_room_reads_leave_out_the_finalizer_claim(db):
+    claim = {"token": "t1", "claimed_at": datetime.now(timezone.utc)}
+    asyncio.run(insert_room(db, JUDGING, 60, results_claim=claim))
+    client = TestClient(server.app)
+
+    room = client.get("/api/rooms/r1").json()
+    listed = client.get("/api/rooms").json()["rooms"]
+    results = client.get("/api/rooms/r1/results").json()["room"]
+
+    assert room["status"] == JUDGING
+    assert [entry["id"] for entry in listed] == ["r1"]
+    assert all("results_claim" not in document for document in (room, *listed, results))
@@ -0,0 +1,64 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+from index_catalog import INDEXES
+from room_lifecycle import JUDGING
+from vote_aggregation import empty_aggregates
+
+VOTERS = [{"id": f"voter-{n}", "username": f"Voter {n}"} for n in range(3)]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = AsyncMongoMockClient(tz_aware=True)["revmix_test"]
+    for name in ("rooms", "performances", "votes"):
+        monkeypatch.setattr(server, f"{name}_collection", db[name])
+    monkeypatch.setattr(server, "vote_buffer", None)
+    server.performance_owner_cache.clear()
+
+    async def seed():
+        await db.votes.create_indexes(INDEXES["votes"])
+        await db.rooms.insert_one({"id": "r1", "status": JUDGING,
+                                   "phase_ends_at": datetime.now(timezone.utc) + timedelta(minutes=5)})
+        await db.performances.insert_one({"id": "p1", "room_id": "r1", "user_id": "performer",
+                                          **empty_aggregates()})
+
+    asyncio.run(seed())
+    return db
+
+
+def vote(voter, flow, lyrics, creativity):
+    return server.submit_vote(
+        {"performance_id": "p1", "flow": flow, "lyrics": lyrics, "creativity": creativity}, voter
+    )
+
+
+def test_average_score_follows_the_running_totals(db):
+    async def main():
+        await vote(VOTERS[0], 10, 8, 6)
+        await vote(VOTERS[1], 4, 5, 6)
+        await vote(VOTERS[2], 7, 7, 1)
+        return await db.performances.find_one({"id": "p1"})
+
+    performance = asyncio.run(main())
+    assert (performance["flow_total"], performance["lyrics_total"], performance["creativity_total"]) == (21, 20, 13)
+    assert performance["vote_count"] == 3
+    assert performance["average_score"] == pytest.approx((21 + 20 + 13) / 9)
+
+
+def test_repeat_vote_is_rejected_by_the_unique_index(db):
+    async def main():
+        await vote(VOTERS[0], 9, 9, 9)
+        with pytest.raises(HTTPException) as repeat:
+            await vote(VOTERS[0], 1, 1, 1)
+        return repeat.value, await db.votes.count_documents({}), await db.performances.find_one({"id": "p1"})
+
+    repeat, votes, performance = asyncio.run(main())
+    assert (repeat.status_code, repeat.detail) == (400, "You have already voted for this performance")
+    # The rejected vote never reaches the totals
+    assert (votes, performance["vote_count"], performance["flow_total"]) == (1, 1, 9)
@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from starlette.requests import Request
+
+from uploads import UploadError, UploadTooLarge, receive_upload
+
+BOUNDARY = "revmixboundary"
+
+
+def multipart_body(fields, file_field=None, data=b"", filename="take.webm"):
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    if file_field:
+        parts.append(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f"Content-Type: audio/webm\r\n\r\n".encode() + data + b"\r\n"
+        )
+    parts.append(f"--{BOUNDARY}--\r\n".encode())
+    return b"".join(parts)
+
+
+def streaming_request(body, chunk_size=1024):
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        if chunks:
+            chunk = chunks.pop(0)
+            return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    return Request(scope, receive)
+
+
+def test_receive_upload_spools_and_hashes(tmp_path):
+    data = os.urandom(10000)
+    request = streaming_request(multipart_body({"room_id": "r1", "duration": "2.5"}, "audio", data))
+
+    fields, upload = asyncio.run(receive_upload(request, "audio", str(tmp_path), 20000))
+
+    assert fields == {"room_id": "r1", "duration": "2.5"}
+    assert upload.size == len(data)
+    assert upload.sha256 == hashlib.sha256(data).hexdigest()
+    assert upload.content_type == "audio/webm"
+    with open(upload.path, "rb") as f:
+        assert f.read() == data
+
+
+def test_receive_upload_enforces_size_cap_while_streaming(tmp_path):
+    request = streaming_request(multipart_body({}, "audio", os.urandom(5000)))
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(receive_upload(request, "audio", str(tmp_path), 4096))
+    assert os.listdir(tmp_path) == []
+
+
+def test_receive_upload_rejects_unexpected_file_fields(tmp_path):
+    request = streaming_request(multipart_body({}, "other", b"abc"))
+
+    with pytest.raises(UploadError):
+        asyncio.run(receive_upload(request, "audio", str(tmp_path), 4096))
+    assert os.listdir(tmp_path) == []
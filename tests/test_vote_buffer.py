@@ -0,0 +1,179 @@
+import asyncio
+import os
+import shutil
+from datetime import datetime, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError
+
+from vote_aggregation import empty_aggregates
+from vote_buffer import DuplicateVote, JournalSegment, VoteBuffer
+
+
+def test_journal_segment_round_trips_votes(tmp_path):
+    segment = JournalSegment.create(str(tmp_path))
+    created_at = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    segment.append({"id": "v1", "flow": 7, "created_at": created_at})
+    segment.append({"id": "v2", "flow": 3, "created_at": created_at})
+
+    votes = segment.read()
+
+    assert [vote["id"] for vote in votes] == ["v1", "v2"]
+    assert votes[0]["created_at"] == created_at
+    segment.close()
+
+
+def test_journal_segment_ignores_torn_final_record(tmp_path):
+    segment = JournalSegment.create(str(tmp_path))
+    segment.append({"id": "v1"})
+    with open(segment.path, "a") as f:
+        f.write('{"id": "v2", "fl')
+
+    assert [vote["id"] for vote in segment.read()] == ["v1"]
+    segment.close()
+
+
+def test_journal_segment_is_locked_while_open(tmp_path):
+    segment = JournalSegment.create(str(tmp_path))
+    with pytest.raises(OSError):
+        JournalSegment(segment.path, create=False)
+    segment.close()
+
+    reopened = JournalSegment(segment.path, create=False)
+    assert reopened.batch_id == segment.batch_id
+    reopened.remove()
+
+
+async def database():
+    db = AsyncMongoMockClient()["revmix_test"]
+    await db.votes.create_index([("voter_id", 1), ("performance_id", 1)], unique=True)
+    await db.performances.insert_one({"id": "p1", **empty_aggregates()})
+    return db
+
+
+def vote(vote_id, voter_id, flow=5):
+    return {"id": vote_id, "voter_id": voter_id, "performance_id": "p1",
+            "flow": flow, "lyrics": 5, "creativity": 5}
+
+
+async def aggregates(db):
+    return await db.performances.find_one({"id": "p1"}, {"_id": 0, "vote_count": 1, "flow_total": 1})
+
+
+def test_vote_buffer_rejects_repeat_votes_before_flush(tmp_path):
+    async def main():
+        db = await database()
+        buffer = VoteBuffer(str(tmp_path), flush_interval=60)
+        await buffer.start(db.votes, db.performances, db.applied_vote_batches)
+        await buffer.accept(vote("v1", "u1"))
+        with pytest.raises(DuplicateVote):
+            await buffer.accept(vote("v2", "u1"))
+        assert buffer.stats()["pending"] == 1
+        await buffer.stop()
+        return await aggregates(db)
+
+    assert asyncio.run(main()) == {"vote_count": 1, "flow_total": 5}
+
+
+def test_vote_buffer_rejects_votes_already_written_by_another_worker(tmp_path):
+    async def main():
+        db = await database()
+        # Written by another worker, or by this one before a restart
+        await db.votes.insert_one(vote("v1", "u1"))
+        buffer = VoteBuffer(str(tmp_path), flush_interval=60)
+        await buffer.start(db.votes, db.performances, db.applied_vote_batches)
+        with pytest.raises(DuplicateVote):
+            await buffer.accept(vote("v2", "u1"))
+        assert buffer.stats()["pending"] == 0
+        await buffer.stop()
+
+    asyncio.run(main())
+
+
+def crashed_segment(journal_dir, votes):
+    """A sealed segment left on disk by a process that died before removing it"""
+    segment = JournalSegment.create(journal_dir)
+    for journaled in votes:
+        segment.append(journaled)
+    segment.close()
+    return segment
+
+
+def test_replaying_a_segment_twice_counts_its_votes_once(tmp_path):
+    journal_dir = str(tmp_path / "journal")
+    os.makedirs(journal_dir)
+    segment = crashed_segment(journal_dir, [vote("v1", "u1", flow=7), vote("v2", "u2", flow=3)])
+    shutil.copy(segment.path, tmp_path / "copy")
+
+    async def main():
+        db = await database()
+        buffer = VoteBuffer(journal_dir)
+        buffer.votes_collection, buffer.performances_collection = db.votes, db.performances
+        buffer.batches_collection = db.applied_vote_batches
+        await buffer.replay()
+        # The same segment turns up again, e.g. replayed by a worker that raced this one
+        shutil.copy(tmp_path / "copy", segment.path)
+        await buffer.replay()
+        return await aggregates(db), await db.votes.count_documents({})
+
+    assert asyncio.run(main()) == ({"vote_count": 2, "flow_total": 10}, 2)
+    assert os.listdir(journal_dir) == []
+
+
+def test_crash_between_apply_and_removing_the_segment_is_replayed_once(tmp_path):
+    journal_dir = str(tmp_path)
+    votes = [vote("v1", "u1", flow=7), vote("v2", "u2", flow=3)]
+    segment = crashed_segment(journal_dir, votes)
+
+    async def main():
+        db = await database()
+        crashed = VoteBuffer(journal_dir)
+        crashed.votes_collection, crashed.performances_collection = db.votes, db.performances
+        crashed.batches_collection = db.applied_vote_batches
+        # The flush wrote votes and aggregates, then the process died before sealing the segment away
+        await crashed._apply(segment.batch_id, votes)
+
+        restarted = VoteBuffer(journal_dir, flush_interval=60)
+        await restarted.start(db.votes, db.performances, db.applied_vote_batches)
+        await restarted.stop()
+        return await aggregates(db), restarted.stats()["discarded_duplicates"]
+
+    assert asyncio.run(main()) == ({"vote_count": 2, "flow_total": 10}, 0)
+    assert os.listdir(journal_dir) == []
+
+
+def test_replay_after_a_partly_applied_batch_updates_only_the_rest(tmp_path):
+    journal_dir = str(tmp_path)
+    votes = [vote("v1", "u1", flow=7), {**vote("v2", "u1", flow=3), "performance_id": "p2"}]
+    segment = crashed_segment(journal_dir, votes)
+
+    async def main():
+        db = await database()
+        await db.performances.insert_one({"id": "p2", **empty_aggregates()})
+        crashed = VoteBuffer(journal_dir)
+        crashed.votes_collection, crashed.performances_collection = db.votes, db.performances
+        crashed.batches_collection = db.applied_vote_batches
+        performances = crashed.performances_collection
+        performances_bulk_write = performances.bulk_write
+
+        async def only_p1_lands(requests, ordered):
+            await performances_bulk_write(requests[:1], ordered=ordered)
+            raise BulkWriteError({"writeErrors": [{"index": 1, "code": 91, "errmsg": "shutting down"}]})
+
+        performances.bulk_write = only_p1_lands
+        with pytest.raises(BulkWriteError):
+            await crashed._apply(segment.batch_id, votes)
+        performances.bulk_write = performances_bulk_write
+
+        restarted = VoteBuffer(journal_dir, flush_interval=60)
+        await restarted.start(db.votes, db.performances, db.applied_vote_batches)
+        await restarted.stop()
+        return (
+            await db.performances.find({}, {"_id": 0, "id": 1, "vote_count": 1}).sort("id", 1).to_list(None),
+            await db.applied_vote_batches.find_one({"_id": segment.batch_id}),
+        )
+
+    performances, batch = asyncio.run(main())
+    assert performances == [{"id": "p1", "vote_count": 1}, {"id": "p2", "vote_count": 1}]
+    assert batch["pending"] == []